@@ -0,0 +1,272 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hmile.DataProvider import interval_to_timedelta
+
+
+def _naive_utc(date) -> pd.Timestamp:
+    """Return the date as a timezone naive UTC timestamp"""
+    date = pd.Timestamp(date)
+    if date.tz is not None:
+        date = date.tz_convert(None)
+    return date
+
+
+def count_gaps(index : pd.DatetimeIndex, interval : str) -> int:
+    """Count the holes of a datetime index : consecutive dates separated by more than one interval
+
+    Args:
+        index (pd.DatetimeIndex): sorted dates
+        interval (str): day, hour or minute
+
+    Returns:
+        int: number of holes
+    """
+    if len(index) < 2:
+        return 0
+    step = pd.Timedelta(interval_to_timedelta[interval]).value
+    return int(np.count_nonzero(np.diff(index.asi8) > step))
+
+
+class CatalogEntry:
+    """
+    Coverage of a pair in a source
+
+    :ivar first: first date available (naive UTC)
+    :ivar last: last date available (naive UTC)
+    :ivar rows: number of rows available
+    :ivar gaps: number of holes between first and last
+    :ivar refreshed: date of the last update of the entry (naive UTC)
+    :ivar complete: True if the source is known to contain only these dates (written by an exporter),
+        False if the dates were only seen in downloads and the source may contain more
+    """
+    def __init__(self, first : pd.Timestamp, last : pd.Timestamp, rows : int, gaps : int,
+            refreshed : pd.Timestamp, complete : bool = False) -> None:
+        self.first = first
+        self.last = last
+        self.rows = rows
+        self.gaps = gaps
+        self.refreshed = refreshed
+        self.complete = complete
+
+    def overlaps(self, start, end) -> bool:
+        """Return True if some data is available between start and end (both included)
+
+        Args:
+            start (str): first date, like 2020-12-31
+            end (str): last date, like 2020-12-31. Every date of this day is accepted
+        """
+        return not (self.last < _naive_utc(start) or self.first >= _naive_utc(end) + timedelta(days=1))
+
+    def covers(self, start, end) -> bool:
+        """Return True if the data between start and end (both included) is available"""
+        return self.first <= _naive_utc(start) and self.last >= _naive_utc(end)
+
+    def to_dict(self) -> dict:
+        return {
+            'first': self.first.isoformat(),
+            'last': self.last.isoformat(),
+            'rows': self.rows,
+            'gaps': self.gaps,
+            'refreshed': self.refreshed.isoformat(),
+            'complete': self.complete,
+        }
+
+    @classmethod
+    def from_dict(cls, content : dict) -> 'CatalogEntry':
+        return cls(
+            pd.Timestamp(content['first']),
+            pd.Timestamp(content['last']),
+            content['rows'],
+            content['gaps'],
+            pd.Timestamp(content['refreshed']),
+            content.get('complete', False))
+
+    def __repr__(self) -> str:
+        return (f'CatalogEntry(first={self.first}, last={self.last}, rows={self.rows}, gaps={self.gaps}, '
+                f'refreshed={self.refreshed}, complete={self.complete})')
+
+
+class DataCatalog:
+    """
+    Record what each source contains : for each (source, pair, interval) the first and last dates,
+    the number of rows, the number of holes and the date of the last refresh, and the list of available pairs.
+    Set it on a DataProvider or a DataExporter (dp.catalog = DataCatalog(path)) to keep it up to date,
+    to avoid listing the pairs of a source at every call and to reject impossible requests without download.
+    Updates are saved by flush(), which providers and exporters call once at the end of getData and export.
+    Inside a batch() block, flush() waits for the end of the block.
+
+    :ivar path: json file where the catalog is saved, None to keep it in memory
+    :ivar pairs_max_age: number of seconds a list of available pairs stays valid, None for no limit
+    """
+    def __init__(self, path : Optional[str] = None, pairs_max_age : Optional[float] = None) -> None:
+        """Create or load a catalog
+
+        Args:
+            path (Optional[str], optional): json file where the catalog is saved. Defaults to None (memory only).
+            pairs_max_age (Optional[float], optional): validity of the lists of pairs in seconds. Defaults to None (no limit).
+        """
+        self.path = path
+        self.pairs_max_age = pairs_max_age
+        self._entries : Dict[Tuple[str, str, str], CatalogEntry] = {}
+        self._pairs : Dict[Tuple[str, str], Tuple[List[str], pd.Timestamp]] = {}
+        self._lock = threading.RLock()
+        # updates not saved yet
+        self._dirty = False
+        # number of batch() blocks running, flush() waits for the last one
+        self._batches = 0
+        if path is not None and os.path.isfile(path):
+            self.load()
+
+    def get(self, source : str, pair : str, interval : str) -> Optional[CatalogEntry]:
+        """Return the coverage of a pair, None if it is unknown"""
+        return self._entries.get((source, pair.upper(), interval))
+
+    def update(self, source : str, pair : str, interval : str, dataframe : pd.DataFrame, complete : bool = False) -> CatalogEntry:
+        """Record that a source contains the dates of a dataframe
+
+        Args:
+            source (str): name of the source, see DataProvider.catalogSource()
+            pair (str): name of the pair
+            interval (str): day, hour or minute
+            dataframe (pd.DataFrame): data read from or written to the source, indexed by date
+            complete (bool, optional): True if the dataframe is the whole content of the source for this pair,
+                otherwise it is merged with the known coverage. Defaults to False.
+
+        Returns:
+            CatalogEntry: the updated entry
+        """
+        index = dataframe.index
+        if index.tz is not None:
+            index = index.tz_convert(None)
+        now = _naive_utc(pd.Timestamp.utcnow())
+        with self._lock:
+            previous = self.get(source, pair, interval)
+            if len(index) == 0:
+                return previous
+            first, last = index[0], index[-1]
+            if complete or previous is None or (first <= previous.first and last >= previous.last):
+                entry = CatalogEntry(
+                    first,
+                    last,
+                    len(index),
+                    count_gaps(index, interval),
+                    now,
+                    complete or (previous is not None and previous.complete))
+            else:
+                # only the rows outside the known coverage are new
+                before = index[index < previous.first]
+                after = index[index > previous.last]
+                gaps = previous.gaps
+                if len(before):
+                    gaps += count_gaps(before.append(pd.DatetimeIndex([previous.first])), interval)
+                if len(after):
+                    gaps += count_gaps(pd.DatetimeIndex([previous.last]).append(after), interval)
+                entry = CatalogEntry(
+                    min(first, previous.first),
+                    max(last, previous.last),
+                    previous.rows + len(before) + len(after),
+                    gaps,
+                    now,
+                    previous.complete)
+            self._entries[(source, pair.upper(), interval)] = entry
+            if (source, interval) in self._pairs:
+                pairs, refreshed = self._pairs[(source, interval)]
+                if pair.upper() not in pairs:
+                    self._pairs[(source, interval)] = (sorted(pairs + [pair.upper()]), refreshed)
+            self._dirty = True
+            return entry
+
+    def available(self, source : str, pair : str, interval : str, start : str, end : str) -> bool:
+        """Return False only if the catalog knows that a source has no data for a pair between start and end"""
+        entry = self.get(source, pair, interval)
+        return entry is None or not entry.complete or entry.overlaps(start, end)
+
+    def pairs(self, source : str, interval : str) -> Optional[List[str]]:
+        """Return the known list of available pairs of a source, None if it is unknown or too old"""
+        known = self._pairs.get((source, interval))
+        if known is None:
+            return None
+        pairs, refreshed = known
+        if self.pairs_max_age is not None and (_naive_utc(pd.Timestamp.utcnow()) - refreshed).total_seconds() > self.pairs_max_age:
+            return None
+        return list(pairs)
+
+    def set_pairs(self, source : str, interval : str, pairs : List[str]) -> None:
+        """Record the list of available pairs of a source"""
+        with self._lock:
+            self._pairs[(source, interval)] = (sorted(pairs), _naive_utc(pd.Timestamp.utcnow()))
+            self._autosave()
+
+    def flush(self) -> None:
+        """Save the catalog if it has a path and updates which are not saved yet"""
+        with self._lock:
+            if self._dirty and self.path is not None and self._batches == 0:
+                self.save()
+
+    @contextmanager
+    def batch(self):
+        """Save the catalog once at the end of the block instead of at every flush(), for jobs calling getData many times"""
+        with self._lock:
+            self._batches += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batches -= 1
+            self.flush()
+
+    def _autosave(self) -> None:
+        if self.path is not None:
+            self.save()
+
+    def save(self, path : Optional[str] = None) -> None:
+        """Save the catalog to a json file
+
+        Args:
+            path (Optional[str], optional): file to write. Defaults to self.path.
+        """
+        path = path or self.path
+        with self._lock:
+            content = {
+                'entries': [
+                    {'source': source, 'pair': pair, 'interval': interval, **entry.to_dict()}
+                    for (source, pair, interval), entry in self._entries.items()
+                ],
+                'pairs': [
+                    {'source': source, 'interval': interval, 'pairs': pairs, 'refreshed': refreshed.isoformat()}
+                    for (source, interval), (pairs, refreshed) in self._pairs.items()
+                ],
+            }
+            # write then rename so that a reader never sees a partial file
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(content, f)
+            os.replace(f'{path}.tmp', path)
+            if path == self.path:
+                self._dirty = False
+
+    def load(self, path : Optional[str] = None) -> None:
+        """Load a catalog saved with save()
+
+        Args:
+            path (Optional[str], optional): file to read. Defaults to self.path.
+        """
+        path = path or self.path
+        with open(path) as f:
+            content = json.load(f)
+        with self._lock:
+            self._entries = {
+                (item['source'], item['pair'], item['interval']) : CatalogEntry.from_dict(item)
+                for item in content['entries']
+            }
+            self._pairs = {
+                (item['source'], item['interval']) : (item['pairs'], pd.Timestamp(item['refreshed']))
+                for item in content['pairs']
+            }
@@ -1,24 +1,104 @@
-from typing import Union
+import os
+import json
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Union, Optional, List, Tuple
 from abc import abstractmethod
 
-from elasticsearch import Elasticsearch, helpers
+import numpy as np
+import pandas as pd
+from elasticsearch import NotFoundError, helpers
+try:
+    import zarr
+    from numcodecs import Blosc
+except ImportError:
+    zarr = None
 
-from hmile.DataProvider import DataProvider
+from hmile.DataProvider import DataProvider, interval_to_timedelta, csv_extensions, bucket_index, elastic_field
 from hmile.DataTransformer import DataTransformer
+from hmile.ElasticClient import get_client
+from hmile.Profiling import stage
+from hmile.SharedMemory import SharedDataset
+from hmile.utils import parse_date_like
+
+# index holding one high-water mark document per exported index
+METADATA_INDEX = 'hmile-metadata'
+# index template applied to the indices written by ElasticDataExporter
+INDEX_TEMPLATE = 'hmile-bars'
+
+
+def index_template(shards : int = 1, replicas : int = 1, codec : Optional[str] = None) -> dict:
+    """Return the index template of the bar indices : ohlcv are doubles, every other number is stored as a float,
+    @timestamp is a date and the documents are sorted by date on disk, which makes range reads cheaper.
+
+    Args:
+        shards (int, optional): number of primary shards of each index. Defaults to 1.
+        replicas (int, optional): number of replicas of each index. Defaults to 1.
+        codec (Optional[str], optional): stored fields codec, best_compression makes smaller indices
+            but slower indexing. Defaults to None (the server default).
+
+    Returns:
+        dict: arguments of indices.put_index_template
+    """
+    template = {
+        'index_patterns': ['f-*'],
+        'priority': 100,
+        'template': {
+            'settings': {
+                'number_of_shards': shards,
+                'number_of_replicas': replicas,
+                'sort.field': '@timestamp',
+                'sort.order': 'asc',
+            },
+            'mappings': {
+                'dynamic_templates': [
+                    # indicators do not need more than 7 significant digits
+                    {'indicators': {'match_mapping_type': 'double', 'mapping': {'type': 'float'}}},
+                ],
+                'properties': {
+                    '@timestamp': {'type': 'date'},
+                    # last bar of a bucket document
+                    'end': {'type': 'date'},
+                    'open': {'type': 'double'},
+                    'high': {'type': 'double'},
+                    'low': {'type': 'double'},
+                    'close': {'type': 'double'},
+                    'volume': {'type': 'double'},
+                },
+            },
+        },
+    }
+    if codec is not None:
+        template['template']['settings']['codec'] = codec
+    return template
+
 
 class DataExporter:
     """Export data to another format
 
     :ivar dataprovider: Source of the data to export    
+    :ivar incremental: only write rows newer than the stored high-water mark
+    :ivar overlap: number of bars before the high-water mark to rewrite, to catch revised bars
     """
+    # export_func can be called with some pairs only, the pairs exported before are kept
+    per_pair = True
+
     def __init__(self,
-        dataprovider : Union[DataProvider, DataTransformer]):
+        dataprovider : Union[DataProvider, DataTransformer],
+        incremental : bool = False,
+        overlap : int = 0):
         """Initialize the DataExporter
 
         Args:
             dataprovider (Union[DataProvider, DataTransformer]): the source of the data to transform
+            incremental (bool, optional): only write rows newer than the high-water mark of the previous export. Defaults to False.
+            overlap (int, optional): number of bars before the high-water mark which are written again. Defaults to 0.
         """
         self.dataprovider = dataprovider
+        self.incremental = incremental
+        self.overlap = overlap
+        # optional hmile.Catalog.DataCatalog kept up to date with what is exported
+        self.catalog = None
 
     def export(self) -> None:
         """Apply export and store result
@@ -34,61 +114,643 @@ class DataExporter:
             interval = self.dataprovider.dataprovider.interval
         else:
             raise TypeError('dataprovider must be a DataProvider or a DataTransformer')
-        self.export_func(data, interval)
+        try:
+            with stage('export'):
+                self.export_func(data, interval)
+        finally:
+            self.flushCatalog()
     
     @abstractmethod
     def export_func(self, data, interval):
         raise NotImplementedError()
 
+    def catalogSource(self) -> Optional[str]:
+        """Return the name of the destination in the catalog, like the DataProvider reading it. None if it is not recorded"""
+        return None
+
+    def flushCatalog(self) -> None:
+        """Save the updates of the catalog, if any. export calls it once every pair is written"""
+        if self.catalog is not None:
+            self.catalog.flush()
+
+    def _updateCatalog(self, pair : str, interval : str, dataframe : pd.DataFrame, complete : bool) -> None:
+        """Record the exported rows in the catalog, if any"""
+        if self.catalog is not None and self.catalogSource() is not None:
+            self.catalog.update(self.catalogSource(), pair, interval, dataframe, complete)
+
+    def _cutoff(self, high_water_mark : pd.Timestamp, interval : str) -> pd.Timestamp:
+        """Return the date after which rows must be written again
+
+        Args:
+            high_water_mark (pd.Timestamp): last date written by the previous export
+            interval (str): interval of the data
+
+        Returns:
+            pd.Timestamp: high_water_mark minus the overlap window
+        """
+        return high_water_mark - interval_to_timedelta[interval] * self.overlap
+
+
 class CSVDataExporter(DataExporter):
     """
-    Export data to csv. The file name will be in the format {pair}-{interval}.csv
+    Export data to csv. The file name will be in the format {pair}-{interval}.csv, followed by .gz or .zst when compressed.
+    Files are written to a temporary file and renamed, so that readers never see a half written file.
+    Pairs are written in parallel by workers threads.
+    
+    In incremental mode, the high-water mark of each file is stored in a sidecar file f-{pair}-{interval}.csv.hwm
+    and only the rows newer than it (minus the overlap window) are appended. The replaced end of the file is kept
+    in f-{pair}-{interval}.csv.tail until the append is done.
+    If index_every is set, the date of every index_every rows and its byte offset are stored in a sidecar
+    file f-{pair}-{interval}.csv.idx, which CSVDataProvider uses to read only the requested dates.
+    Compressed files cannot be appended nor indexed : they are always written entirely.
     
     :ivar dataprovider: Source of the data to export    
     :ivar directory: directory in with the csv will be saved
+    :ivar incremental: only append rows newer than the stored high-water mark
+    :ivar overlap: number of bars before the high-water mark to rewrite
+    :ivar index_every: number of rows between two entries of the seek index, 0 to disable it
+    :ivar compression: None, gzip or zstd
+    :ivar workers: number of pairs written at the same time
     """
     def __init__(self,
         dataprovider : Union[DataProvider, DataTransformer],
-        directory : str):
+        directory : str,
+        incremental : bool = False,
+        overlap : int = 0,
+        index_every : int = 0,
+        compression : Optional[str] = None,
+        workers : int = 1):
         """Export data to csv. The file name will be in the format {pair}-{interval}.csv
 
         Args:
             dataprovider (hmile.DataProvider.Dataprovider): Dataprovider to export
             directory (str): directory in with the csv will be saved
+            incremental (bool, optional): only append rows newer than the high-water mark. Defaults to False.
+            overlap (int, optional): number of bars before the high-water mark which are written again. Defaults to 0.
+            index_every (int, optional): write a seek index with one entry every index_every rows. Defaults to 0 (no index).
+            compression (Optional[str], optional): gzip or zstd (needs the zstandard package). Defaults to None.
+            workers (int, optional): number of pairs written at the same time. Defaults to 1.
+
+        Raises:
+            ValueError: if the compression is not supported
         """
-        super().__init__(dataprovider)
+        super().__init__(dataprovider, incremental, overlap)
+        if compression not in csv_extensions:
+            raise ValueError(f'compression must be one of {list(csv_extensions)}')
         self.directory = directory
+        self.index_every = index_every
+        self.compression = compression
+        self.workers = workers
+
+    def export_func(self, data, interval):
+        pairs = [pair for pair in data.keys() if data[pair].shape[0] > 0]
+        if self.workers > 1 and len(pairs) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._export_pair, pair, data[pair], interval) for pair in pairs]
+                for future in futures:
+                    future.result()
+        else:
+            for pair in pairs:
+                self._export_pair(pair, data[pair], interval)
+
+    def _export_pair(self, pair : str, dataframe : pd.DataFrame, interval : str) -> None:
+        with stage('write', pair):
+            base = f'{self.directory}/f-{pair.lower()}-{interval}'
+            name = base + csv_extensions[self.compression]
+            if os.path.isfile(f'{name}.tail'):
+                # a previous append stopped after truncating the file
+                self._restore_tail(name)
+            high_water_mark = self._read_high_water_mark(name, dataframe.index) if self.incremental else None
+            if (self.incremental
+                    and self.compression is None
+                    and high_water_mark is not None
+                    and self._same_header(name, dataframe)):
+                cutoff = self._cutoff(high_water_mark, interval)
+                written_from = self._append(name, dataframe[dataframe.index > cutoff], cutoff)
+                high_water_mark = max(high_water_mark, dataframe.index[-1])
+                self._updateCatalog(pair, interval, dataframe[dataframe.index > cutoff], complete=False)
+            else:
+                dataframe.to_csv(f'{name}.tmp', index=True, compression=self.compression)
+                os.replace(f'{name}.tmp', name)
+                written_from = 0
+                high_water_mark = dataframe.index[-1]
+                self._remove_other_formats(base)
+                self._updateCatalog(pair, interval, dataframe, complete=True)
+            if self.incremental:
+                self._write_high_water_mark(name, high_water_mark)
+            elif os.path.isfile(f'{name}.hwm'):
+                # the mark of a previous incremental export no longer matches the file
+                os.remove(f'{name}.hwm')
+            if self.index_every and self.compression is None and written_from is not None:
+                self._write_seek_index(name, written_from)
+
+    def _remove_other_formats(self, base : str) -> None:
+        """Remove the files of the pair written with another compression, CSVDataProvider would read them first"""
+        for compression, extension in csv_extensions.items():
+            if compression == self.compression:
+                continue
+            for suffix in ['', '.hwm', '.idx', '.tail']:
+                if os.path.isfile(base + extension + suffix):
+                    os.remove(base + extension + suffix)
+
+    def catalogSource(self) -> str:
+        return f'csv:{os.path.abspath(self.directory)}'
+
+    def _write_seek_index(self, name : str, written_from : int) -> None:
+        """Write the date and the byte offset of every index_every rows of the file.
+        Entries of the existing index before written_from are kept and the file is only scanned from there
+
+        Args:
+            name (str): path of the csv file
+            written_from (int): byte offset from which the file changed
+        """
+        dates, offsets = [], []
+        if written_from > 0 and os.path.isfile(f'{name}.idx'):
+            with open(f'{name}.idx') as f:
+                previous = json.load(f)
+            if previous['every'] == self.index_every:
+                kept = [i for i, offset in enumerate(previous['offsets']) if offset < written_from]
+                dates = [previous['dates'][i] for i in kept]
+                offsets = [previous['offsets'][i] for i in kept]
+        with open(name, 'rb') as f:
+            if offsets:
+                # the last kept entry is found again by the scan
+                position = offsets.pop()
+                dates.pop()
+                f.seek(position)
+            else:
+                position = len(f.readline())
+            for row, line in enumerate(f):
+                if row % self.index_every == 0:
+                    dates.append(line.split(b',', 1)[0].decode())
+                    offsets.append(position)
+                position += len(line)
+        with open(f'{name}.idx.tmp', 'w') as f:
+            json.dump({'every': self.index_every, 'size': position, 'dates': dates, 'offsets': offsets}, f)
+        os.replace(f'{name}.idx.tmp', f'{name}.idx')
+
+    def _read_high_water_mark(self, name : str, index : pd.DatetimeIndex) -> Optional[pd.Timestamp]:
+        """Return the high-water mark stored next to a csv file, None if there is no usable one"""
+        if not os.path.isfile(name) or not os.path.isfile(f'{name}.hwm'):
+            return None
+        with open(f'{name}.hwm') as f:
+            state = json.load(f)
+        return parse_date_like(state['high_water_mark'], index)
+
+    def _write_high_water_mark(self, name : str, high_water_mark : pd.Timestamp) -> None:
+        with open(f'{name}.hwm.tmp', 'w') as f:
+            json.dump({'high_water_mark': high_water_mark.isoformat()}, f)
+        os.replace(f'{name}.hwm.tmp', f'{name}.hwm')
+
+    def _same_header(self, name : str, dataframe : pd.DataFrame) -> bool:
+        """Check that appending the dataframe keeps the columns of the existing file"""
+        with open(name) as f:
+            header = f.readline()
+        return header.rstrip('\r\n') == dataframe.head(0).to_csv(index=True).rstrip('\r\n')
+
+    def _append(self, name : str, rows : pd.DataFrame, cutoff : pd.Timestamp) -> Optional[int]:
+        """Replace the rows of the file newer than cutoff by the given rows.
+        Only the tail of the file is read, rows already stored after the last new row are kept.
+        The bytes after the cutoff are saved in a sidecar file {name}.tail before the file is truncated,
+        they are written back if the append fails, or by the next export after a crash.
+
+        Args:
+            name (str): path of the csv file
+            rows (pd.DataFrame): rows newer than cutoff
+            cutoff (pd.Timestamp): every row of the file after this date is rewritten
+
+        Returns:
+            Optional[int]: byte offset from which the file was rewritten, None if the file is unchanged
+        """
+        if rows.shape[0] == 0:
+            return None
+        offset, tail = self._scan_tail(name, cutoff, rows.index)
+        last = rows.index[-1]
+        kept = [line for line in tail if self._line_date(line, rows.index) > last]
+        with open(name, 'rb') as f:
+            f.seek(offset)
+            backup = f.read()
+        with open(f'{name}.tail.tmp', 'wb') as f:
+            f.write(b'%d\n' % offset + backup)
+        os.replace(f'{name}.tail.tmp', f'{name}.tail')
+        try:
+            with open(name, 'r+b') as f:
+                f.truncate(offset)
+            rows.to_csv(name, index=True, header=False, mode='a')
+            if kept:
+                with open(name, 'ab') as f:
+                    f.write(b'\n'.join(kept) + b'\n')
+        except BaseException:
+            self._restore_tail(name)
+            raise
+        os.remove(f'{name}.tail')
+        return offset
+
+    def _restore_tail(self, name : str) -> None:
+        """Write back the tail saved by an append which did not finish and remove the backup"""
+        with open(f'{name}.tail', 'rb') as f:
+            offset = int(f.readline())
+            backup = f.read()
+        with open(name, 'r+b') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(backup)
+        os.remove(f'{name}.tail')
+
+    def _line_date(self, line : bytes, index : pd.DatetimeIndex) -> pd.Timestamp:
+        return parse_date_like(line.split(b',', 1)[0].decode(), index)
+
+    def _scan_tail(self, name : str, cutoff : pd.Timestamp, index : pd.DatetimeIndex,
+            block_size : int = 65536) -> Tuple[int, List[bytes]]:
+        """Read the csv file backward until a row older than cutoff is found
+
+        Args:
+            name (str): path of the csv file
+            cutoff (pd.Timestamp): date to look for
+            index (pd.DatetimeIndex): index used to parse the dates of the file
+            block_size (int, optional): number of bytes read at once. Defaults to 65536.
+
+        Returns:
+            Tuple[int, List[bytes]]: offset of the first row newer than cutoff and the rows after it
+        """
+        tail = []
+        with open(name, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            pending = b''
+            while position > 0:
+                size = min(block_size, position)
+                position -= size
+                f.seek(position)
+                chunk = f.read(size) + pending
+                lines = chunk.split(b'\n')
+                # the first line may be incomplete, it is kept for the next block
+                pending = lines.pop(0)
+                offset = position + len(chunk) + 1
+                for line in reversed(lines):
+                    offset -= len(line) + 1
+                    if not line.strip():
+                        continue
+                    if self._line_date(line, index) <= cutoff:
+                        return min(offset + len(line) + 1, end), tail[::-1]
+                    tail.append(line)
+        # every row is newer than cutoff, only the header is kept
+        return len(pending) + 1, tail[::-1]
+
+
+class ZarrDataExporter(DataExporter):
+    """
+    Export data to a zarr store (needs the zarr package). Each pair is a group f-{pair}-{interval} holding
+    a dates array (int64 nanoseconds, UTC) and a values array of dates x features, chunked along both axes and compressed,
+    so that ZarrDataProvider reads only the chunks of the requested dates and features.
+    In incremental mode only the rows newer than the last stored date (minus the overlap window) are written.
+
+    :ivar dataprovider: Source of the data to export
+    :ivar path: directory of the zarr store
+    :ivar incremental: only write rows newer than the last stored date
+    :ivar overlap: number of bars before the last stored date to rewrite
+    :ivar time_chunk: number of dates of a chunk
+    :ivar feature_chunk: number of features of a chunk
+    :ivar compressor: numcodecs compressor of the chunks
+    """
+    def __init__(self,
+        dataprovider : Union[DataProvider, DataTransformer],
+        path : str,
+        incremental : bool = False,
+        overlap : int = 0,
+        time_chunk : int = 4096,
+        feature_chunk : int = 64,
+        compressor = None):
+        """Export data to a zarr store
+
+        Args:
+            dataprovider (Union[DataProvider, DataTransformer]): Dataprovider to export
+            path (str): directory of the zarr store, created if needed
+            incremental (bool, optional): only write rows newer than the last stored date. Defaults to False.
+            overlap (int, optional): number of bars before the last stored date which are written again. Defaults to 0.
+            time_chunk (int, optional): number of dates of a chunk. Defaults to 4096.
+            feature_chunk (int, optional): number of features of a chunk. Defaults to 64.
+            compressor (optional): numcodecs compressor. Defaults to Blosc zstd with bit shuffle.
+
+        Raises:
+            ImportError: if zarr is not installed
+        """
+        if zarr is None:
+            raise ImportError('ZarrDataExporter needs the zarr package : pip install "zarr<3"')
+        super().__init__(dataprovider, incremental, overlap)
+        self.path = path
+        self.time_chunk = time_chunk
+        self.feature_chunk = feature_chunk
+        self.compressor = compressor or Blosc(cname='zstd', clevel=5, shuffle=Blosc.BITSHUFFLE)
 
     def export_func(self, data, interval):
+        root = zarr.open_group(self.path, mode='a')
         for pair in data.keys():
-            name = f'{self.directory}/f-{pair.lower()}-{interval}.csv'
-            data[pair].to_csv(name, index=True)
+            name = f'f-{pair.lower()}-{interval}'
+            dataframe = data[pair]
+            if dataframe.shape[0] == 0:
+                continue
+            columns = [str(column) for column in dataframe.columns]
+            if (self.incremental
+                    and name in root
+                    and root[name].attrs.get('columns') == columns
+                    and root[name]['dates'].shape[0] > 0):
+                rows = self._append(root[name], dataframe, interval)
+                self._updateCatalog(pair, interval, rows, complete=False)
+            else:
+                self._write(root.require_group(name), dataframe)
+                self._updateCatalog(pair, interval, dataframe, complete=True)
+
+    def catalogSource(self) -> str:
+        return f'zarr:{os.path.abspath(self.path)}'
+
+    def _write(self, group, dataframe : pd.DataFrame) -> None:
+        """Replace the content of the group of a pair"""
+        group.array('dates', dataframe.index.asi8, chunks=(self.time_chunk,),
+                    compressor=self.compressor, overwrite=True)
+        group.array('values', dataframe.to_numpy(dtype=np.float64), chunks=(self.time_chunk, self.feature_chunk),
+                    compressor=self.compressor, overwrite=True)
+        group.attrs.update({
+            'columns': [str(column) for column in dataframe.columns],
+            'tz': str(dataframe.index.tz) if dataframe.index.tz is not None else None,
+            'index_name': dataframe.index.name,
+        })
+
+    def _append(self, group, dataframe : pd.DataFrame, interval : str) -> pd.DataFrame:
+        """Replace the stored rows newer than the cutoff by the rows of the dataframe.
+        Only the dates array and the chunks after the cutoff are read
+
+        Returns:
+            pd.DataFrame: the written rows
+        """
+        dates = group['dates'][:]
+        last = pd.Timestamp(dates[-1], tz='UTC')
+        if dataframe.index.tz is None:
+            last = last.tz_convert(None)
+        cutoff = self._cutoff(last, interval)
+        rows = dataframe[dataframe.index > cutoff]
+        if rows.shape[0] == 0:
+            return rows
+        position = int(np.searchsorted(dates, rows.index.asi8[0], side='left'))
+        # stored rows after the last new row are kept
+        after = int(np.searchsorted(dates, rows.index.asi8[-1], side='right'))
+        kept_dates = dates[after:]
+        kept_values = group['values'][after:] if after < len(dates) else None
+        group['dates'].resize(position)
+        group['values'].resize(position, group['values'].shape[1])
+        group['dates'].append(rows.index.asi8)
+        group['values'].append(rows.to_numpy(dtype=np.float64))
+        if kept_values is not None:
+            group['dates'].append(kept_dates)
+            group['values'].append(kept_values)
+        return rows
+
+
+class SharedMemoryDataExporter(DataExporter):
+    """
+    Publish data into shared memory so that other processes can read it without downloading or copying it.
+    Other processes get the dataframes with hmile.SharedMemory.SharedDataset.attach(name).
+    The exporter owns the memory : call close() once the consumers are done.
+
+    :ivar dataprovider: Source of the data to export
+    :ivar name: name of the shared dataset
+    :ivar dataset: the published dataset, None before export
+    """
+    # each export_func publishes a new dataset which replaces the previous one
+    per_pair = False
+
+    def __init__(self,
+        dataprovider : Union[DataProvider, DataTransformer],
+        name : str):
+        """Publish data into shared memory
+
+        Args:
+            dataprovider (Union[DataProvider, DataTransformer]): Dataprovider to export
+            name (str): name of the shared dataset
+        """
+        super().__init__(dataprovider)
+        self.name = name
+        self.dataset = None
+
+    def export_func(self, data, interval):
+        if self.dataset is not None:
+            self.dataset.unlink()
+        self.dataset = SharedDataset.publish(data, self.name)
+
+    def close(self) -> None:
+        """Free the shared memory"""
+        if self.dataset is not None:
+            self.dataset.unlink()
+            self.dataset = None
 
 
 class ElasticDataExporter(DataExporter):
     """Export data to ElasticSearch. The index name will be in the format f-{pair}-{interval
 
+    In incremental mode, the high-water mark of each index is stored as a document of the hmile-metadata index.
+    Only the bars newer than it (minus the overlap window) are indexed.
+
     :ivar dataprovider: Source of the data to export    
     :ivar es_url: ElasticSearch url
     :ivar es_user: ElasticSearch user
     :ivar es_pass: ElasticSearch password
+    :ivar incremental: only upsert bars newer than the stored high-water mark
+    :ivar overlap: number of bars before the high-water mark to upsert again
+    :ivar client_options: options of the shared client, see hmile.ElasticClient.get_client
+    :ivar template: index template installed before the first export (see index_template), None to keep the server mappings
+    :ivar bulk_load: disable the refresh and the replicas of an index while it is written, then restore them
+    :ivar bulk_load_rows: minimum number of bars written to an index at once for bulk_load to apply,
+        smaller writes like incremental tails do not pay for the settings round trips
+    :ivar bucket: duration of the buckets of bars stored in one document (like '1h' or '1D'), None for one document by bar.
+        Buckets are written to the indices f-{pair}-{interval}-buckets, read them with ElasticDataProvider(buckets=True)
     """
     def __init__(
         self,
         dataprovider: DataProvider,
         es_url: str,
         es_user: str,
-        es_pass: str):
-        super().__init__(dataprovider)
+        es_pass: str,
+        incremental : bool = False,
+        overlap : int = 0,
+        client_options : Optional[Dict] = None,
+        template : Optional[dict] = None,
+        bulk_load : bool = False,
+        bulk_load_rows : int = 10000,
+        bucket : Optional[str] = None):
+        """Export data to ElasticSearch
+
+        Args:
+            dataprovider (hmile.DataProvider.Dataprovider): Dataprovider to export
+            es_url (str): ElasticSearch url
+            es_user (str): ElasticSearch user
+            es_pass (str): ElasticSearch password
+            incremental (bool, optional): only upsert bars newer than the stored high-water mark. Defaults to False.
+            overlap (int, optional): number of bars before the high-water mark to upsert again. Defaults to 0.
+            client_options (Optional[Dict], optional): options of the shared client. Defaults to None.
+            template (Optional[dict], optional): index template installed before the first export, like index_template().
+                Defaults to None (dynamic mappings of the server).
+            bulk_load (bool, optional): set refresh_interval to -1 and number_of_replicas to 0 while writing an index,
+                the previous settings are restored after. Defaults to False.
+            bulk_load_rows (int, optional): minimum number of bars written to an index at once for bulk_load to apply. Defaults to 10000.
+            bucket (Optional[str], optional): store the bars of each bucket of this duration (like '1h' or '1D') in one document
+                of parallel arrays. Defaults to None (one document by bar).
+        """
+        super().__init__(dataprovider, incremental, overlap)
         self.es_url = es_url
         self.es_user = es_user
         self.es_pass = es_pass
+        self.client_options = client_options or {}
+        self.template = template
+        self.bulk_load = bulk_load
+        self.bulk_load_rows = bulk_load_rows
+        self.bucket = bucket
+        self._template_installed = False
+
+    def connect(self):
+        """Return the client shared by every provider and exporter using the same server and options"""
+        return get_client(self.es_url, self.es_user, self.es_pass, **self.client_options)
     
     def export_func(self, data, interval):
-        es = Elasticsearch(self.es_url, http_compress=True, verify_certs=False, http_auth=(self.es_user, self.es_pass))
+        es = self.connect()
+        self.install_template(es)
         for pair in data.keys():
+            if self.bucket is not None:
+                self._export_buckets(es, pair, data[pair], interval)
+                continue
             index_name = f'f-{pair.lower()}-{interval}'
-            helpers.bulk(es, ElasticDataExporter.doc_generator(data[pair], index_name))
+            dataframe = data[pair]
+            if dataframe.shape[0] == 0:
+                continue
+            high_water_mark = self._read_high_water_mark(es, index_name, dataframe.index) if self.incremental else None
+            last = dataframe.index[-1]
+            if high_water_mark is not None:
+                cutoff = self._cutoff(high_water_mark, interval)
+                dataframe = dataframe[dataframe.index > cutoff]
+                # _id is the timestamp, so indexing an existing bar again replaces it
+                with self._bulk_settings(es, index_name, len(dataframe)), stage('bulk', pair):
+                    helpers.bulk(es, ElasticDataExporter.doc_generator(dataframe, index_name))
+                high_water_mark = max(high_water_mark, last)
+            else:
+                with self._bulk_settings(es, index_name, len(dataframe)), stage('bulk', pair):
+                    helpers.bulk(es, ElasticDataExporter.doc_generator(dataframe, index_name))
+                high_water_mark = last
+            # older documents may exist in the index, the coverage is merged
+            self._updateCatalog(pair, interval, dataframe, complete=False)
+            if self.incremental:
+                self._write_high_water_mark(es, index_name, high_water_mark)
+
+    def _export_buckets(self, es, pair : str, dataframe : pd.DataFrame, interval : str) -> None:
+        """Write the bars of a pair as one document by bucket. A bucket partly written before is merged with the new bars"""
+        index_name = bucket_index(pair, interval)
+        if dataframe.shape[0] == 0:
+            return
+        high_water_mark = self._read_high_water_mark(es, index_name, dataframe.index) if self.incremental else None
+        last = dataframe.index[-1]
+        if high_water_mark is not None:
+            dataframe = dataframe[dataframe.index > self._cutoff(high_water_mark, interval)]
+            if dataframe.shape[0] == 0:
+                return
+            # the first bucket already holds bars before the cutoff
+            previous = self._read_bucket(es, index_name, dataframe.index[0].floor(self.bucket), dataframe.index)
+            if previous is not None:
+                previous = previous[~previous.index.isin(dataframe.index)]
+                dataframe = pd.concat([previous, dataframe]).sort_index()
+            high_water_mark = max(high_water_mark, last)
+        else:
+            high_water_mark = last
+        with self._bulk_settings(es, index_name, len(dataframe)), stage('bulk', pair):
+            helpers.bulk(es, self.bucket_generator(dataframe, index_name, self.bucket))
+        self._updateCatalog(pair, interval, dataframe, complete=False)
+        if self.incremental:
+            self._write_high_water_mark(es, index_name, high_water_mark)
+
+    def _read_bucket(self, es, index_name : str, start : pd.Timestamp, index : pd.DatetimeIndex) -> Optional[pd.DataFrame]:
+        """Return the bars stored in a bucket document, None if it does not exist"""
+        try:
+            document = es.get(index=index_name, id=start.isoformat())['_source']
+        except NotFoundError:
+            return None
+        dates = pd.to_datetime(document['dates'], unit='ms', utc=True)
+        dates = dates.tz_convert(index.tz) if index.tz is not None else dates.tz_convert(None)
+        fields = {
+            key : np.array(values, dtype=np.float64) for key, values in document.items()
+            if key not in ('@timestamp', 'end', 'dates', 'tz')
+        }
+        return pd.DataFrame(fields, index=pd.DatetimeIndex(dates, name=index.name))
+
+    @staticmethod
+    def bucket_generator(df : pd.DataFrame, index_name : str, bucket : str):
+        """Yield one bulk action by bucket of bars : the dates in epoch milliseconds and one array by column, nan as null"""
+        columns = [column for column in df.columns if not column.startswith('obv')]
+        names = [elastic_field(column) for column in columns]
+        values = df[columns].to_numpy(dtype=np.float64)
+        utc = df.index.tz_convert('UTC') if df.index.tz is not None else df.index.tz_localize('UTC')
+        milliseconds = utc.asi8 // 1_000_000
+        starts = df.index.floor(bucket)
+        # rows of the same bucket are consecutive : split where the bucket changes
+        bounds = np.flatnonzero(starts[1:] != starts[:-1]) + 1
+        for first, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(df)]])):
+            block = values[first:stop]
+            document = {
+                '@timestamp': starts[first].isoformat(),
+                'end': df.index[stop - 1].isoformat(),
+                'tz': str(df.index.tz) if df.index.tz is not None else None,
+                'dates': milliseconds[first:stop].tolist(),
+            }
+            for i, name in enumerate(names):
+                column = block[:, i]
+                document[name] = np.where(np.isnan(column), None, column).tolist()
+            yield {
+                "_index": index_name,
+                "_id": document['@timestamp'],
+                "_source": document,
+            }
+
+    def catalogSource(self) -> str:
+        return f'elastic:{self.es_url}'
+
+    def install_template(self, es = None) -> None:
+        """Install the index template if there is one and it is not installed yet. It applies to the indices created after"""
+        if self.template is None or self._template_installed:
+            return
+        es = es or self.connect()
+        es.indices.put_index_template(name=INDEX_TEMPLATE, **self.template)
+        self._template_installed = True
+
+    @contextmanager
+    def _bulk_settings(self, es, index_name : str, rows : int):
+        """Disable the refresh and the replicas of an index during a bulk load of rows bars when bulk_load is set
+        and rows reaches bulk_load_rows, then restore them"""
+        if not self.bulk_load or rows < self.bulk_load_rows:
+            yield
+            return
+        if not es.indices.exists(index=index_name):
+            # created now so that its settings can be changed before the first document
+            es.indices.create(index=index_name)
+        settings = es.indices.get_settings(index=index_name, flat_settings=True)[index_name]['settings']
+        es.indices.put_settings(index=index_name, settings={'index.refresh_interval': '-1', 'index.number_of_replicas': 0})
+        try:
+            yield
+        finally:
+            # None resets a setting which was not set to its default value
+            es.indices.put_settings(index=index_name, settings={
+                'index.refresh_interval': settings.get('index.refresh_interval'),
+                'index.number_of_replicas': settings.get('index.number_of_replicas'),
+            })
+            es.indices.refresh(index=index_name)
+
+    def _read_high_water_mark(self, es, index_name : str, index : pd.DatetimeIndex) -> Optional[pd.Timestamp]:
+        try:
+            document = es.get(index=METADATA_INDEX, id=index_name)
+        except NotFoundError:
+            return None
+        return parse_date_like(document['_source']['high_water_mark'], index)
+
+    def _write_high_water_mark(self, es, index_name : str, high_water_mark : pd.Timestamp) -> None:
+        es.index(
+            index=METADATA_INDEX,
+            id=index_name,
+            document={'index': index_name, 'high_water_mark': high_water_mark.isoformat()})
 
 
     def doc_generator(df, index_name):
@@ -100,7 +762,7 @@ class ElasticDataExporter(DataExporter):
             for k in data_dict:
                 # if does not begin with obv
                 if not k.startswith('obv'):
-                    key_name = k.lower().replace('.', '_')
+                    key_name = elastic_field(k)
                     value = data_dict[k]
                     data_result[key_name] = value
 
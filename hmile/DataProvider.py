@@ -1,21 +1,36 @@
 import os
+import io
+import copy
+import json
+import zlib
+import threading
 from logging.handlers import DatagramHandler
 import pandas as pd
 import yfinance as yf
 import requests as r
 from datetime import datetime
-from elasticsearch import Elasticsearch
 from datetime import timedelta
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
+from collections import OrderedDict
+from collections.abc import Mapping
 
 import numpy as np
+try:
+    import zarr
+except ImportError:
+    zarr = None
 
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
 
 from hmile.Exception import (DataframeFormatException,
                              DataProviderArgumentException,
-                             DataNotAvailableException)
+                             DataNotAvailableException,
+                             PolygonRequestException)
+from hmile.ElasticClient import get_client
 from hmile.FillPolicy import FillPolicyAkima
+from hmile.Profiling import stage
+from hmile.utils import parse_date_like
 
 yahoointervalconverter = {
     'minute': '1m',
@@ -28,6 +43,22 @@ interval_to_timedelta = {
     'day' : timedelta(days=1)
 }
 
+# extension of the csv files by compression
+csv_extensions = {
+    None : '.csv',
+    'gzip' : '.csv.gz',
+    'zstd' : '.csv.zst',
+}
+
+def elastic_field(column : str) -> str:
+    """Return the name of the elasticsearch field of a column : ElasticDataExporter stores it lowercased with '.' replaced by '_'"""
+    return column.lower().replace('.', '_')
+
+def bucket_index(pair : str, interval : str) -> str:
+    """Return the name of the elasticsearch index holding the bars of a pair grouped by buckets"""
+    return f'f-{pair.lower()}-{interval}-buckets'
+
+
 class DataProvider(ABC):
     """
     Provide an abstraction layer on the way to get data from a source
@@ -36,13 +67,16 @@ class DataProvider(ABC):
     :ivar interval: day, hour or minute
     :ivar start: date of the first data to get
     :ivar end: date of the last data to get
+    :ivar columns: columns to get in addition to open, high, low, close and volume, None for every column.
+        Providers read only these columns from their source when they can
     """
     def __init__(
         self,
         pairs : List[str],
         interval : str,
         start : str,
-        end : str) -> None:
+        end : str,
+        columns : Optional[List[str]] = None) -> None:
         """Inialize a DataProvider
 
         Args:
@@ -50,6 +84,7 @@ class DataProvider(ABC):
             interval (str): should be like day, hour or minute
             start (str): should be like 2020-12-31
             end (str): should be > start
+            columns (Optional[List[str]], optional): columns to get in addition to ohlcv. Defaults to None (every column).
 
         Raises:
             DataframeFormatException: When the dataframe does not correspond to hmile norm
@@ -60,34 +95,74 @@ class DataProvider(ABC):
         self.interval = interval
         self.start_date = start
         self.end_date = end
+        self.columns = columns
         self.fill_policy = FillPolicyAkima(self.interval) 
+        # optional hmile.Catalog.DataCatalog kept up to date with what the source contains
+        self.catalog = None
 
-    def getData(self) -> Dict[str, pd.DataFrame]:
+    def getData(self,
+            lazy : bool = False,
+            prefetch : int = 2,
+            max_items : Optional[int] = 8,
+            max_bytes : Optional[int] = None) -> Dict[str, pd.DataFrame]:
         """
         Return a dict of dataframes with the key the pair and the value the corresponding dataframe.
         Every dataframe should have the same columns and the same index : 
         The main columns are named be open, high, low, close, volume. In index is the date.
         The index name is'date'
+
+        Args:
+            lazy (bool, optional): return a LazyData mapping getting each pair on first access. Defaults to False.
+            prefetch (int, optional): with lazy, number of pairs got in advance after an access. Defaults to 2.
+            max_items (Optional[int], optional): with lazy, maximum number of dataframes kept. Defaults to 8.
+            max_bytes (Optional[int], optional): with lazy, maximum memory used by the dataframes kept. Defaults to None (no limit).
         
         Returns:
             Dict[str, pd.DataFrame]: The dict of dataframes
         """
-        result = {}
-        for pair in self.pairs:
-            try:
+        if lazy:
+            return LazyData(self, prefetch, max_items, max_bytes)
+        try:
+            return {pair : self.getPair(pair) for pair in self.pairs}
+        finally:
+            self.flushCatalog()
+
+    def getPair(self, pair : str) -> pd.DataFrame:
+        """Get, check and fill the dataframe of one pair
+
+        Args:
+            pair (str): name of the pair
+
+        Raises:
+            DataNotAvailableException: if the source has no data for the pair between the dates
+
+        Returns:
+            pd.DataFrame: the dataframe of the pair
+        """
+        # the catalog knows that the source has nothing for these dates
+        if self.catalog is not None and not self.catalog.available(
+                self.catalogSource(), pair, self.interval, self.start_date, self.end_date):
+            raise DataNotAvailableException(pair, self.start_date, self.end_date)
+        try:
+            with stage('download', pair):
                 dataframe = self._getOnePair(pair)
-            except Exception as e:
-                # we first check if the exception is not a hmile exception
-                if isinstance(e, NotImplementedError):
-                    raise e
-                raise DataNotAvailableException(pair, self.start_date, self.end_date)
-            # if len dataframe == 0 we raise an exception
-            if dataframe.shape[0] == 0:
-                raise DataNotAvailableException(pair, self.start_date, self.end_date)
-            # we check the dataframe
-            dataframe = self.checkDataframe(dataframe)
-            result[pair] = dataframe
-        return result
+        except Exception as e:
+            # we first check if the exception is not a hmile exception
+            if isinstance(e, NotImplementedError):
+                raise e
+            raise DataNotAvailableException(pair, self.start_date, self.end_date)
+        # if len dataframe == 0 we raise an exception
+        if dataframe.shape[0] == 0:
+            raise DataNotAvailableException(pair, self.start_date, self.end_date)
+        if self.catalog is not None:
+            self.catalog.update(self.catalogSource(), pair, self.interval, dataframe)
+        # sources which can not read only some columns return all of them
+        projection = self.projection()
+        if projection is not None:
+            dataframe = dataframe[[column for column in projection if column in dataframe.columns]]
+        # we check the dataframe
+        with stage('check', pair):
+            return self.checkDataframe(dataframe)
        
     @abstractmethod
     def _getOnePair(self, pair_name) -> pd.DataFrame:
@@ -101,6 +176,37 @@ class DataProvider(ABC):
         """
         raise NotImplementedError()
     
+    def restrict(self,
+            pairs : Optional[List[str]] = None,
+            start_date : Optional[str] = None,
+            end_date : Optional[str] = None) -> 'DataProvider':
+        """Return a copy of the provider getting only some pairs or dates. The catalog is shared with the copy
+
+        Args:
+            pairs (Optional[List[str]], optional): pairs to get. Defaults to None (same pairs).
+            start_date (Optional[str], optional): first date to get. Defaults to None (same start date).
+            end_date (Optional[str], optional): last date to get. Defaults to None (same end date).
+
+        Raises:
+            DataProviderArgumentException: When the arguments are not correct
+
+        Returns:
+            DataProvider: the restricted copy
+        """
+        provider = copy.copy(self)
+        provider.pairs = list(pairs) if pairs is not None else list(self.pairs)
+        provider.start_date = start_date or self.start_date
+        provider.end_date = end_date or self.end_date
+        provider.checkArguments(provider.pairs, provider.interval, provider.start_date, provider.end_date)
+        return provider
+
+    def projection(self) -> Optional[List[str]]:
+        """Return the columns to read from the source : ohlcv then the other selected columns, None for every column"""
+        if self.columns is None:
+            return None
+        ohlcv = ['open', 'high', 'low', 'close', 'volume']
+        return ohlcv + [column for column in dict.fromkeys(self.columns) if column not in ohlcv]
+
     def checkDataframe(self, dataframe):
         """Check if first columns in the dataframes are open, high, low, close, volume. 
         Check if index is a date and if the interval is the same between all rows"""
@@ -114,7 +220,8 @@ class DataProvider(ABC):
         if not dataframe.index.is_unique:
             raise DataframeFormatException('The index of the dataframe should be unique', dataframe)
         if not dataframe.index.freq:
-            dataframe = self.fill_policy(dataframe)
+            with stage('fill'):
+                dataframe = self.fill_policy(dataframe)
         if dataframe.index.name != 'date':
             raise DataframeFormatException('The index name should be date', dataframe)
         return dataframe
@@ -192,7 +299,175 @@ class DataProvider(ABC):
             List[str]: the list of available pairs
         """
         raise NotImplementedError(f'{self.__class__.__name__} does not implement getAvailablePairs()')
+
+    def catalogSource(self) -> str:
+        """Return the name of the source in the catalog. Providers reading the same data should return the same name
+
+        Returns:
+            str: name of the source
+        """
+        return self.__class__.__name__
+
+    def flushCatalog(self) -> None:
+        """Save the updates of the catalog, if any. getData calls it once all the pairs are got"""
+        if self.catalog is not None:
+            self.catalog.flush()
+
+    def _cachedPairs(self, listing, source : Optional[str] = None) -> List[str]:
+        """Return the available pairs known by the catalog, or list them and record them in the catalog
+
+        Args:
+            listing (Callable[[], List[str]]): function listing the pairs of the source
+            source (Optional[str], optional): name of the listing in the catalog. Defaults to catalogSource().
+
+        Returns:
+            List[str]: the list of available pairs
+        """
+        source = source or self.catalogSource()
+        if self.catalog is not None:
+            pairs = self.catalog.pairs(source, self.interval)
+            if pairs is not None:
+                return pairs
+        pairs = listing()
+        if self.catalog is not None:
+            self.catalog.set_pairs(source, self.interval, pairs)
+        return pairs
     
+class LazyData(Mapping):
+    """
+    Read-only mapping of pairs to dataframes returned by getData(lazy=True). A pair is got, checked and filled
+    on its first access, while the next pairs are got in the background. Only the max_items last used dataframes
+    (and at most max_bytes) are kept, prefetched ones included : an evicted or released pair is got again on its next access.
+    Pairs are in the order of the provider, so iterating over the items goes through them with bounded memory.
+
+    :ivar dataprovider: provider of the pairs
+    :ivar pairs: pairs of the mapping
+    :ivar prefetch: number of pairs got in advance after an access
+    :ivar max_items: maximum number of dataframes kept, None for no limit
+    :ivar max_bytes: maximum memory used by the dataframes kept, None for no limit
+    """
+    def __init__(self,
+            dataprovider : DataProvider,
+            prefetch : int = 2,
+            max_items : Optional[int] = 8,
+            max_bytes : Optional[int] = None) -> None:
+        """Create the mapping, nothing is got before the first access
+
+        Args:
+            dataprovider (DataProvider): provider of the pairs
+            prefetch (int, optional): number of pairs got in advance after an access. Defaults to 2.
+            max_items (Optional[int], optional): maximum number of dataframes kept. Defaults to 8.
+            max_bytes (Optional[int], optional): maximum memory used by the dataframes kept. Defaults to None (no limit).
+        """
+        self.dataprovider = dataprovider
+        self.pairs = list(dataprovider.pairs)
+        self.prefetch = prefetch
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._frames : OrderedDict = OrderedDict()
+        self._pending : dict = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch) if prefetch > 0 else None
+
+    def __getitem__(self, pair : str) -> pd.DataFrame:
+        if pair not in self.pairs:
+            raise KeyError(pair)
+        with self._lock:
+            dataframe = self._frames.get(pair)
+            future = self._pending.pop(pair, None) if dataframe is None else None
+            if dataframe is not None:
+                self._frames.move_to_end(pair)
+        if dataframe is None:
+            dataframe = future.result() if future is not None else self.dataprovider.getPair(pair)
+            self._store(pair, dataframe)
+        self._prefetch(pair)
+        return dataframe
+
+    def __contains__(self, pair) -> bool:
+        # Mapping would get the pair to answer
+        return pair in self.pairs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.pairs)
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def loaded(self) -> List[str]:
+        """Return the pairs whose dataframe is in memory, the least recently used first"""
+        with self._lock:
+            return list(self._frames.keys())
+
+    def release(self, pair : Optional[str] = None) -> None:
+        """Free the dataframe of a pair, or of every pair if pair is None"""
+        with self._lock:
+            if pair is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(pair, None)
+
+    def close(self) -> None:
+        """Stop the background downloads, free every dataframe and save the catalog of the provider"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        # cancelled futures run their callback, which takes the lock
+        for future in pending:
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.release()
+        self.dataprovider.flushCatalog()
+
+    def __enter__(self) -> 'LazyData':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _store(self, pair : str, dataframe : pd.DataFrame) -> None:
+        """Keep a dataframe and evict the least recently used ones above max_items or max_bytes"""
+        with self._lock:
+            self._frames[pair] = dataframe
+            self._frames.move_to_end(pair)
+            while len(self._frames) > 1 and (
+                    (self.max_items is not None and len(self._frames) > self.max_items)
+                    or (self.max_bytes is not None and self._bytes() > self.max_bytes)):
+                self._frames.popitem(last=False)
+
+    def _bytes(self) -> int:
+        return sum(int(dataframe.memory_usage(index=True).sum()) for dataframe in self._frames.values())
+
+    def _prefetch(self, pair : str) -> None:
+        """Start getting the pairs following an accessed pair"""
+        if self._executor is None:
+            return
+        position = self.pairs.index(pair)
+        # prefetched pairs must not evict the accessed one
+        count = self.prefetch if self.max_items is None else min(self.prefetch, self.max_items - 1)
+        submitted = []
+        with self._lock:
+            for following in self.pairs[position + 1:position + 1 + count]:
+                if following not in self._frames and following not in self._pending:
+                    future = self._executor.submit(self.dataprovider.getPair, following)
+                    self._pending[following] = future
+                    submitted.append((following, future))
+        # a future already done runs its callback now, which takes the lock
+        for following, future in submitted:
+            future.add_done_callback(lambda future, following=following: self._prefetched(following, future))
+
+    def _prefetched(self, pair : str, future) -> None:
+        """Keep the result of a background download with the other dataframes, so that it counts in the limits"""
+        with self._lock:
+            if self._pending.get(pair) is not future:
+                # already taken by __getitem__ or cancelled by close
+                return
+            del self._pending[pair]
+            if not future.cancelled() and future.exception() is None:
+                self._store(pair, future.result())
+
+
 class YahooDataProvider(DataProvider):
     """
     Get data from Yahoo Finance
@@ -222,6 +497,9 @@ class YahooDataProvider(DataProvider):
         super().__init__(pairs, interval, start_date, end_date)
         self.market = market
 
+    def catalogSource(self) -> str:
+        return f'yahoo:{self.market}'
+
     def _getOnePair(self, pair) -> pd.DataFrame :        
         # convert interval into yahoo format
         yinterval = yahoointervalconverter[self.interval]
@@ -260,7 +538,10 @@ class YahooDataProvider(DataProvider):
 
 class CSVDataProvider(DataProvider):
     """
-    Get data from CSV file. The file name must be in the format f-{pair}-{interval}.csv
+    Get data from CSV file. The file name must be in the format f-{pair}-{interval}.csv,
+    or f-{pair}-{interval}.csv.gz / .csv.zst for files compressed with gzip or zstd.
+    If a seek index f-{pair}-{interval}.csv.idx written by CSVDataExporter exists, only the rows
+    around the requested dates are read. Otherwise the file is read by chunks until end_date is passed.
     
     :ivar pairs: list of pairs to get
     :ivar interval: The interval of the data
@@ -268,6 +549,8 @@ class CSVDataProvider(DataProvider):
     :ivar end_date: The end date
     :ivar fill_policy: The fill policy to use
     :ivar directory: The directory where the csv files are
+    :ivar chunksize: number of rows parsed at once when there is no seek index
+    :ivar columns: columns to parse in addition to open, high, low, close and volume, None for every column
     """
 
     def __init__(self,
@@ -275,7 +558,9 @@ class CSVDataProvider(DataProvider):
         start_date : str,
         end_date : str,
         directory : str,
-        interval : str = 'hour'):
+        interval : str = 'hour',
+        chunksize : int = 100000,
+        columns : Optional[List[str]] = None):
         """Initialize a CSVDataProvider
 
         Args:
@@ -283,12 +568,31 @@ class CSVDataProvider(DataProvider):
             start_date (datetime.datetime): First date to get. Format : YYYY-MM-DD.
             end_date (datetime.datetime): Last date to get. Format : YYYY-MM-DD.
             interval (str, optional): Can be day, hour, or minute.
+            chunksize (int, optional): number of rows parsed at once when there is no seek index. Defaults to 100000.
+            columns (Optional[List[str]], optional): columns to parse in addition to ohlcv. Defaults to None (every column).
         """
-        super().__init__(pairs, interval, start_date, end_date)
+        super().__init__(pairs, interval, start_date, end_date, columns)
         self.directory = directory
+        self.chunksize = chunksize
 
     def _getOnePair(self, pair) -> pd.DataFrame:
-        data = pd.read_csv(f'{self.directory}/f-{pair.lower()}-{self.interval}.csv')
+        name = self._findFile(pair)
+        df = self._readIndexed(name)
+        if df is None:
+            df = self._readChunks(name)
+        df = self.normalizeColumnsOrder(df)
+        return df
+
+    def _findFile(self, pair : str) -> str:
+        """Return the path of the csv file of a pair, uncompressed first"""
+        base = f'{self.directory}/f-{pair.lower()}-{self.interval}'
+        for extension in csv_extensions.values():
+            if os.path.isfile(base + extension):
+                return base + extension
+        return base + csv_extensions[None]
+
+    def _formatCsv(self, data : pd.DataFrame) -> pd.DataFrame:
+        """Rename the columns of a parsed csv and index it by date"""
         df = data.rename(columns={'Open': 'open', 
                                 'High': 'high', 
                                 'Low': 'low', 
@@ -297,24 +601,76 @@ class CSVDataProvider(DataProvider):
         df.rename({'Unnamed: 0': 'date'}, axis=1, inplace=True)
         df.index = pd.to_datetime(df['date'])
         df.drop(columns=['date'], inplace=True)
-        df = df[np.logical_and(df.index >= self.start_date, df.index <= self.end_date)]
-        df = self.normalizeColumnsOrder(df)
         return df
 
+    def _usecols(self):
+        """Return the usecols argument of read_csv : the date and the selected columns, None for every column"""
+        projection = self.projection()
+        if projection is None:
+            return None
+        # files may have been written with capitalized ohlcv names
+        wanted = set(projection) | {'Unnamed: 0', 'date', 'Open', 'High', 'Low', 'Close', 'Volume'}
+        return lambda column: column in wanted
+
+    def _inRange(self, df : pd.DataFrame) -> pd.DataFrame:
+        return df[np.logical_and(df.index >= self.start_date, df.index <= self.end_date)]
+
+    def _readChunks(self, name : str) -> pd.DataFrame:
+        """Parse the csv file by chunks and stop at the first chunk after end_date"""
+        chunks = []
+        for chunk in pd.read_csv(name, chunksize=self.chunksize, usecols=self._usecols()):
+            chunk = self._formatCsv(chunk)
+            chunks.append(self._inRange(chunk))
+            if chunk.shape[0] and chunk.index[-1] > parse_date_like(self.end_date, chunk.index):
+                break
+        return pd.concat(chunks)
+
+    def _readIndexed(self, name : str) -> Optional[pd.DataFrame]:
+        """Parse only the rows of the csv file between start_date and end_date with the seek index
+
+        Returns:
+            Optional[pd.DataFrame]: the rows, None if there is no up to date seek index
+        """
+        if not name.endswith(csv_extensions[None]) or not os.path.isfile(f'{name}.idx'):
+            return None
+        with open(f'{name}.idx') as f:
+            seek_index = json.load(f)
+        if seek_index['size'] != os.path.getsize(name) or not seek_index['offsets']:
+            return None
+        dates = pd.to_datetime(seek_index['dates'])
+        offsets = seek_index['offsets']
+        first = max(dates.searchsorted(parse_date_like(self.start_date, dates), side='right') - 1, 0)
+        last = dates.searchsorted(parse_date_like(self.end_date, dates), side='right')
+        with open(name, 'rb') as f:
+            header = f.readline()
+            f.seek(offsets[first])
+            if last < len(offsets):
+                content = f.read(offsets[last] - offsets[first])
+            else:
+                content = f.read()
+        df = self._formatCsv(pd.read_csv(io.BytesIO(header + content), usecols=self._usecols()))
+        return self._inRange(df)
+
+    def catalogSource(self) -> str:
+        return f'csv:{os.path.abspath(self.directory)}'
+
     def getAvailablePairs(self) -> List[str]:
         """Return the list of available pairs
 
         Returns:
             List[str]: the list of available pairs
         """
+        return self._cachedPairs(self._listPairs)
+
+    def _listPairs(self) -> List[str]:
         files = os.listdir(self.directory)
-        pairs = []
+        pairs = set()
         for f in files:
-            if f.startswith('f-') and f.endswith(f'-{self.interval}.csv'):
-                pair = f[2:-len(f'-{self.interval}.csv')]
-                pairs.append(pair.upper())
-        pairs.sort()
-        return pairs
+            for extension in csv_extensions.values():
+                if f.startswith('f-') and f.endswith(f'-{self.interval}{extension}'):
+                    pair = f[2:-len(f'-{self.interval}{extension}')]
+                    pairs.add(pair.upper())
+        return sorted(pairs)
 
 
 class ElasticDataProvider(DataProvider):
@@ -330,6 +686,9 @@ class ElasticDataProvider(DataProvider):
     :ivar es_url: The url of the elasticsearch server
     :ivar es_user: The elasticsearch user to connect to
     :ivar es_pass: The elasticsearch password to connect to
+    :ivar client_options: options of the shared client, see hmile.ElasticClient.get_client
+    :ivar columns: fields to download in addition to open, high, low, close and volume, None for every field
+    :ivar buckets: read the documents of several bars written by ElasticDataExporter with bucket, from the indices f-{pair}-{interval}-buckets
     """
     def __init__(self,
             pairs : List[str],
@@ -338,7 +697,10 @@ class ElasticDataProvider(DataProvider):
             es_url : str,
             es_user : str,
             es_pass : str,
-            interval : str = 'hour') -> None:
+            interval : str = 'hour',
+            client_options : Optional[Dict] = None,
+            columns : Optional[List[str]] = None,
+            buckets : bool = False) -> None:
         """Initialize a ElasticsearchDataprovider
 
         Args:
@@ -349,19 +711,21 @@ class ElasticDataProvider(DataProvider):
             es_user (str): name of the user for elasticsearch connection
             es_pass (str): password of the user for elasticsearch connection
             interval (str, optional): Can be day, hour, or minute.
+            client_options (Optional[Dict], optional): pool size, timeouts, retries and sniffing of the client,
+                see hmile.ElasticClient.get_client. Defaults to None.
+            columns (Optional[List[str]], optional): fields to download in addition to ohlcv. Defaults to None (every field).
+            buckets (bool, optional): read documents of several bars written by ElasticDataExporter with bucket. Defaults to False.
         """
-        super().__init__(pairs, interval, start_date, end_date)
+        super().__init__(pairs, interval, start_date, end_date, columns)
         self.es_url = es_url
         self.es_user = es_user
         self.es_pass = es_pass
+        self.client_options = client_options or {}
+        self.buckets = buckets
 
     def connect(self):
-        return Elasticsearch(
-            self.es_url,
-            http_compress=True,
-            verify_certs=False,
-            http_auth=(self.es_user, self.es_pass),
-        )
+        """Return the client shared by every provider and exporter using the same server and options"""
+        return get_client(self.es_url, self.es_user, self.es_pass, **self.client_options)
 
     def __download(self, from_, to, index_name):
         es = self.connect()
@@ -379,6 +743,10 @@ class ElasticDataProvider(DataProvider):
                 }
             }
         }
+        fields = self._projectionFields()
+        if fields is not None:
+            # the server sends only these fields of the documents
+            query['_source'] = {'includes': ['@timestamp'] + list(fields)}
         result = es.search(index=index_name, body=query, size=10000)['hits']['hits']
         result = [x['_source'] for x in result]
         return result
@@ -408,21 +776,81 @@ class ElasticDataProvider(DataProvider):
         data.rename({'@timestamp': 'date'}, axis=1, inplace=True)
         return data
 
+    def _downloadBuckets(self, pair : str, page : int = 1000) -> pd.DataFrame:
+        """Download the buckets overlapping the dates, in date order, and keep only the bars between the dates"""
+        es = self.connect()
+        query = {
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"range": {"@timestamp": {"lte": self.end_date}}},
+                        {"range": {"end": {"gte": self.start_date}}},
+                    ]
+                }
+            },
+            "sort": [{"@timestamp": "asc"}],
+        }
+        projected = self._projectionFields()
+        if projected is not None:
+            query['_source'] = {'includes': ['@timestamp', 'end', 'dates', 'tz'] + list(projected)}
+        documents = []
+        while True:
+            hits = es.search(index=bucket_index(pair, self.interval), body=query, size=page)['hits']['hits']
+            documents += [hit['_source'] for hit in hits]
+            if len(hits) < page:
+                break
+            query['search_after'] = hits[-1]['sort']
+        if not documents:
+            return pd.DataFrame()
+        fields = [key for key in documents[0].keys() if key not in ('@timestamp', 'end', 'dates', 'tz')]
+        index = pd.to_datetime(np.concatenate([document['dates'] for document in documents]), unit='ms', utc=True)
+        tz = documents[0].get('tz')
+        index = index.tz_convert(tz) if tz is not None else index.tz_convert(None)
+        index.name = 'date'
+        data = pd.DataFrame({
+            field : np.concatenate([np.array(document[field], dtype=np.float64) for document in documents])
+            for field in fields
+        }, index=index)
+        # buckets at the bounds hold bars outside of the dates
+        data = data[np.logical_and(data.index >= parse_date_like(self.start_date, data.index),
+                                   data.index <= parse_date_like(self.end_date, data.index))]
+        if projected is not None:
+            data = data.rename(columns=projected)
+        return self.normalizeColumnsOrder(data)
+
     def _getOnePair(self, pair) -> pd.DataFrame:
+        if self.buckets:
+            return self._downloadBuckets(pair)
         start = datetime.strptime(self.start_date, '%Y-%m-%d')
         end = datetime.strptime(self.end_date, '%Y-%m-%d')
         data = self.__download_data(pair, self.interval, start, end)
         data.index = pd.to_datetime(data['date'])
         data.drop(columns=['date'], inplace=True)
+        fields = self._projectionFields()
+        if fields is not None:
+            data = data.rename(columns=fields)
         data = self.normalizeColumnsOrder(data)
         return data
 
+    def _projectionFields(self) -> Optional[Dict[str, str]]:
+        """Return the projected columns by elasticsearch field name, None for every field"""
+        projection = self.projection()
+        if projection is None:
+            return None
+        return {elastic_field(column) : column for column in projection}
+
+    def catalogSource(self) -> str:
+        return f'elastic:{self.es_url}'
+
     def getAvailablePairs(self) -> List[str]:
         """Return the list of available pairs
 
         Returns:
             List[str]: the list of available pairs
         """
+        return self._cachedPairs(self._listPairs)
+
+    def _listPairs(self) -> List[str]:
         es = self.connect()
         indices = es.cat.indices(h='index', s='index').split()
         pairs = []
@@ -443,41 +871,176 @@ class PolygonDataProvider(DataProvider):
     :ivar end_date: The end date
     :ivar fill_policy: The fill policy to use
     :ivar key: The polygon api key to use
+    :ivar workers: number of requests sent at the same time for one pair
+    :ivar max_bars: maximum number of bars returned by one request
+    :ivar grouped: use the grouped daily endpoint, which returns the bar of every ticker for a day in one request.
+        None to use it when interval is day and there are at least grouped_min_pairs pairs
+    :ivar grouped_min_pairs: number of pairs from which the grouped daily endpoint is used
+    :ivar market: market of the grouped daily requests : crypto, stocks or fx
     """
+    # pairs=[ALL_PAIRS] gets every ticker of the market, only with the grouped daily endpoint
+    ALL_PAIRS = '*'
+
     def __init__(self, 
             pairs : List[str],
             start_date : str,
             end_date : str,
             api_key : str,
-            interval : str = 'hour'):
+            interval : str = 'hour',
+            workers : int = 8,
+            max_bars : int = 50000,
+            grouped : Optional[bool] = None,
+            grouped_min_pairs : int = 20,
+            market : str = 'crypto'):
         """Create a PolygonDataProvider
 
         Args:
-            pairs (List[str]): exemple BTCUSD
+            pairs (List[str]): exemple BTCUSD, or [PolygonDataProvider.ALL_PAIRS] for every ticker (grouped daily only)
             start_date (datetime.datetime): First date to get. Format : YYYY-MM-DD.
             end_date (datetime.datetime): Last date to get. Format : YYYY-MM-DD.
             api_key (str): api key for polygon.io
             interval (str, optional): Can be day, hour, or minute.
+            workers (int, optional): number of requests sent at the same time for one pair. Defaults to 8.
+            max_bars (int, optional): maximum number of bars returned by one request (polygon limit). Defaults to 50000.
+            grouped (Optional[bool], optional): use the grouped daily endpoint. Defaults to None (automatic).
+            grouped_min_pairs (int, optional): number of pairs from which the grouped daily endpoint is used. Defaults to 20.
+            market (str, optional): market of the grouped daily requests : crypto, stocks or fx. Defaults to crypto.
+
+        Raises:
+            DataProviderArgumentException: if the grouped daily endpoint is required for another interval than day
         """
         super().__init__(pairs, interval, start_date, end_date)
         self.api_key = api_key
+        self.workers = workers
+        self.max_bars = max_bars
+        self.grouped = grouped
+        self.grouped_min_pairs = grouped_min_pairs
+        self.market = market
+        if (grouped or pairs == [self.ALL_PAIRS]) and interval != 'day':
+            raise DataProviderArgumentException('the grouped daily endpoint only provides day bars')
+        if pairs == [self.ALL_PAIRS] and grouped is False:
+            raise DataProviderArgumentException('every pair can only be requested with the grouped daily endpoint')
+        self._grouped_data : Optional[Dict[str, pd.DataFrame]] = None
+
+    def useGrouped(self) -> bool:
+        """Return True if getData downloads the bars of every ticker day by day"""
+        if self.grouped is not None:
+            return self.grouped
+        return self.interval == 'day' and (self.pairs == [self.ALL_PAIRS] or len(self.pairs) >= self.grouped_min_pairs)
+
+    def getData(self,
+            lazy : bool = False,
+            prefetch : int = 2,
+            max_items : Optional[int] = 8,
+            max_bytes : Optional[int] = None) -> Dict[str, pd.DataFrame]:
+        if not self.useGrouped():
+            return super().getData(lazy, prefetch, max_items, max_bytes)
+        # the grouped download gets every pair at once : lazy has no effect
+        pairs = self.pairs
+        try:
+            self._grouped_data = self._downloadGrouped()
+        except PolygonRequestException as e:
+            # a failed day is missing for every pair
+            raise DataNotAvailableException(','.join(pairs), self.start_date, self.end_date) from e
+        try:
+            if pairs == [self.ALL_PAIRS]:
+                self.pairs = sorted(self._grouped_data)
+            return super().getData()
+        finally:
+            self.pairs = pairs
+            self._grouped_data = None
+
+    def __downloadGroupedDay(self, day : str) -> list:
+        locale = 'us' if self.market == 'stocks' else 'global'
+        url = f'https://api.polygon.io/v2/aggs/grouped/locale/{locale}/market/{self.market}/{day}?adjusted=true&apiKey={self.api_key}'
+        json = r.get(url).json()
+        return self._results(json)
+
+    def _downloadGrouped(self) -> Dict[str, pd.DataFrame]:
+        """Download the bars of every ticker for every day between start_date and end_date, one request by day
+
+        Returns:
+            Dict[str, pd.DataFrame]: raw bars of the requested pairs (or of every ticker), by pair
+        """
+        days = pd.date_range(self.start_date, self.end_date, freq='D').strftime('%Y-%m-%d')
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(days)))) as executor:
+            pages = list(executor.map(self.__downloadGroupedDay, days))
+        records = pd.DataFrame([bar for page in pages for bar in page])
+        if records.shape[0] == 0:
+            return {}
+        records['T'] = records['T'].str.replace(r'^[XC]:', '', regex=True)
+        if self.pairs != [self.ALL_PAIRS]:
+            records = records[records['T'].isin([pair.upper() for pair in self.pairs])]
+        records = records.drop_duplicates(subset=['T', 't'], keep='last').sort_values(['T', 't'])
+        return {pair : bars for pair, bars in records.groupby('T', sort=False)}
         
     def __download(self, pair, interval, start, end):
-        url = f'https://api.polygon.io/v2/aggs/ticker/X:{pair}/range/1/{interval}/{start}/{end}?adjusted=true&sort=asc&limit=50000&apiKey=8RvtCtdRW2bFH8WBE9JoihuwmnFECybm'
+        url = f'https://api.polygon.io/v2/aggs/ticker/X:{pair}/range/1/{interval}/{start}/{end}?adjusted=true&sort=asc&limit={self.max_bars}&apiKey={self.api_key}'
         json = r.get(url).json()
-        return json['results']
-        
-    def _getOnePair(self, pair) -> pd.DataFrame:
+        return self._results(json)
+
+    @staticmethod
+    def _results(answer : dict) -> list:
+        """Return the bars of an answer of polygon
+
+        Args:
+            answer (dict): json answer of an aggregates request
+
+        Raises:
+            PolygonRequestException: if the request failed (rate limit, authentication...), so that the bars
+                of the request are not taken as missing and filled
+
+        Returns:
+            list: the bars, empty only if polygon has no bar for the request
+        """
+        if answer.get('status') not in ('OK', 'DELAYED') or 'error' in answer:
+            raise PolygonRequestException(answer.get('status'), answer.get('error') or answer.get('message'))
+        results = answer.get('results')
+        if results is None:
+            if answer.get('resultsCount', 0) != 0:
+                raise PolygonRequestException(answer.get('status'), 'results are missing')
+            return []
+        return results
+
+    def _windows(self, start : int, end : int) -> List[tuple]:
+        """Split a range of timestamps in windows holding at most max_bars bars
+
+        Args:
+            start (int): first timestamp in ms
+            end (int): last timestamp in ms
+
+        Returns:
+            List[tuple]: (first, last) timestamps in ms of each window, both included
+        """
+        size = int(interval_to_timedelta[self.interval].total_seconds() * 1000) * self.max_bars
+        return [(first, min(first + size - 1, end)) for first in range(start, end, size)]
+
+    def _downloadWindow(self, pair : str, start : int, end : int) -> list:
+        """Download every bar of a window, with more requests if polygon truncates the answer"""
+        step = int(interval_to_timedelta[self.interval].total_seconds() * 1000)
         data = []
-        last_datetime = datetime.strptime(self.start_date, '%Y-%m-%d')
-        end = datetime.strptime(self.end_date, '%Y-%m-%d')
-        while last_datetime < end:
-            start_timestamp = int(last_datetime.timestamp() * 1000)
-            end_timestamp = int((end).timestamp() * 1000)
-            current_data = self.__download(pair, self.interval, start_timestamp, end_timestamp)
+        while start <= end:
+            current_data = self.__download(pair, self.interval, start, end)
             data += current_data
-            last_datetime = datetime.fromtimestamp(current_data[-1]['t'] / 1000) + timedelta(hours=1)
-        data = pd.DataFrame(data)
+            if len(current_data) < self.max_bars:
+                break
+            start = current_data[-1]['t'] + step
+        return data
+
+    def _getOnePair(self, pair) -> pd.DataFrame:
+        if self._grouped_data is not None:
+            data = self._grouped_data.get(pair.upper(), pd.DataFrame())
+        else:
+            start = int(datetime.strptime(self.start_date, '%Y-%m-%d').timestamp() * 1000)
+            end = int(datetime.strptime(self.end_date, '%Y-%m-%d').timestamp() * 1000)
+            windows = self._windows(start, end)
+            # windows are downloaded at the same time and merged in order
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(windows)))) as executor:
+                pages = list(executor.map(lambda window: self._downloadWindow(pair, *window), windows))
+            data = pd.DataFrame([bar for page in pages for bar in page])
+        if data.shape[0] == 0:
+            return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'])
+        data = data.drop_duplicates(subset='t', keep='last').sort_values('t')
         data.rename({
             'o': 'open',
             'h': 'high',
@@ -487,16 +1050,22 @@ class PolygonDataProvider(DataProvider):
             't': 'date'
         }, inplace=True, axis=1)
         data.index = pd.to_datetime(data['date'], unit='ms')
-        data.drop(columns=['date', 'vw', 'n'], inplace=True)
+        data.drop(columns=['date', 'vw', 'n', 'T', 'otc'], inplace=True, errors='ignore')
         data = self.normalizeColumnsOrder(data)
         return data
 
+    def catalogSource(self) -> str:
+        return 'polygon'
+
     def getAvailablePairs(self, market : str = 'crypto') -> List[str]:
         """Return the list of available pairs
 
         Returns:
             List[str]: the list of available pairs
         """
+        return self._cachedPairs(lambda: self._listPairs(market), f'polygon:{market}')
+
+    def _listPairs(self, market : str) -> List[str]:
         url = f'https://api.polygon.io/v3/reference/tickers?market={market}&active=true&sort=ticker&order=asc&apiKey=8RvtCtdRW2bFH8WBE9JoihuwmnFECybm'
         json = r.get(url).json()
         pairs = []
@@ -507,4 +1076,214 @@ class PolygonDataProvider(DataProvider):
                 ticker = ticker[2:]
             pairs.append(ticker)
         pairs.sort()
-        return pairs
\ No newline at end of file
+        return pairs
+
+
+
+class SyntheticDataProvider(DataProvider):
+    """
+    Generate random bars without any external source, for load tests and examples.
+    Close prices follow a geometric brownian motion, open is the previous close, high and low are drawn around them
+    and the volume follows a log-normal distribution growing with the size of the move.
+    Bars are generated by blocks of block_size bars counted from the epoch, where the price is initial_price :
+    a bar only depends on the seed, the pair, the interval and its date, so overlapping ranges give the same bars.
+    Some dates can be removed to test fill policies.
+
+    :ivar pairs: list of pairs to generate
+    :ivar interval: The interval of the data
+    :ivar start_date: The start date
+    :ivar end_date: The end date
+    :ivar fill_policy: The fill policy to use
+    :ivar seed: seed of the generation
+    :ivar drift: yearly drift of the prices
+    :ivar volatility: yearly volatility of the prices
+    :ivar initial_price: price at the epoch
+    :ivar base_volume: median volume of a bar
+    :ivar gap_probability: probability that a bar is missing
+    :ivar epoch: date of the first bar of the first block
+    :ivar block_size: number of bars generated with the same random generator
+    """
+    epoch = pd.Timestamp('2000-01-01', tz='UTC')
+    block_size = 4096
+
+    def __init__(self,
+        pairs : List[str],
+        start_date : str,
+        end_date : str,
+        interval : str = 'hour',
+        seed : int = 0,
+        drift : float = 0.05,
+        volatility : float = 0.6,
+        initial_price : float = 100.,
+        base_volume : float = 1000.,
+        gap_probability : float = 0.):
+        """Initialize a SyntheticDataProvider
+
+        Args:
+            pairs (List[str]): names of the pairs to generate ex : ['BTCUSD', 'ETHUSD']
+            start_date (str): First date to generate. Format : YYYY-MM-DD.
+            end_date (str): Last date to generate. Format : YYYY-MM-DD.
+            interval (str, optional): Can be day, hour, or minute.
+            seed (int, optional): seed of the generation. Defaults to 0.
+            drift (float, optional): yearly drift of the prices. Defaults to 0.05.
+            volatility (float, optional): yearly volatility of the prices. Defaults to 0.6.
+            initial_price (float, optional): price at the epoch. Defaults to 100.
+            base_volume (float, optional): median volume of a bar. Defaults to 1000.
+            gap_probability (float, optional): probability that a bar is missing. Defaults to 0.
+        """
+        super().__init__(pairs, interval, start_date, end_date)
+        self.seed = seed
+        self.drift = drift
+        self.volatility = volatility
+        self.initial_price = initial_price
+        self.base_volume = base_volume
+        self.gap_probability = gap_probability
+
+    def _getOnePair(self, pair) -> pd.DataFrame:
+        step = interval_to_timedelta[self.interval]
+        index = pd.date_range(self.start_date, self.end_date, freq=step, tz='UTC', name='date')
+        rows = len(index)
+        # the pair name is hashed with crc32 because hash() changes between processes
+        key = [self.seed, zlib.crc32(pair.upper().encode()), list(interval_to_timedelta).index(self.interval)]
+        dt = step / timedelta(days=365)
+        scale = self.volatility * np.sqrt(dt)
+        mu = (self.drift - self.volatility ** 2 / 2) * dt
+        # bars are numbered from the epoch, the bar before the first one gives the first open
+        first = (index[0] - self.epoch) // step
+        first_block = (first - 1) // self.block_size
+        last_block = (first + rows - 1) // self.block_size
+        # the log move of every block since the epoch is drawn first : it gives the level where a block starts
+        # without generating the bars of the previous blocks
+        low_block, high_block = min(first_block, 0), max(last_block + 1, 0)
+        forward = np.random.default_rng(key + [0]).standard_normal(high_block)
+        backward = np.random.default_rng(key + [1]).standard_normal(-low_block)
+        sums = np.concatenate([backward[::-1], forward]) * np.sqrt(self.block_size)
+        moves = self.block_size * mu + scale * sums
+        # levels are always summed from the epoch so that they are exactly the same whatever the requested range
+        levels = np.concatenate([-np.cumsum(moves[:-low_block][::-1])[::-1], [0.], np.cumsum(moves[-low_block:])])
+        log_close, shocks, high_noise, low_noise, volume_noise, gaps = [], [], [], [], [], []
+        for block in range(first_block, last_block + 1):
+            rng = np.random.default_rng(key + [2, block + 2 ** 31])
+            noise = rng.standard_normal(self.block_size)
+            # shocks of the block conditioned on their sum drawn above
+            shocks.append(noise - noise.mean() + sums[block - low_block] / self.block_size)
+            log_close.append(levels[block - low_block] + np.cumsum(mu + scale * shocks[-1]))
+            high_noise.append(np.abs(rng.standard_normal(self.block_size)))
+            low_noise.append(np.abs(rng.standard_normal(self.block_size)))
+            volume_noise.append(rng.lognormal(0., 0.5, self.block_size))
+            gaps.append(rng.random(self.block_size))
+        shocks = np.concatenate(shocks)
+        log_close = np.concatenate(log_close)
+        position = first - first_block * self.block_size
+        bars = slice(position, position + rows)
+        close = self.initial_price * np.exp(log_close[bars])
+        open_ = self.initial_price * np.exp(log_close[position - 1:position + rows - 1])
+        high = np.maximum(open_, close) * np.exp(scale / 2 * np.concatenate(high_noise)[bars])
+        low = np.minimum(open_, close) * np.exp(-scale / 2 * np.concatenate(low_noise)[bars])
+        volume = self.base_volume * np.concatenate(volume_noise)[bars] * (1. + np.abs(shocks[bars]))
+        df = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+        if self.gap_probability > 0:
+            keep = np.concatenate(gaps)[bars] >= self.gap_probability
+            # the first and last bars are kept so that the requested range stays the same
+            keep[0] = keep[-1] = True
+            df = df[keep]
+            df.index.freq = None
+        return df
+
+    def catalogSource(self) -> str:
+        return f'synthetic:{self.seed}'
+
+
+class ZarrDataProvider(DataProvider):
+    """
+    Get data from a zarr store written by ZarrDataExporter (needs the zarr package).
+    Only the chunks holding the requested dates and columns are read, chunks are decoded by a pool of threads.
+
+    :ivar pairs: list of pairs to get
+    :ivar interval: The interval of the data
+    :ivar start_date: The start date
+    :ivar end_date: The end date
+    :ivar fill_policy: The fill policy to use
+    :ivar path: directory of the zarr store
+    :ivar columns: columns to read in addition to open, high, low, close and volume, None for every column
+    :ivar workers: number of chunks decoded at the same time
+    """
+    def __init__(self,
+        pairs : List[str],
+        start_date : str,
+        end_date : str,
+        path : str,
+        interval : str = 'hour',
+        columns : Optional[List[str]] = None,
+        workers : int = 4):
+        """Initialize a ZarrDataProvider
+
+        Args:
+            pairs (List[str]): list of the pairs to get ex : ['BTCUSD', 'ETHUSD']
+            start_date (str): First date to get. Format : YYYY-MM-DD.
+            end_date (str): Last date to get. Format : YYYY-MM-DD.
+            path (str): directory of the zarr store
+            interval (str, optional): Can be day, hour, or minute.
+            columns (Optional[List[str]], optional): columns to read in addition to ohlcv. Defaults to None (every column).
+            workers (int, optional): number of chunks decoded at the same time. Defaults to 4.
+
+        Raises:
+            ImportError: if zarr is not installed
+        """
+        if zarr is None:
+            raise ImportError('ZarrDataProvider needs the zarr package : pip install "zarr<3"')
+        super().__init__(pairs, interval, start_date, end_date, columns)
+        self.path = path
+        self.workers = workers
+
+    def _getOnePair(self, pair) -> pd.DataFrame:
+        group = zarr.open_group(self.path, mode='r')[f'f-{pair.lower()}-{self.interval}']
+        stored = group.attrs['columns']
+        projection = self.projection()
+        if projection is None:
+            positions = list(range(len(stored)))
+        else:
+            positions = [stored.index(column) for column in projection if column in stored]
+        # dates are small compared to the values : they are read entirely
+        dates = group['dates'][:]
+        values = group['values']
+        start, stop = self._rowRange(dates, group.attrs['tz'])
+        # one task by chunk of dates, zarr only decodes the chunks of the selected columns
+        size = values.chunks[0]
+        bounds = list(range(start - start % size, stop, size))
+        read = lambda first: values.get_orthogonal_selection(
+            (slice(max(first, start), min(first + size, stop)), positions))
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(bounds)))) as executor:
+            blocks = list(executor.map(read, bounds))
+        data = np.concatenate(blocks) if blocks else np.empty((0, len(positions)))
+        index = pd.to_datetime(dates[start:stop], utc=True)
+        index = index.tz_convert(group.attrs['tz']) if group.attrs['tz'] is not None else index.tz_convert(None)
+        index.name = 'date'
+        df = pd.DataFrame(data, index=index, columns=[stored[position] for position in positions])
+        return self.normalizeColumnsOrder(df)
+
+    def _rowRange(self, dates : np.ndarray, tz : Optional[str]) -> tuple:
+        """Return the first and last (excluded) rows between start_date and end_date"""
+        start = pd.Timestamp(self.start_date, tz=tz)
+        end = pd.Timestamp(self.end_date, tz=tz)
+        return int(np.searchsorted(dates, start.value, side='left')), int(np.searchsorted(dates, end.value, side='right'))
+
+    def catalogSource(self) -> str:
+        return f'zarr:{os.path.abspath(self.path)}'
+
+    def getAvailablePairs(self) -> List[str]:
+        """Return the list of available pairs
+
+        Returns:
+            List[str]: the list of available pairs
+        """
+        return self._cachedPairs(self._listPairs)
+
+    def _listPairs(self) -> List[str]:
+        root = zarr.open_group(self.path, mode='r')
+        pairs = []
+        for name in root.group_keys():
+            if name.startswith('f-') and name.endswith(f'-{self.interval}'):
+                pairs.append(name[2:-len(f'-{self.interval}')].upper())
+        pairs.sort()
+        return pairs
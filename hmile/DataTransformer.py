@@ -1,22 +1,32 @@
-from typing import Dict
+import copy
+import json
+from typing import Dict, List, Optional
 from abc import abstractmethod
 
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 import pandas_ta as ta
 
+from hmile import Indicators
 from hmile.DataProvider import DataProvider, interval_to_timedelta
-from hmile.utils import merge_columns, get_number_lines
+from hmile.Profiling import stage
+from hmile.Exception import DataProviderArgumentException
+from hmile.utils import align_pairs, AlignmentReport, column_statistics, apply_normalization
 
 class DataTransformer:
     """
     Abstraction class to apply data transformation
     
     :ivar dataprovider: The dataprovider to use to get the data
+    :ivar alignment_report: columns and dates removed to align the pairs during the last transform
+    :ivar cache: optional hmile.FeatureCache.FeatureCache storing the output of _apply_transform
     """
 
     def __init__(self, dataprovider : DataProvider) -> None:
         self.dataprovider = dataprovider
+        self.alignment_report : AlignmentReport = None
+        self.cache = None
 
     def transform(self) -> Dict[str, pd.DataFrame]:
         """
@@ -25,28 +35,107 @@ class DataTransformer:
         The main columns are named be open, high, low, close, volume. In index is the date.
         The index name is'date'
         
-        when multiples pairs : the columns returned are only those belonging to every one. Raise an error if each pair doesn't have the same row number
+        when multiples pairs : the columns returned are only those belonging to every one, and the dates are only those belonging to every one.
+        What was removed is described in self.alignment_report
         
         Returns:
             Dict[str, pd.DataFrame]: The transformed data
         """
-        if isinstance(self.dataprovider, DataProvider):
-            data = self.dataprovider.getData()
-        elif isinstance(self.dataprovider, DataTransformer):
-            data = self.dataprovider.transform()
+        if self.cache is not None:
+            transformed_pairs = self.cache.transform_pairs(self)
         else:
-            raise TypeError('dataprovider not a valid type. Must be DataProvider or DataTransformer')
-        
-        transformed_pairs = {
-            pair : self._apply_transform(data[pair]) for pair in data.keys()
+            transformed_pairs = self._apply_transform_pairs(self.fetch())
+        return self._complete(transformed_pairs)
+
+    def transformFetched(self, data : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Transform data already got from the dataprovider, like the output of its getData() for some pairs.
+        Used by hmile.Pipeline.Pipeline to transform the pairs one by one. The feature cache is used if set,
+        but not its skip_download since the bars are already got
+
+        Args:
+            data (Dict[str, pd.DataFrame]): dataframes of the dataprovider, by pair
+
+        Returns:
+            Dict[str, pd.DataFrame]: The transformed data
+        """
+        if self.cache is not None:
+            return self._complete(self.cache.transform_fetched(self, data))
+        return self._complete(self._apply_transform_pairs(data))
+
+    def _complete(self, transformed_pairs : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Finish the transformation of the pairs, after _apply_transform_pairs"""
+        # normalize the data so that every pair has the same columns and the same dates
+        transformed_pairs, self.alignment_report = align_pairs(transformed_pairs, how='inner')
+        return transformed_pairs
+
+
+    def fetch(self, source = None) -> Dict[str, pd.DataFrame]:
+        """Return the data to transform
+
+        Args:
+            source (Union[DataProvider, DataTransformer], optional): source to read. Defaults to self.dataprovider.
+
+        Raises:
+            TypeError: if the source is not a DataProvider or a DataTransformer
+
+        Returns:
+            Dict[str, pd.DataFrame]: the data of every pair
+        """
+        source = self.dataprovider if source is None else source
+        if isinstance(source, DataProvider):
+            return source.getData()
+        elif isinstance(source, DataTransformer):
+            return source.transform()
+        raise TypeError('dataprovider not a valid type. Must be DataProvider or DataTransformer')
+
+    def provider(self) -> DataProvider:
+        """Return the DataProvider at the origin of the data"""
+        source = self.dataprovider
+        while isinstance(source, DataTransformer):
+            source = source.dataprovider
+        return source
+
+    def cacheParameters(self) -> dict:
+        """Return the parameters changing the output of _apply_transform, part of the keys of the feature cache"""
+        return {
+            name : value for name, value in vars(self).items()
+            if name != 'alignment_report' and (isinstance(value, (str, int, float, bool)) or value is None)
         }
-        
-        # normalize the data so that every pair has the same columns
-        transformed_pairs = merge_columns(transformed_pairs)
 
-        assert(len(set(get_number_lines(transformed_pairs))) == 1) #assure that each pair's df has the same number of rows
-        return merge_columns(transformed_pairs)
+    def restrict(self,
+            pairs : Optional[List[str]] = None,
+            start_date : Optional[str] = None,
+            end_date : Optional[str] = None) -> 'DataTransformer':
+        """Return a copy of the transformer working only on some pairs or dates, see DataProvider.restrict
+
+        Args:
+            pairs (Optional[List[str]], optional): pairs to transform. Defaults to None (same pairs).
+            start_date (Optional[str], optional): first date to return. Defaults to None (same start date).
+            end_date (Optional[str], optional): last date to return. Defaults to None (same end date).
 
+        Returns:
+            DataTransformer: the restricted copy
+        """
+        transformer = copy.copy(self)
+        transformer.dataprovider = self.dataprovider.restrict(pairs, start_date, end_date)
+        transformer.alignment_report = None
+        return transformer
+
+    def _apply_transform_pairs(self, data : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Apply transformation to every pair. Calls _apply_transform on each dataframe,
+        child classes can override it to transform all the pairs at once
+
+        Args:
+            data (Dict[str, pd.DataFrame]): the normalized dataframes to transform, by pair
+
+        Returns:
+            Dict[str, pd.DataFrame]: The transformed dataframes, by pair
+        """
+        transformed_pairs = {}
+        for pair in data.keys():
+            with stage('transform', pair):
+                transformed_pairs[pair] = self._apply_transform(data[pair])
+        return transformed_pairs
 
     @abstractmethod
     def _apply_transform(self, data : pd.DataFrame) -> pd.DataFrame:
@@ -66,25 +155,61 @@ class TaDataTransformer(DataTransformer):
     Add all technical analysis indicators to the data 
     
     :ivar dataprovider: The dataprovider to use to get the data
+    :ivar normalize: if True, the returned data is normalized with the mean and std of each column
+    :ivar normalization_stats: mean and std of each column, by pair. Filled by transform() when normalize is True
     """
-    def __init__(self, dataprovider : DataProvider) -> None:
+    def __init__(self, dataprovider : DataProvider, normalize : bool = False) -> None:
         """Create a new TaDataTransformer
        
         Args:
             dataprovider (hmile.DataProvider.Dataprovider): Dataprovider to transform
+            normalize (bool, optional): normalize every column with its mean and std. Defaults to False.
         """
         super().__init__(dataprovider)
-        # set dataprovider start date to 50 interval before
+        self.normalize = normalize
+        self.normalization_stats : Dict[str, pd.DataFrame] = {}
+        # set dataprovider start date to 100 interval before
         self.initial_start_date = self.dataprovider.start_date
-        start_date = datetime.strptime(self.dataprovider.start_date, "%Y-%m-%d")
+        self.dataprovider.start_date = self._warmup_start(self.initial_start_date)
+
+    def _warmup_start(self, start_date : str) -> str:
+        """Return the date from which data must be downloaded so that the indicators are defined at start_date"""
+        start_date = datetime.strptime(start_date, "%Y-%m-%d")
         start_date = min(
             start_date  - interval_to_timedelta[self.dataprovider.interval] * 100, 
             start_date - timedelta(days=1)
         )
-        self.dataprovider.start_date = start_date.strftime("%Y-%m-%d")
+        return start_date.strftime("%Y-%m-%d")
+
+    def restrict(self,
+            pairs : Optional[List[str]] = None,
+            start_date : Optional[str] = None,
+            end_date : Optional[str] = None) -> 'TaDataTransformer':
+        start_date = start_date or self.initial_start_date
+        transformer = super().restrict(pairs, self._warmup_start(start_date), end_date)
+        transformer.initial_start_date = start_date
+        transformer.normalization_stats = {}
+        return transformer
+
+    def transform(self) -> Dict[str, pd.DataFrame]:
+        self.normalization_stats = {}
+        return super().transform()
+
+    def _complete(self, transformed_pairs : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        data = super()._complete(transformed_pairs)
+        if self.normalize:
+            statistics = {
+                pair : column_statistics(data[pair])[['mean', 'std']] for pair in data.keys()
+            }
+            # transformFetched adds the statistics of the pairs it transforms
+            self.normalization_stats.update(statistics)
+            data = {
+                pair : apply_normalization(data[pair], statistics[pair]) for pair in data.keys()
+            }
+        return data
 
     def integrity_for_normalization(self,data : pd.DataFrame) -> pd.DataFrame :
-        """drop columns with nans and check that std is not too low to avoid nan during normalizing
+        """drop columns with nans or infinite values and columns with a null std to avoid nan during normalizing
 
         Args:
             data (pd.DataFrame): data to check
@@ -92,15 +217,200 @@ class TaDataTransformer(DataTransformer):
         Returns:
             pd.DataFrame: data cleaned up
         """
-        data2 = (data-data.mean())/data.std()
-        data2.dropna(axis=1,inplace=True)
-        data = data[data2.columns]
-        return data
+        statistics = column_statistics(data)
+        valid = (statistics['invalid'] == 0) & (statistics['std'] > 0)
+        return data.loc[:, valid.to_numpy()]
+
+    def save_normalization_stats(self, path : str) -> None:
+        """Save the normalization statistics to a json file, to normalize live data the same way
+
+        Args:
+            path (str): path of the json file
+        """
+        with open(path, 'w') as f:
+            json.dump({
+                pair : statistics.to_dict(orient='index') for pair, statistics in self.normalization_stats.items()
+            }, f)
+
+    @staticmethod
+    def load_normalization_stats(path : str) -> Dict[str, pd.DataFrame]:
+        """Load normalization statistics saved by save_normalization_stats. Use them with hmile.utils.apply_normalization
+
+        Args:
+            path (str): path of the json file
+
+        Returns:
+            Dict[str, pd.DataFrame]: mean and std of each column, by pair
+        """
+        with open(path) as f:
+            content = json.load(f)
+        return {
+            pair : pd.DataFrame.from_dict(statistics, orient='index') for pair, statistics in content.items()
+        }
 
     def _apply_transform(self, data : pd.DataFrame):
         data = data[["open","high","low","close","volume"]]
-        data.ta.strategy("all")
+        with stage('ta.strategy'):
+            data.ta.strategy("all")
         data = data[self.initial_start_date:]
         data = self.integrity_for_normalization(data)
         # returns data from the start_date
         return data
+
+
+class FastTaDataTransformer(TaDataTransformer):
+    """
+    Add the most used technical analysis indicators to the data, computed by hmile.Indicators instead of pandas-ta :
+    SMA, EMA, WMA, RSI, MACD, ATR, Bollinger bands, stochastic, OBV, VWAP and ADX with the pandas-ta default parameters.
+    Columns are named like pandas-ta so that it can replace TaDataTransformer for these indicators.
+    Pairs with the same dates are computed at once on (dates x pairs) arrays.
+
+    :ivar dataprovider: The dataprovider to use to get the data
+    :ivar normalize: if True, the returned data is normalized with the mean and std of each column
+    :ivar normalization_stats: mean and std of each column, by pair. Filled by transform() when normalize is True
+    """
+    def _apply_transform_pairs(self, data : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        # group the pairs sharing the same dates
+        groups = []
+        for pair, dataframe in data.items():
+            for index, pairs in groups:
+                if index.equals(dataframe.index):
+                    pairs.append(pair)
+                    break
+            else:
+                groups.append((dataframe.index, [pair]))
+        transformed_pairs = {}
+        for index, pairs in groups:
+            fields = {
+                field : np.column_stack([data[pair][field].to_numpy(dtype=np.float64) for pair in pairs])
+                for field in ["open", "high", "low", "close", "volume"]
+            }
+            with stage('indicators', pairs[0] if len(pairs) == 1 else None):
+                indicators = Indicators.all_indicators(
+                    fields["high"], fields["low"], fields["close"], fields["volume"], index)
+            for i, pair in enumerate(pairs):
+                columns = {field : values[:, i] for field, values in fields.items()}
+                columns.update({name : values[:, i] for name, values in indicators.items()})
+                transformed_pairs[pair] = self._finalize(pd.DataFrame(columns, index=index))
+        return transformed_pairs
+
+    def _apply_transform(self, data : pd.DataFrame) -> pd.DataFrame:
+        return self._apply_transform_pairs({'pair': data})['pair']
+
+    def _finalize(self, data : pd.DataFrame) -> pd.DataFrame:
+        data = data[self.initial_start_date:]
+        return self.integrity_for_normalization(data)
+
+
+class PanelDataTransformer(DataTransformer):
+    """
+    Abstraction class for features depending on several pairs. The pairs are aligned on their common dates and
+    columns, stacked in one (dates, pairs, columns) array and given at once to _apply_transform_panel,
+    whose features are added to the columns of every pair.
+    The feature cache is not used : the features of a pair depend on the other pairs.
+
+    :ivar dataprovider: The dataprovider to use to get the data
+    :ivar alignment_report: columns and dates removed to align the pairs during the last transform
+    """
+    def transform(self) -> Dict[str, pd.DataFrame]:
+        return self._complete(self._apply_transform_pairs(self.fetch()))
+
+    def transformFetched(self, data : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        return self._complete(self._apply_transform_pairs(data))
+
+    def _apply_transform_pairs(self, data : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        data, _ = align_pairs(data, how='inner')
+        pairs = list(data.keys())
+        if not pairs:
+            return {}
+        index = data[pairs[0]].index
+        columns = data[pairs[0]].columns.tolist()
+        panel = np.empty((len(index), len(pairs), len(columns)))
+        for i, pair in enumerate(pairs):
+            panel[:, i, :] = data[pair].to_numpy(dtype=np.float64)
+        features = self._apply_transform_panel(panel, index, pairs, columns)
+        return {
+            pair : pd.concat([data[pair], pd.DataFrame({name : values[:, i] for name, values in features.items()}, index=index)], axis=1)
+            for i, pair in enumerate(pairs)
+        }
+
+    def _apply_transform(self, data : pd.DataFrame) -> pd.DataFrame:
+        return self._apply_transform_pairs({'pair': data})['pair']
+
+    @abstractmethod
+    def _apply_transform_panel(self,
+            panel : np.ndarray,
+            index : pd.DatetimeIndex,
+            pairs : List[str],
+            columns : List[str]) -> Dict[str, np.ndarray]:
+        """Compute the features of every pair. Must be implemented by the child class
+
+        Args:
+            panel (np.ndarray): values of shape (dates, pairs, columns)
+            index (pd.DatetimeIndex): dates of the panel
+            pairs (List[str]): pairs of the panel
+            columns (List[str]): columns of the panel
+
+        Returns:
+            Dict[str, np.ndarray]: features of shape (dates, pairs), by column name
+        """
+        raise NotImplementedError()
+
+
+class CrossPairDataTransformer(PanelDataTransformer):
+    """
+    Add features comparing the pairs, computed on (dates x pairs) arrays without loop on the pairs.
+    Returns are log returns of the close price :
+
+    - CORR_{reference}_{length} : rolling correlation of the returns with the returns of the reference pair
+    - BETA_{reference}_{length} : rolling beta of the returns against the returns of the reference pair
+    - SPREAD_{reference} : log of the close price divided by the close price of the reference pair
+    - SPREADZ_{reference}_{length} : rolling z-score of the spread
+    - RANK_{length} : percentile rank of the return over length intervals among the pairs, at each date
+    - ZSCORE_{length} : z-score of the return over length intervals among the pairs, at each date
+
+    The first length dates are nan.
+
+    :ivar dataprovider: The dataprovider to use to get the data
+    :ivar reference: pair to compare the others with, must be one of the pairs of the dataprovider
+    :ivar length: number of intervals of the rolling windows and of the ranked returns
+    """
+    def __init__(self, dataprovider : DataProvider, reference : str = 'BTCUSD', length : int = 24) -> None:
+        """Create a new CrossPairDataTransformer
+
+        Args:
+            dataprovider (hmile.DataProvider.Dataprovider): Dataprovider to transform
+            reference (str, optional): pair to compare the others with. Defaults to 'BTCUSD'.
+            length (int, optional): number of intervals of the rolling windows. Defaults to 24.
+
+        Raises:
+            DataProviderArgumentException: if reference is not one of the pairs of the dataprovider
+        """
+        super().__init__(dataprovider)
+        if reference not in self.provider().pairs:
+            raise DataProviderArgumentException(f'reference {reference} should be one of the pairs {self.provider().pairs}')
+        self.reference = reference
+        self.length = length
+
+    def _apply_transform_panel(self,
+            panel : np.ndarray,
+            index : pd.DatetimeIndex,
+            pairs : List[str],
+            columns : List[str]) -> Dict[str, np.ndarray]:
+        if self.reference not in pairs:
+            raise DataProviderArgumentException(f'reference {self.reference} should be one of the pairs {pairs}')
+        log_close = np.log(panel[:, :, columns.index('close')])
+        reference = pairs.index(self.reference)
+        returns = log_close - Indicators.shift(log_close)
+        reference_returns = returns[:, reference:reference + 1]
+        spread = log_close - log_close[:, reference:reference + 1]
+        momentum = log_close - Indicators.shift(log_close, self.length)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                f'CORR_{self.reference}_{self.length}': Indicators.rolling_corr(returns, reference_returns, self.length),
+                f'BETA_{self.reference}_{self.length}': Indicators.rolling_beta(returns, reference_returns, self.length),
+                f'SPREAD_{self.reference}': spread,
+                f'SPREADZ_{self.reference}_{self.length}': Indicators.rolling_zscore(spread, self.length),
+                f'RANK_{self.length}': Indicators.cross_rank(momentum),
+                f'ZSCORE_{self.length}': Indicators.cross_zscore(momentum),
+            }
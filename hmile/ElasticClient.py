@@ -0,0 +1,56 @@
+import threading
+from typing import Dict, Tuple
+
+from elasticsearch import Elasticsearch
+
+# options given to every new client, they can be overridden by get_client
+DEFAULT_CLIENT_OPTIONS = {
+    'connections_per_node': 10,
+    'request_timeout': 30.,
+    'max_retries': 3,
+    'retry_on_timeout': True,
+    'sniff_on_start': False,
+    'sniff_on_node_failure': False,
+}
+
+_clients : Dict[Tuple, Elasticsearch] = {}
+_lock = threading.Lock()
+
+
+def get_client(es_url : str, es_user : str, es_pass : str, **options) -> Elasticsearch:
+    """Return the client of this process for a server, an user and a set of options, created on first use.
+    A client owns a pool of keep-alive connections and is thread safe, so it is shared by every provider,
+    exporter and thread instead of opening new connections for each request.
+
+    Args:
+        es_url (str): url of the elasticsearch server, example : https://localhost:9200
+        es_user (str): name of the user for elasticsearch connection
+        es_pass (str): password of the user for elasticsearch connection
+        **options: options of the Elasticsearch client overriding DEFAULT_CLIENT_OPTIONS, like connections_per_node
+            (pool size), request_timeout, max_retries, retry_on_timeout, sniff_on_start or sniff_before_requests
+
+    Returns:
+        Elasticsearch: the shared client
+    """
+    options = {**DEFAULT_CLIENT_OPTIONS, **options}
+    key = (es_url, es_user, es_pass, tuple(sorted(options.items())))
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = Elasticsearch(
+                es_url,
+                http_compress=True,
+                verify_certs=False,
+                basic_auth=(es_user, es_pass),
+                **options,
+            )
+            _clients[key] = client
+    return client
+
+
+def close_clients() -> None:
+    """Close every shared client and its connections. The next get_client creates new ones"""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -64,4 +64,17 @@ class DataNotAvailableException(Exception):
         self.end_date = end_date
     
     def __str__(self) -> str:
-        return f'Data is not available. Maybe pair {self.pair} does not exist or the date range {self.start_date} - {self.end_date} is not available'
\ No newline at end of file
+        return f'Data is not available. Maybe pair {self.pair} does not exist or the date range {self.start_date} - {self.end_date} is not available'
+
+
+class PolygonRequestException(Exception):
+    """
+    This exception is raised when polygon.io answers a request with an error, like a rate limit or an authentication failure.
+    """
+    def __init__(self, status, error) -> None:
+        super().__init__(self)
+        self.status = status
+        self.error = error
+
+    def __str__(self) -> str:
+        return f'polygon request failed with status {self.status} : {self.error}'
@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from hmile.DataExporter import DataExporter
+from hmile.DataProvider import DataProvider, interval_to_timedelta
+from hmile.DataTransformer import DataTransformer
+from hmile.utils import date_chunks
+
+DONE = 'done'
+FAILED = 'failed'
+PENDING = 'pending'
+
+
+class ExportJob:
+    """
+    Run an export as independent units : one unit by pair, or by pair and chunk of dates if chunk_days is set.
+    The status of every finished unit is recorded in a json checkpoint file, so that a job interrupted by a crash
+    or a network error resumes where it stopped and can retry only the units which failed.
+    Units of different pairs run in parallel, the chunks of a pair run in order and stop at the first failure.
+    Pairs are transformed separately : DataTransformer does not align them with each other.
+
+    :ivar exporter: exporter whose source (DataProvider or DataTransformer) defines the pairs and the dates
+    :ivar checkpoint: path of the json checkpoint file
+    :ivar workers: number of pairs exported at the same time
+    :ivar chunk_days: number of days of each unit, None for one unit by pair.
+        Chunks after the first one are appended, so the exporter must be incremental
+    """
+    def __init__(self,
+            exporter : DataExporter,
+            checkpoint : str,
+            workers : int = 1,
+            chunk_days : Optional[int] = None) -> None:
+        """Create an export job. The checkpoint file is loaded if it exists
+
+        Args:
+            exporter (DataExporter): exporter to run
+            checkpoint (str): path of the json checkpoint file
+            workers (int, optional): number of pairs exported at the same time. Defaults to 1.
+            chunk_days (Optional[int], optional): number of days of each unit. Defaults to None (one unit by pair).
+
+        Raises:
+            TypeError: if the exporter replaces its whole output at each export (like SharedMemoryDataExporter)
+            ValueError: if chunk_days is set and the exporter is not incremental
+        """
+        if not exporter.per_pair:
+            # units are exported one by one : only the last one would be kept
+            raise TypeError(f'{type(exporter).__name__} replaces its whole output at each export and can not run as a job')
+        if chunk_days is not None and not exporter.incremental:
+            # each chunk would replace the output of the previous ones
+            raise ValueError('chunk_days needs an incremental exporter')
+        self.exporter = exporter
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.chunk_days = chunk_days
+        self._lock = threading.Lock()
+        self._state : Dict[str, dict] = {}
+        if os.path.isfile(checkpoint):
+            with open(checkpoint) as f:
+                self._state = json.load(f)['units']
+
+    def _provider(self) -> DataProvider:
+        source = self.exporter.dataprovider
+        while isinstance(source, DataTransformer):
+            source = source.dataprovider
+        return source
+
+    def units(self) -> List[Tuple[str, str, str]]:
+        """Return every unit of the job as (pair, start date, end date), the chunks of a pair in order"""
+        chunks = date_chunks(self.exporter.dataprovider, self.chunk_days, interval_to_timedelta[self._provider().interval] * 2)
+        return [(pair, chunk_start, chunk_end) for pair in self._provider().pairs for chunk_start, chunk_end in chunks]
+
+    @staticmethod
+    def key(unit : Tuple[str, str, str]) -> str:
+        return '|'.join(unit)
+
+    def status(self, unit : Tuple[str, str, str]) -> str:
+        """Return done, failed or pending"""
+        return self._state.get(self.key(unit), {}).get('status', PENDING)
+
+    def failed(self) -> Dict[str, str]:
+        """Return the error of every failed unit, by unit key"""
+        return {
+            key : state['error'] for key, state in self._state.items() if state['status'] == FAILED
+        }
+
+    def run(self, retry_failed : bool = True, only_failed : bool = False) -> Dict[str, str]:
+        """Export every unit which is not done yet
+
+        Args:
+            retry_failed (bool, optional): run again the units which failed in a previous run. Defaults to True.
+            only_failed (bool, optional): run only the units which failed in a previous run. Defaults to False.
+
+        Returns:
+            Dict[str, str]: status of every unit of the job, by unit key
+        """
+        selected = set(
+            self.key(unit) for unit in self.units()
+            if self.status(unit) != DONE
+            and (retry_failed or self.status(unit) != FAILED)
+            and (not only_failed or self.status(unit) == FAILED)
+        )
+        by_pair : Dict[str, List[Tuple[str, str, str]]] = {}
+        for unit in self.units():
+            if self.key(unit) in selected:
+                by_pair.setdefault(unit[0], []).append(unit)
+        with ExitStack() as stack:
+            # every unit updates the catalogs : they are saved once at the end
+            for catalog in [self._provider().catalog, self.exporter.catalog]:
+                if catalog is not None:
+                    stack.enter_context(catalog.batch())
+            if self.workers > 1 and len(by_pair) > 1:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    for future in [executor.submit(self._run_pair, units) for units in by_pair.values()]:
+                        future.result()
+            else:
+                for units in by_pair.values():
+                    self._run_pair(units)
+        return {self.key(unit) : self.status(unit) for unit in self.units()}
+
+    def _run_pair(self, units : List[Tuple[str, str, str]]) -> None:
+        for unit in units:
+            if not self._run_unit(unit):
+                # the next chunks would be appended after a hole
+                break
+
+    def _run_unit(self, unit : Tuple[str, str, str]) -> bool:
+        pair, start, end = unit
+        state = self._state.get(self.key(unit), {})
+        try:
+            source = self.exporter.dataprovider.restrict([pair], start, end)
+            if isinstance(source, DataProvider):
+                data = source.getData()
+                interval = source.interval
+            else:
+                data = source.transform()
+                interval = self._provider().interval
+            self.exporter.export_func(data, interval)
+        except Exception as e:
+            self._record(unit, {
+                'status': FAILED,
+                'attempts': state.get('attempts', 0) + 1,
+                'error': ''.join(traceback.format_exception_only(type(e), e)).strip(),
+                'finished': pd.Timestamp.utcnow().isoformat(),
+            })
+            return False
+        self._record(unit, {
+            'status': DONE,
+            'attempts': state.get('attempts', 0) + 1,
+            'error': None,
+            'finished': pd.Timestamp.utcnow().isoformat(),
+        })
+        return True
+
+    def _record(self, unit : Tuple[str, str, str], state : dict) -> None:
+        """Record the state of a unit and save the checkpoint"""
+        with self._lock:
+            self._state[self.key(unit)] = state
+            # write then rename so that a crash never leaves a partial checkpoint
+            with open(f'{self.checkpoint}.tmp', 'w') as f:
+                json.dump({'units': self._state}, f)
+            os.replace(f'{self.checkpoint}.tmp', self.checkpoint)
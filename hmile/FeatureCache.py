@@ -0,0 +1,261 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET = True
+except ImportError:
+    PARQUET = False
+
+
+def hash_dataframe(dataframe : pd.DataFrame) -> str:
+    """Return a hash of the content of a dataframe : index, columns and values"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in dataframe.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(dataframe, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Cache of the outputs of DataTransformer._apply_transform, keyed by the transformer class and parameters,
+    the pair, the interval and a hash of the input bars. Results are stored on disk (parquet if pyarrow is installed,
+    pickle otherwise) with an in-memory LRU on top, the least recently used files are removed above max_bytes.
+    Set it on a transformer (transformer.cache = FeatureCache(directory)) : the indicators of known inputs are
+    not computed again. With skip_download, a request already computed (same transformer, source, pair and dates)
+    is served without downloading the bars, which is only right if the source does not change for past dates.
+
+    :ivar directory: directory of the cached files
+    :ivar max_bytes: maximum size of the cached files, None for no limit
+    :ivar memory_items: number of results kept in memory
+    :ivar skip_download: serve known requests without downloading their bars
+    :ivar hits: number of results found in memory or on disk
+    :ivar misses: number of results computed
+    """
+    def __init__(self,
+            directory : str,
+            max_bytes : Optional[int] = None,
+            memory_items : int = 32,
+            skip_download : bool = False) -> None:
+        """Create or open a cache
+
+        Args:
+            directory (str): directory of the cached files, created if needed
+            max_bytes (Optional[int], optional): maximum size of the cached files. Defaults to None (no limit).
+            memory_items (int, optional): number of results kept in memory. Defaults to 32.
+            skip_download (bool, optional): serve known requests without downloading their bars. Defaults to False.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.skip_download = skip_download
+        self.hits = 0
+        self.misses = 0
+        self._memory : OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._requests : Dict[str, str] = {}
+        if os.path.isfile(self._requests_path()):
+            with open(self._requests_path()) as f:
+                self._requests = json.load(f)
+
+    @property
+    def hit_rate(self) -> float:
+        """Part of the results found in the cache, 0 before the first request"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'memory_items': len(self._memory),
+            'disk_bytes': sum(os.path.getsize(path) for path in self._files()),
+        }
+
+    def key(self, transformer, pair : str, interval : str, bars : pd.DataFrame) -> str:
+        """Return the key of the transformation of some bars
+
+        Args:
+            transformer (DataTransformer): the transformer
+            pair (str): name of the pair
+            interval (str): interval of the bars
+            bars (pd.DataFrame): input of _apply_transform
+
+        Returns:
+            str: hexadecimal key
+        """
+        description = json.dumps({
+            'transformer': f'{type(transformer).__module__}.{type(transformer).__qualname__}',
+            'parameters': transformer.cacheParameters(),
+            'pair': pair.upper(),
+            'interval': interval,
+            'bars': hash_dataframe(bars),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def request_key(self, transformer, source : str, pair : str, interval : str, start : str, end : str,
+            columns : Optional[List[str]] = None) -> str:
+        """Return the key of a request, used by skip_download. columns is the projection of the provider"""
+        description = json.dumps({
+            'transformer': f'{type(transformer).__module__}.{type(transformer).__qualname__}',
+            'parameters': transformer.cacheParameters(),
+            'source': source,
+            'pair': pair.upper(),
+            'interval': interval,
+            'start': start,
+            'end': end,
+            'columns': columns,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def get(self, key : str, count_miss : bool = True) -> Optional[pd.DataFrame]:
+        """Return a cached result, None if it is unknown. Hits are counted, misses too unless count_miss is False"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key].copy()
+            path = self._path(key)
+            if not os.path.isfile(path):
+                if count_miss:
+                    self.misses += 1
+                return None
+            # the modification date orders the files for eviction
+            os.utime(path)
+            self.hits += 1
+        dataframe = pd.read_parquet(path) if PARQUET else pd.read_pickle(path)
+        self._remember(key, dataframe)
+        return dataframe.copy()
+
+    def put(self, key : str, dataframe : pd.DataFrame) -> None:
+        """Store a result on disk and in memory"""
+        path = self._path(key)
+        # write then rename so that a reader never sees a partial file
+        if PARQUET:
+            dataframe.to_parquet(f'{path}.tmp')
+        else:
+            with open(f'{path}.tmp', 'wb') as f:
+                pickle.dump(dataframe, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+        self._remember(key, dataframe)
+        self._evict()
+
+    def transform_pairs(self, transformer) -> Dict[str, pd.DataFrame]:
+        """Return the output of transformer._apply_transform_pairs for every pair, computing only the unknown ones
+
+        Args:
+            transformer (DataTransformer): transformer using this cache
+
+        Returns:
+            Dict[str, pd.DataFrame]: transformed dataframes, by pair
+        """
+        provider = transformer.provider()
+        result = {}
+        requests = {}
+        if self.skip_download:
+            for pair in provider.pairs:
+                requests[pair] = self.request_key(
+                    transformer, provider.catalogSource(), pair, provider.interval, provider.start_date, provider.end_date,
+                    provider.projection())
+                key = self._requests.get(requests[pair])
+                # the file may have been evicted : the miss is counted by the lookup of the fetched bars
+                cached = self.get(key, count_miss=False) if key is not None else None
+                if cached is not None:
+                    result[pair] = cached
+        missing = [pair for pair in provider.pairs if pair not in result]
+        if missing:
+            source = transformer.dataprovider
+            if len(missing) < len(provider.pairs):
+                source = source.restrict(missing)
+            data = transformer.fetch(source)
+            computed, keys = self._transform(transformer, data)
+            result.update(computed)
+            if self.skip_download:
+                with self._lock:
+                    self._requests.update({requests[pair] : keys[pair] for pair in data.keys()})
+                    self._save_requests()
+        return {pair : result[pair] for pair in provider.pairs if pair in result}
+
+    def transform_fetched(self, transformer, data : Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Return the output of transformer._apply_transform_pairs for bars already got, computing only the unknown ones
+
+        Args:
+            transformer (DataTransformer): transformer using this cache
+            data (Dict[str, pd.DataFrame]): input bars, by pair
+
+        Returns:
+            Dict[str, pd.DataFrame]: transformed dataframes, by pair
+        """
+        return self._transform(transformer, data)[0]
+
+    def _transform(self, transformer, data : Dict[str, pd.DataFrame]) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """Return the transformed dataframes and the keys of the inputs, by pair"""
+        interval = transformer.provider().interval
+        keys = {pair : self.key(transformer, pair, interval, data[pair]) for pair in data.keys()}
+        result = {}
+        to_compute = {}
+        for pair in data.keys():
+            cached = self.get(keys[pair])
+            if cached is None:
+                to_compute[pair] = data[pair]
+            else:
+                result[pair] = cached
+        if to_compute:
+            computed = transformer._apply_transform_pairs(to_compute)
+            for pair, dataframe in computed.items():
+                self.put(keys[pair], dataframe)
+                result[pair] = dataframe
+        return result, keys
+
+    def clear(self) -> None:
+        """Remove every cached result"""
+        with self._lock:
+            for path in self._files():
+                os.remove(path)
+            self._memory.clear()
+            self._requests = {}
+            self._save_requests()
+
+    def _remember(self, key : str, dataframe : pd.DataFrame) -> None:
+        with self._lock:
+            self._memory[key] = dataframe
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Remove the least recently used files until the cache is smaller than max_bytes"""
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            files = sorted(self._files(), key=os.path.getmtime)
+            total = sum(os.path.getsize(path) for path in files)
+            while files and total > self.max_bytes:
+                path = files.pop(0)
+                total -= os.path.getsize(path)
+                os.remove(path)
+                self._memory.pop(os.path.basename(path).split('.')[0], None)
+
+    def _path(self, key : str) -> str:
+        return os.path.join(self.directory, f'{key}.parquet' if PARQUET else f'{key}.pkl')
+
+    def _files(self):
+        extension = '.parquet' if PARQUET else '.pkl'
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(extension)]
+
+    def _requests_path(self) -> str:
+        return os.path.join(self.directory, 'requests.json')
+
+    def _save_requests(self) -> None:
+        with open(f'{self._requests_path()}.tmp', 'w') as f:
+            json.dump(self._requests, f)
+        os.replace(f'{self._requests_path()}.tmp', self._requests_path())
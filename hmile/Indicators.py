@@ -0,0 +1,258 @@
+"""
+Vectorized technical indicators. Every function works on float64 arrays of shape (dates, series) so that
+all the pairs sharing the same dates are computed at once. Results follow the pandas-ta formulas (without ta-lib)
+and the leading values are nan like in pandas-ta. Recursive averages are computed with scipy.signal.lfilter,
+rolling windows with numpy strided views. Series may start with nan but must not contain nan afterward.
+"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+EPSILON = np.finfo(float).eps
+
+
+def _first_valid(x : np.ndarray) -> np.ndarray:
+    """Return the row of the first non nan value of each column, len(x) if there is none"""
+    valid = ~np.isnan(x)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), len(x))
+
+
+def _by_start(x : np.ndarray, offset : int, compute) -> np.ndarray:
+    """Apply compute to the columns of x grouped by their first valid row, so that columns starting together are computed at once
+
+    Args:
+        x (np.ndarray): input of shape (dates, series)
+        offset (int): number of valid values needed before the first output
+        compute (Callable[[np.ndarray], np.ndarray]): function applied on x[start:, columns], its result starts at row start
+
+    Returns:
+        np.ndarray: output of shape (dates, series), nan before start + offset
+    """
+    result = np.full(x.shape, np.nan)
+    first = _first_valid(x)
+    for start in np.unique(first):
+        if start + offset >= len(x):
+            continue
+        columns = np.flatnonzero(first == start)
+        result[start:, columns] = compute(x[start:, columns])
+    return result
+
+
+def _rolling(x : np.ndarray, length : int, reduce) -> np.ndarray:
+    """Apply reduce on every window of length rows, nan for the first length - 1 rows"""
+    result = np.full(x.shape, np.nan)
+    if len(x) >= length:
+        result[length - 1:] = reduce(sliding_window_view(x, length, axis=0))
+    return result
+
+
+def shift(x : np.ndarray, periods : int = 1) -> np.ndarray:
+    result = np.full(x.shape, np.nan)
+    result[periods:] = x[:-periods]
+    return result
+
+
+def non_zero_range(high : np.ndarray, low : np.ndarray) -> np.ndarray:
+    """high - low, plus epsilon on the columns where it is zero somewhere, like pandas-ta"""
+    diff = high - low
+    return diff + np.where((diff == 0).any(axis=0), EPSILON, 0.)
+
+
+def sma(x : np.ndarray, length : int = 10) -> np.ndarray:
+    return _rolling(x, length, lambda windows: windows.mean(axis=-1))
+
+
+def wma(x : np.ndarray, length : int = 10) -> np.ndarray:
+    weights = np.arange(1, length + 1, dtype=np.float64)
+    return _rolling(x, length, lambda windows: windows @ weights / weights.sum())
+
+
+def stdev(x : np.ndarray, length : int = 5, ddof : int = 0) -> np.ndarray:
+    return _rolling(x, length, lambda windows: windows.std(axis=-1, ddof=ddof))
+
+
+def rolling_min(x : np.ndarray, length : int) -> np.ndarray:
+    return _rolling(x, length, lambda windows: windows.min(axis=-1))
+
+
+def rolling_max(x : np.ndarray, length : int) -> np.ndarray:
+    return _rolling(x, length, lambda windows: windows.max(axis=-1))
+
+
+def ema(x : np.ndarray, length : int = 10) -> np.ndarray:
+    """Exponential moving average seeded with the sma of the first length values (pandas-ta default)"""
+    alpha = 2. / (length + 1)
+
+    def compute(values):
+        result = np.full(values.shape, np.nan)
+        seed = values[:length].mean(axis=0)
+        result[length - 1] = seed
+        if len(values) > length:
+            result[length:] = lfilter([alpha], [1., alpha - 1.], values[length:], axis=0,
+                                      zi=((1. - alpha) * seed)[np.newaxis, :])[0]
+        return result
+    return _by_start(x, length - 1, compute)
+
+
+def rma(x : np.ndarray, length : int = 14) -> np.ndarray:
+    """Wilder's moving average : ewm(alpha=1/length, adjust=True, min_periods=length)"""
+    alpha = 1. / length
+
+    def compute(values):
+        numerator = lfilter([1.], [1., alpha - 1.], values, axis=0)
+        denominator = (1. - (1. - alpha) ** np.arange(1, len(values) + 1)) / alpha
+        result = numerator / denominator[:, np.newaxis]
+        result[:length - 1] = np.nan
+        return result
+    return _by_start(x, length - 1, compute)
+
+
+def rsi(close : np.ndarray, length : int = 14) -> np.ndarray:
+    change = close - shift(close)
+    positive = rma(np.clip(change, 0., np.inf), length)
+    negative = rma(np.clip(change, -np.inf, 0.), length)
+    return 100. * positive / (positive + np.abs(negative))
+
+
+def macd(close : np.ndarray, fast : int = 12, slow : int = 26, signal : int = 9):
+    """Return macd, histogram and signal"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, line - signal_line, signal_line
+
+
+def true_range(high : np.ndarray, low : np.ndarray, close : np.ndarray) -> np.ndarray:
+    previous = shift(close)
+    result = np.fmax(np.abs(non_zero_range(high, low)), np.fmax(np.abs(high - previous), np.abs(previous - low)))
+    result[:1] = np.nan
+    return result
+
+
+def atr(high : np.ndarray, low : np.ndarray, close : np.ndarray, length : int = 14) -> np.ndarray:
+    return rma(true_range(high, low, close), length)
+
+
+def bbands(close : np.ndarray, length : int = 5, std : float = 2., ddof : int = 0):
+    """Return lower, mid, upper, bandwidth and percent"""
+    deviations = std * stdev(close, length, ddof)
+    mid = sma(close, length)
+    lower = mid - deviations
+    upper = mid + deviations
+    width = non_zero_range(upper, lower)
+    return lower, mid, upper, 100. * width / mid, non_zero_range(close, lower) / width
+
+
+def stoch(high : np.ndarray, low : np.ndarray, close : np.ndarray, k : int = 14, d : int = 3, smooth_k : int = 3):
+    """Return %k and %d"""
+    lowest = rolling_min(low, k)
+    value = 100. * (close - lowest) / non_zero_range(rolling_max(high, k), lowest)
+    stoch_k = sma(value, smooth_k)
+    return stoch_k, sma(stoch_k, d)
+
+
+def obv(close : np.ndarray, volume : np.ndarray) -> np.ndarray:
+    sign = np.sign(close - shift(close))
+    sign[:1] = 1.
+    return np.cumsum(sign * volume, axis=0)
+
+
+def _cumsum_by_group(x : np.ndarray, starts : np.ndarray) -> np.ndarray:
+    """Cumulative sum restarting at every row where starts is True"""
+    total = np.cumsum(x, axis=0)
+    before = (total - x)[starts]
+    return total - before[np.cumsum(starts) - 1]
+
+
+def vwap(high : np.ndarray, low : np.ndarray, close : np.ndarray, volume : np.ndarray, index : pd.DatetimeIndex) -> np.ndarray:
+    """Volume weighted average price, reset every day of the index (anchor D)"""
+    wall = index.tz_localize(None) if index.tz is not None else index
+    day = wall.asi8 // pd.Timedelta(days=1).value
+    starts = np.concatenate([[True], day[1:] != day[:-1]])
+    typical = (high + low + close) / 3.
+    return _cumsum_by_group(typical * volume, starts) / _cumsum_by_group(volume, starts)
+
+
+def adx(high : np.ndarray, low : np.ndarray, close : np.ndarray, length : int = 14, lensig : int = 14):
+    """Return adx, dmp and dmn"""
+    scale = 100. / atr(high, low, close, length)
+    up = high - shift(high)
+    down = shift(low) - low
+    positive = np.where((up > down) & (up > 0), up, 0.)
+    negative = np.where((down > up) & (down > 0), down, 0.)
+    positive[:1] = np.nan
+    negative[:1] = np.nan
+    dmp = scale * rma(positive, length)
+    dmn = scale * rma(negative, length)
+    dx = 100. * np.abs(dmp - dmn) / (dmp + dmn)
+    return rma(dx, lensig), dmp, dmn
+
+
+def rolling_cov(x : np.ndarray, y : np.ndarray, length : int) -> np.ndarray:
+    """Rolling population covariance. y can have one column, shared by every column of x"""
+    return sma(x * y, length) - sma(x, length) * sma(y, length)
+
+
+def rolling_corr(x : np.ndarray, y : np.ndarray, length : int) -> np.ndarray:
+    """Rolling correlation. y can have one column, shared by every column of x"""
+    return rolling_cov(x, y, length) / np.sqrt(rolling_cov(x, x, length) * rolling_cov(y, y, length))
+
+
+def rolling_beta(x : np.ndarray, y : np.ndarray, length : int) -> np.ndarray:
+    """Rolling beta of x against y : cov(x, y) / var(y). y can have one column, shared by every column of x"""
+    return rolling_cov(x, y, length) / rolling_cov(y, y, length)
+
+
+def rolling_zscore(x : np.ndarray, length : int) -> np.ndarray:
+    return (x - sma(x, length)) / stdev(x, length)
+
+
+def cross_rank(x : np.ndarray) -> np.ndarray:
+    """Percentile rank of each series among the others at every date, ties get their average rank"""
+    return pd.DataFrame(x).rank(axis=1, pct=True).to_numpy()
+
+
+def cross_zscore(x : np.ndarray) -> np.ndarray:
+    """Z-score of each series among the others at every date"""
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=1, keepdims=True)
+    # nanmean warns on the dates where every value is nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, x, 0.).sum(axis=1, keepdims=True) / count
+        std = np.sqrt(np.where(valid, (x - mean) ** 2, 0.).sum(axis=1, keepdims=True) / count)
+        return (x - mean) / std
+
+
+def all_indicators(high : np.ndarray, low : np.ndarray, close : np.ndarray, volume : np.ndarray,
+        index : pd.DatetimeIndex) -> Dict[str, np.ndarray]:
+    """Compute every indicator with the pandas-ta default parameters
+
+    Args:
+        high (np.ndarray): high prices of shape (dates, series)
+        low (np.ndarray): low prices of shape (dates, series)
+        close (np.ndarray): close prices of shape (dates, series)
+        volume (np.ndarray): volumes of shape (dates, series)
+        index (pd.DatetimeIndex): dates shared by every series
+
+    Returns:
+        Dict[str, np.ndarray]: indicators of shape (dates, series) by pandas-ta column name
+    """
+    # like pandas, divisions by zero give nan or inf without warning
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = {
+            'SMA_10': sma(close, 10),
+            'EMA_10': ema(close, 10),
+            'WMA_10': wma(close, 10),
+            'RSI_14': rsi(close, 14),
+        }
+        result['MACD_12_26_9'], result['MACDh_12_26_9'], result['MACDs_12_26_9'] = macd(close, 12, 26, 9)
+        result['ATRr_14'] = atr(high, low, close, 14)
+        (result['BBL_5_2.0'], result['BBM_5_2.0'], result['BBU_5_2.0'],
+            result['BBB_5_2.0'], result['BBP_5_2.0']) = bbands(close, 5, 2.)
+        result['STOCHk_14_3_3'], result['STOCHd_14_3_3'] = stoch(high, low, close, 14, 3, 3)
+        result['OBV'] = obv(close, volume)
+        result['VWAP_D'] = vwap(high, low, close, volume, index)
+        result['ADX_14'], result['DMP_14'], result['DMN_14'] = adx(high, low, close, 14, 14)
+    return result
@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from hmile.DataExporter import DataExporter
+from hmile.DataProvider import DataProvider
+from hmile.DataTransformer import DataTransformer, PanelDataTransformer
+from hmile.ExportJob import DONE, FAILED
+from hmile.Profiling import stage
+
+# marks the end of the items of a queue
+_END = None
+
+
+class Pipeline:
+    """
+    Export the pairs one by one through three stages : get the bars from the provider, apply the transformers
+    and export. Stages run at the same time, each with its own number of threads, and are connected by queues of
+    queue_size pairs : while a pair is exported, the next ones are transformed and downloaded.
+    The wall time is close to the one of the slowest stage and at most about queue_size + workers pairs per stage
+    are in memory. Pairs are transformed separately : DataTransformer does not align them with each other,
+    so transformers computing features over several pairs (PanelDataTransformer) can not be used.
+    The feature cache of the transformers is used, but not its skip_download since the bars are already got.
+
+    :ivar exporter: exporter whose source (DataProvider or DataTransformer) defines the pairs and the dates
+    :ivar fetch_workers: number of pairs downloaded at the same time
+    :ivar transform_workers: number of pairs transformed at the same time
+    :ivar export_workers: number of pairs exported at the same time
+    :ivar queue_size: number of pairs waiting between two stages
+    :ivar errors: error of every failed pair during the last run, by pair
+    :ivar stage_seconds: time spent by the threads of each stage during the last run, by stage
+    """
+    def __init__(self,
+            exporter : DataExporter,
+            fetch_workers : int = 4,
+            transform_workers : int = 1,
+            export_workers : int = 1,
+            queue_size : int = 4) -> None:
+        """Create a pipeline
+
+        Args:
+            exporter (DataExporter): exporter to run
+            fetch_workers (int, optional): number of pairs downloaded at the same time. Defaults to 4.
+            transform_workers (int, optional): number of pairs transformed at the same time. Defaults to 1.
+            export_workers (int, optional): number of pairs exported at the same time. Defaults to 1.
+            queue_size (int, optional): number of pairs waiting between two stages. Defaults to 4.
+
+        Raises:
+            TypeError: if a transformer computes features over several pairs
+                or if the exporter replaces its whole output at each export (like SharedMemoryDataExporter)
+        """
+        self.exporter = exporter
+        self.fetch_workers = fetch_workers
+        self.transform_workers = transform_workers
+        self.export_workers = export_workers
+        self.queue_size = queue_size
+        if not exporter.per_pair:
+            # pairs are exported one by one : only the last one would be kept
+            raise TypeError(f'{type(exporter).__name__} replaces its whole output at each export and can not be pipelined')
+        self.errors : Dict[str, str] = {}
+        self.stage_seconds : Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._transformers = self._chain()
+        for transformer in self._transformers:
+            if isinstance(transformer, PanelDataTransformer):
+                raise TypeError(f'{type(transformer).__name__} needs every pair at once and can not be pipelined')
+
+    def _chain(self) -> List[DataTransformer]:
+        """Return the transformers between the provider and the exporter, the closest to the provider first"""
+        transformers = []
+        source = self.exporter.dataprovider
+        while isinstance(source, DataTransformer):
+            transformers.insert(0, source)
+            source = source.dataprovider
+        if not isinstance(source, DataProvider):
+            raise TypeError('dataprovider must be a DataProvider or a DataTransformer')
+        self._provider = source
+        return transformers
+
+    def run(self) -> Dict[str, str]:
+        """Export every pair
+
+        Returns:
+            Dict[str, str]: done or failed, by pair. The errors are in self.errors
+        """
+        self.errors = {}
+        self.stage_seconds = {}
+        stages : List[Tuple[str, int, Callable]] = [('fetch', self.fetch_workers, self._fetch)]
+        if self._transformers:
+            stages.append(('transform', self.transform_workers, self._transform))
+        stages.append(('export', self.export_workers, self._export))
+
+        pairs = list(self._provider.pairs)
+        inputs : queue.Queue = queue.Queue()
+        for pair in pairs:
+            inputs.put((pair, pair))
+        threads = []
+        for position, (name, workers, function) in enumerate(stages):
+            last = position == len(stages) - 1
+            outputs = None if last else queue.Queue(maxsize=self.queue_size)
+            next_workers = None if last else stages[position + 1][1]
+            remaining = [max(1, workers)]
+            for _ in range(max(1, workers)):
+                # every worker of the first stage stops at its own end mark
+                if position == 0:
+                    inputs.put(_END)
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(name, function, inputs, outputs, remaining, next_workers),
+                    daemon=True)
+                threads.append(thread)
+            inputs = outputs
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._provider.flushCatalog()
+        self.exporter.flushCatalog()
+        return {pair : FAILED if pair in self.errors else DONE for pair in pairs}
+
+    def _work(self,
+            name : str,
+            function : Callable,
+            inputs : queue.Queue,
+            outputs : Optional[queue.Queue],
+            remaining : List[int],
+            next_workers : Optional[int]) -> None:
+        """Apply the function of a stage on the pairs of its queue. The last worker of a stage ends the next stage"""
+        busy = 0.
+        while True:
+            item = inputs.get()
+            if item is _END:
+                break
+            pair, value = item
+            start = time.perf_counter()
+            try:
+                with stage(f'pipeline.{name}', pair):
+                    result = function(pair, value)
+            except Exception as e:
+                with self._lock:
+                    self.errors[pair] = f'{name}: ' + ''.join(traceback.format_exception_only(type(e), e)).strip()
+                continue
+            finally:
+                busy += time.perf_counter() - start
+            if outputs is not None:
+                # blocks while the next stage is behind, which bounds the memory
+                outputs.put((pair, result))
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.) + busy
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished and outputs is not None:
+            for _ in range(max(1, next_workers)):
+                outputs.put(_END)
+
+    def _fetch(self, pair : str, _) -> pd.DataFrame:
+        return self._provider.getPair(pair)
+
+    def _transform(self, pair : str, dataframe : pd.DataFrame) -> pd.DataFrame:
+        data = {pair : dataframe}
+        for transformer in self._transformers:
+            data = transformer.transformFetched(data)
+        return data[pair]
+
+    def _export(self, pair : str, dataframe : pd.DataFrame) -> None:
+        self.exporter.export_func({pair : dataframe}, self._provider.interval)
@@ -0,0 +1,305 @@
+"""
+Opt-in profiling of the hmile stages. Code of hmile marks its stages with stage(name, pair) :
+download and fill of a pair, transformation, export... When a Profiler is active, each stage and pair gets
+its own cProfile profile, its wall time, its tracemalloc peak and allocated memory and its top allocation lines.
+When no profiler is active, stage() returns a shared empty context manager.
+
+Use it as a context manager : with Profiler('profile') as profiler: exporter.export()
+or set the environment variable HMILE_PROFILE to a directory to profile the whole process and dump at exit.
+"""
+import atexit
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# the active profiler, None when profiling is disabled
+_profiler : Optional['Profiler'] = None
+_DISABLED = nullcontext()
+# tracemalloc.reset_peak needs python 3.9
+_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+
+def stage(name : str, pair : Optional[str] = None):
+    """Return a context manager recording a stage in the active profiler, or doing nothing without profiler
+
+    Args:
+        name (str): name of the stage, like fill or transform
+        pair (Optional[str], optional): pair processed by the stage. Defaults to None (the pair of the enclosing stage).
+    """
+    if _profiler is None:
+        return _DISABLED
+    return _profiler.stage(name, pair)
+
+
+class _Record:
+    """Measures of a stage and pair"""
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.
+        self.peak = 0
+        self.allocated = 0
+        # a call ran at the same time as stages of other threads : the peak is unknown
+        self.shared = False
+        self.profile = cProfile.Profile()
+        self.top : Counter = Counter()
+
+
+class _Frame:
+    """A running stage"""
+    def __init__(self, record : _Record, pair : Optional[str]) -> None:
+        self.record = record
+        self.pair = pair
+        self.profiling = False
+        self.memory = 0
+        self.peak = 0
+        self.snapshot = None
+        # time spent by the profiler in the nested stages, removed from the wall time
+        self.overhead = 0.
+
+
+class Profiler:
+    """
+    Record the cpu profile and the memory of every stage and pair while it is active.
+    Profiles are exclusive (the time of a nested stage is in the nested stage only), wall time and memory are inclusive.
+    The tracemalloc peak is shared by the whole process : the peak of a stage is only measured when no stage of
+    another thread runs at the same time (Pipeline workers or LazyData prefetch do), otherwise it is NaN,
+    as it is on python 3.8 which can not reset the peak. Allocated memory includes the allocations of the other threads.
+    The snapshots of the top allocations use memory too, which shows in the enclosing stages : use top=0 for exact memory.
+    Only one profiler is active at a time.
+
+    :ivar directory: directory where dump() writes, None to only keep the results in memory
+    :ivar cpu: record cProfile profiles
+    :ivar memory: record memory with tracemalloc
+    :ivar top: number of allocation lines kept by stage, 0 to skip the snapshots which are the slowest part
+    """
+    def __init__(self,
+            directory : Optional[str] = None,
+            cpu : bool = True,
+            memory : bool = True,
+            top : int = 10) -> None:
+        """Create a profiler, inactive until start() or the with block
+
+        Args:
+            directory (Optional[str], optional): directory where the results are written when the profiler stops. Defaults to None.
+            cpu (bool, optional): record cProfile profiles. Defaults to True.
+            memory (bool, optional): record memory with tracemalloc. Defaults to True.
+            top (int, optional): number of allocation lines kept by stage. Defaults to 10.
+        """
+        self.directory = directory
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self._records : Dict[Tuple[str, Optional[str]], _Record] = {}
+        # number of threads running a stage, and number of times a thread started running one
+        self._running = 0
+        self._entries = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        global _profiler
+        if _profiler is not None:
+            raise RuntimeError('a profiler is already active')
+        if self.memory and not tracemalloc.is_tracing():
+            # top allocations are grouped by line : one frame is enough
+            tracemalloc.start(1)
+            self._started_tracemalloc = True
+        _profiler = self
+
+    def stop(self) -> None:
+        """Stop recording, and write the results if there is a directory"""
+        global _profiler
+        if _profiler is self:
+            _profiler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self.directory is not None:
+            self.dump(self.directory)
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _stack(self) -> List[_Frame]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name : str, pair : Optional[str] = None):
+        """Record a stage, see hmile.Profiling.stage"""
+        entered = time.perf_counter()
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        if pair is None and parent is not None:
+            pair = parent.pair
+        with self._lock:
+            record = self._records.setdefault((name, pair), _Record())
+            if not stack:
+                self._running += 1
+                self._entries += 1
+            alone = self._running == 1
+            entries = self._entries
+        frame = _Frame(record, pair)
+        if parent is not None and parent.profiling:
+            parent.record.profile.disable()
+        if self.memory and tracemalloc.is_tracing():
+            frame.memory, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.peak = max(parent.peak, peak)
+            if alone and _RESET_PEAK:
+                # the peak of the other threads would be reset too
+                tracemalloc.reset_peak()
+            if self.top:
+                frame.snapshot = self._snapshot()
+        if self.cpu:
+            try:
+                record.profile.enable()
+                frame.profiling = True
+            except ValueError:
+                # another profiler (like a cProfile run of the whole program) owns the thread
+                pass
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stopped = time.perf_counter()
+            seconds = stopped - start - frame.overhead
+            stack.pop()
+            if frame.profiling:
+                record.profile.disable()
+            top = None
+            current = frame.memory
+            if self.memory and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                frame.peak = max(frame.peak, peak)
+                if parent is not None:
+                    parent.peak = max(parent.peak, peak)
+                if frame.snapshot is not None:
+                    differences = self._snapshot().compare_to(frame.snapshot, 'lineno')
+                    top = [(str(difference.traceback[0]), difference.size_diff) for difference in differences[:self.top]]
+            with self._lock:
+                # another thread started a stage since this one started
+                shared = not alone or self._entries != entries or not _RESET_PEAK
+                if not stack:
+                    self._running -= 1
+                record.calls += 1
+                record.seconds += seconds
+                if self.memory:
+                    if shared:
+                        record.shared = True
+                    else:
+                        record.peak = max(record.peak, frame.peak - frame.memory)
+                    record.allocated += current - frame.memory
+                if top:
+                    record.top.update(dict(top))
+            if parent is not None:
+                parent.overhead += frame.overhead + (start - entered) + (time.perf_counter() - stopped)
+                if parent.profiling:
+                    parent.record.profile.enable()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        """Take a snapshot without the allocations of the profiler"""
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def summary(self) -> pd.DataFrame:
+        """Return one row by stage and pair : calls, wall seconds, cpu seconds, peak and allocated MB, sorted by wall time.
+        peak_mb is NaN for the stages which ran at the same time as stages of other threads"""
+        rows = []
+        with self._lock:
+            for (name, pair), record in self._records.items():
+                rows.append({
+                    'stage': name,
+                    'pair': pair,
+                    'calls': record.calls,
+                    'seconds': record.seconds,
+                    'cpu_seconds': self._profileSeconds(record.profile),
+                    'peak_mb': float('nan') if record.shared else record.peak / 2 ** 20,
+                    'allocated_mb': record.allocated / 2 ** 20,
+                })
+        columns = ['stage', 'pair', 'calls', 'seconds', 'cpu_seconds', 'peak_mb', 'allocated_mb']
+        return pd.DataFrame(rows, columns=columns).sort_values('seconds', ascending=False, ignore_index=True)
+
+    def topAllocations(self, name : str, pair : Optional[str] = None) -> List[Tuple[str, int]]:
+        """Return the lines which allocated the most memory in a stage, with the number of bytes"""
+        record = self._records.get((name, pair))
+        return record.top.most_common(self.top) if record is not None else []
+
+    def dump(self, directory : str) -> None:
+        """Write the results in a directory :
+
+        - {stage}[-{pair}].pstats : cProfile statistics, to read with pstats or snakeviz
+        - profile.collapsed : stage;pair;caller;function self time in microseconds, for flamegraph.pl or speedscope
+        - summary.txt : the summary table followed by the top allocations of every stage
+
+        Args:
+            directory (str): directory of the files, created if needed
+        """
+        os.makedirs(directory, exist_ok=True)
+        collapsed = []
+        with self._lock:
+            records = list(self._records.items())
+        for (name, pair), record in records:
+            stats = self._stats(record.profile)
+            if stats is None:
+                continue
+            stats.dump_stats(os.path.join(directory, f'{name}-{pair}.pstats' if pair is not None else f'{name}.pstats'))
+            prefix = f'{name};{pair}' if pair is not None else name
+            for function, (_, _, total, _, callers) in stats.stats.items():
+                if not callers:
+                    collapsed.append(f'{prefix};{self._label(function)} {int(total * 1e6)}')
+                for caller, edge in callers.items():
+                    # edge holds the calls and the self time of function when called by caller
+                    collapsed.append(f'{prefix};{self._label(caller)};{self._label(function)} {int(edge[2] * 1e6)}')
+        with open(os.path.join(directory, 'profile.collapsed'), 'w') as f:
+            f.write('\n'.join(line for line in collapsed if not line.endswith(' 0')) + '\n')
+        with open(os.path.join(directory, 'summary.txt'), 'w') as f:
+            f.write(self.summary().to_string(index=False) + '\n')
+            for (name, pair), record in records:
+                if record.top:
+                    f.write(f'\ntop allocations of {name}' + (f' ({pair})' if pair is not None else '') + '\n')
+                    for line, size in record.top.most_common(self.top):
+                        f.write(f'  {size / 2 ** 20:10.3f} MB  {line}\n')
+
+    @staticmethod
+    def _stats(profile : cProfile.Profile) -> Optional[pstats.Stats]:
+        try:
+            return pstats.Stats(profile)
+        except TypeError:
+            # the profile never ran
+            return None
+
+    def _profileSeconds(self, profile : cProfile.Profile) -> float:
+        stats = self._stats(profile)
+        return stats.total_tt if stats is not None else 0.
+
+    @staticmethod
+    def _label(function : tuple) -> str:
+        filename, line, name = function
+        if filename == '~':
+            return name
+        return f'{os.path.basename(filename)}:{line}({name})'
+
+
+if os.environ.get('HMILE_PROFILE'):
+    _environment_profiler = Profiler(os.environ['HMILE_PROFILE'])
+    _environment_profiler.start()
+    atexit.register(_environment_profiler.stop)
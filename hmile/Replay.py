@@ -0,0 +1,135 @@
+import heapq
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from hmile.DataProvider import DataProvider, interval_to_timedelta
+from hmile.DataTransformer import DataTransformer
+from hmile.utils import date_chunks
+
+
+class Replay:
+    """
+    Replay the bars of every pair in date order, for event driven backtests.
+    The pairs are merged with a heap holding one position by pair, so the bars are never concatenated nor sorted
+    and each step costs O(log(pairs)). With chunk_days, the source is fetched chunk by chunk (see DataProvider.restrict)
+    and only one chunk is in memory. With speed, the replay waits so that the dates go speed times faster than the real time.
+    Bars of the same date are yielded in the order of the pairs of the source.
+
+    :ivar source: DataProvider, DataTransformer or dict of dataframes to replay
+    :ivar chunk_days: number of days fetched at once, None to fetch everything
+    :ivar speed: number of seconds of data replayed by second, None to replay as fast as possible
+    """
+    def __init__(self,
+            source : Union[DataProvider, DataTransformer, Dict[str, pd.DataFrame]],
+            chunk_days : Optional[int] = None,
+            speed : Optional[float] = None) -> None:
+        """Create a replay
+
+        Args:
+            source (Union[DataProvider, DataTransformer, Dict[str, pd.DataFrame]]): bars to replay
+            chunk_days (Optional[int], optional): number of days fetched at once, only for a DataProvider or a DataTransformer.
+                Defaults to None (everything is fetched at once).
+            speed (Optional[float], optional): number of seconds of data replayed by second. Defaults to None (no wait).
+        """
+        self.source = source
+        self.chunk_days = chunk_days
+        self.speed = speed
+        self._columns : Dict[str, List[str]] = {}
+        self._clock = time.monotonic
+        self._sleep = time.sleep
+
+    def columns(self, pair : str) -> List[str]:
+        """Return the columns of the values of a pair, known once its first bar is replayed"""
+        return self._columns[pair]
+
+    def __iter__(self) -> Iterator[Tuple[pd.Timestamp, str, np.ndarray]]:
+        return self.bars()
+
+    def bars(self) -> Iterator[Tuple[pd.Timestamp, str, np.ndarray]]:
+        """Iterate over the bars of every pair in date order
+
+        Yields:
+            Tuple[pd.Timestamp, str, np.ndarray]: date, pair and values of the bar, in the order of columns(pair)
+        """
+        last : Dict[str, int] = {}
+        start : Optional[Tuple[int, float]] = None
+        for data in self._chunks():
+            for date, pair, values in self._merge(data, last):
+                if self.speed is not None:
+                    if start is None:
+                        start = (date.value, self._clock())
+                    self._wait(start, date.value)
+                yield date, pair, values
+
+    def cross_sections(self) -> Iterator[Tuple[pd.Timestamp, Dict[str, np.ndarray]]]:
+        """Iterate over the dates, with the bars of every pair available at this date
+
+        Yields:
+            Tuple[pd.Timestamp, Dict[str, np.ndarray]]: date and values of the bars by pair
+        """
+        current = None
+        section : Dict[str, np.ndarray] = {}
+        for date, pair, values in self.bars():
+            if current is not None and date != current:
+                yield current, section
+                section = {}
+            current = date
+            section[pair] = values
+        if current is not None:
+            yield current, section
+
+    def _wait(self, start : Tuple[int, float], date : int) -> None:
+        """Sleep until the wall time of a date"""
+        first_date, first_clock = start
+        delay = first_clock + (date - first_date) / 1e9 / self.speed - self._clock()
+        if delay > 0:
+            self._sleep(delay)
+
+    def _chunks(self) -> Iterator[Dict[str, pd.DataFrame]]:
+        """Fetch the source chunk by chunk. Consecutive chunks share their bound, duplicates are removed by _merge"""
+        if isinstance(self.source, dict):
+            yield self.source
+            return
+        if self.chunk_days is None:
+            yield self._fetch(self.source)
+            return
+        provider = self.source.provider() if isinstance(self.source, DataTransformer) else self.source
+        for chunk_start, chunk_end in date_chunks(self.source, self.chunk_days, interval_to_timedelta[provider.interval] * 2):
+            yield self._fetch(self.source.restrict(None, chunk_start, chunk_end))
+
+    @staticmethod
+    def _fetch(source : Union[DataProvider, DataTransformer]) -> Dict[str, pd.DataFrame]:
+        if isinstance(source, DataProvider):
+            return source.getData()
+        elif isinstance(source, DataTransformer):
+            return source.transform()
+        raise TypeError('source not a valid type. Must be DataProvider, DataTransformer or dict')
+
+    def _merge(self,
+            data : Dict[str, pd.DataFrame],
+            last : Dict[str, int]) -> Iterator[Tuple[pd.Timestamp, str, np.ndarray]]:
+        """k-way merge of the pairs of a chunk, skipping the dates already replayed (last date by pair, updated)"""
+        pairs = list(data.keys())
+        dates = []
+        values = []
+        heap = []
+        for i, pair in enumerate(pairs):
+            dataframe = data[pair]
+            self._columns.setdefault(pair, dataframe.columns.tolist())
+            dates.append(dataframe.index.asi8)
+            values.append(dataframe.to_numpy())
+            position = np.searchsorted(dates[i], last[pair], side='right') if pair in last else 0
+            if position < len(dates[i]):
+                heap.append((dates[i][position], i, position))
+        heapq.heapify(heap)
+        while heap:
+            date, i, position = heap[0]
+            if position + 1 < len(dates[i]):
+                heapq.heapreplace(heap, (dates[i][position + 1], i, position + 1))
+            else:
+                heapq.heappop(heap)
+            last[pairs[i]] = date
+            yield pd.Timestamp(date, tz=data[pairs[i]].index.tz), pairs[i], values[i][position]
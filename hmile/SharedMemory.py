@@ -0,0 +1,187 @@
+import json
+import struct
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from hmile.Exception import DataframeFormatException
+
+# the manifest block starts with the length of the json document
+MANIFEST_HEADER = struct.Struct('<Q')
+# names of the blocks created by this process
+_published = set()
+
+
+def _open_block(name : str) -> shared_memory.SharedMemory:
+    """Attach to an existing shared memory block without letting this process destroy it on exit"""
+    if name in _published:
+        return shared_memory.SharedMemory(name=name)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 registers every attached block to the resource tracker
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        except Exception:
+            pass
+        return block
+
+
+def _freqstr(index : pd.DatetimeIndex):
+    """Return a frequency string which can be parsed back. Fill policies set DateOffset frequencies which cannot"""
+    if index.freq is None or len(index) < 2:
+        return None
+    return to_offset(index[1] - index[0]).freqstr
+
+
+class SharedDataset(Mapping):
+    """
+    Dict of dataframes stored in POSIX shared memory. The process calling publish() owns the memory,
+    other processes call attach() with the same name and get read-only dataframes which are not copied.
+    Each pair is stored in one block : the int64 dates followed by the float64 values.
+    A manifest block named like the dataset describes the pairs.
+
+    :ivar name: name of the dataset, shared between the processes
+    :ivar manifest: description of the stored pairs
+    """
+    def __init__(self, name : str, manifest : dict, blocks : List[shared_memory.SharedMemory], owner : bool) -> None:
+        self.name = name
+        self.manifest = manifest
+        self._blocks = blocks
+        self._owner = owner
+        self._frames = {}
+
+    @classmethod
+    def publish(cls, data : Dict[str, pd.DataFrame], name : str) -> 'SharedDataset':
+        """Copy a dict of dataframes into shared memory
+
+        Args:
+            data (Dict[str, pd.DataFrame]): output of getData() or transform()
+            name (str): name of the dataset, used by the other processes to attach
+
+        Raises:
+            DataframeFormatException: if a dataframe is not indexed by date or contains non numeric columns
+
+        Returns:
+            SharedDataset: the published dataset. It must be kept alive while the other processes read it
+        """
+        manifest = {'pairs': {}}
+        blocks = []
+        try:
+            for number, (pair, dataframe) in enumerate(data.items()):
+                if not isinstance(dataframe.index, pd.DatetimeIndex):
+                    raise DataframeFormatException('The index of the dataframe should be a date', dataframe)
+                try:
+                    values = dataframe.to_numpy(dtype=np.float64)
+                except (TypeError, ValueError):
+                    raise DataframeFormatException('Only numeric dataframes can be shared', dataframe)
+                rows, columns = values.shape
+                block = shared_memory.SharedMemory(
+                    name=f'{name}_{number}',
+                    create=True,
+                    size=max(8 * rows * (columns + 1), 1))
+                blocks.append(block)
+                _published.add(block.name)
+                np.ndarray((rows,), dtype=np.int64, buffer=block.buf)[:] = dataframe.index.asi8
+                np.ndarray((rows, columns), dtype=np.float64, buffer=block.buf, offset=8 * rows)[:] = values
+                manifest['pairs'][pair] = {
+                    'block': block.name,
+                    'rows': rows,
+                    'columns': [str(column) for column in dataframe.columns],
+                    'tz': str(dataframe.index.tz) if dataframe.index.tz is not None else None,
+                    'freq': _freqstr(dataframe.index),
+                    'index_name': dataframe.index.name,
+                }
+            document = json.dumps(manifest).encode()
+            block = shared_memory.SharedMemory(name=name, create=True, size=MANIFEST_HEADER.size + len(document))
+            blocks.append(block)
+            _published.add(block.name)
+            MANIFEST_HEADER.pack_into(block.buf, 0, len(document))
+            block.buf[MANIFEST_HEADER.size:MANIFEST_HEADER.size + len(document)] = document
+        except BaseException:
+            for block in blocks:
+                block.close()
+                block.unlink()
+                _published.discard(block.name)
+            raise
+        return cls(name, manifest, blocks, owner=True)
+
+    @classmethod
+    def attach(cls, name : str) -> 'SharedDataset':
+        """Attach to a dataset published by another process
+
+        Args:
+            name (str): name given to publish()
+
+        Returns:
+            SharedDataset: read-only view on the published dataframes
+        """
+        block = _open_block(name)
+        length, = MANIFEST_HEADER.unpack_from(block.buf, 0)
+        manifest = json.loads(bytes(block.buf[MANIFEST_HEADER.size:MANIFEST_HEADER.size + length]))
+        blocks = [block]
+        try:
+            for description in manifest['pairs'].values():
+                blocks.append(_open_block(description['block']))
+        except BaseException:
+            for block in blocks:
+                block.close()
+            raise
+        return cls(name, manifest, blocks, owner=False)
+
+    def __getitem__(self, pair : str) -> pd.DataFrame:
+        if pair not in self._frames:
+            description = self.manifest['pairs'][pair]
+            block = next(block for block in self._blocks if block.name == description['block'])
+            rows, columns = description['rows'], len(description['columns'])
+            dates = np.ndarray((rows,), dtype=np.int64, buffer=block.buf)
+            values = np.ndarray((rows, columns), dtype=np.float64, buffer=block.buf, offset=8 * rows)
+            if not self._owner:
+                dates.flags.writeable = False
+                values.flags.writeable = False
+            if description['tz'] is not None:
+                dtype = pd.DatetimeTZDtype(tz=description['tz'])
+            else:
+                dtype = np.dtype('M8[ns]')
+            index = pd.DatetimeIndex(
+                pd.arrays.DatetimeArray(dates.view('M8[ns]'), dtype=dtype),
+                name=description['index_name'],
+                freq=description['freq'])
+            self._frames[pair] = pd.DataFrame(values, index=index, columns=description['columns'], copy=False)
+        return self._frames[pair]
+
+    def __iter__(self):
+        return iter(self.manifest['pairs'])
+
+    def __len__(self) -> int:
+        return len(self.manifest['pairs'])
+
+    def close(self) -> None:
+        """Release the dataframes of this process. They must not be used afterward"""
+        self._frames = {}
+        for block in self._blocks:
+            block.close()
+        self._blocks = []
+
+    def unlink(self) -> None:
+        """Close the dataset and free the shared memory. Only the publisher should call it"""
+        blocks = self._blocks
+        self.close()
+        for block in blocks:
+            block.unlink()
+            _published.discard(block.name)
+
+    def __enter__(self) -> 'SharedDataset':
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self._owner:
+            self.unlink()
+        else:
+            self.close()
@@ -0,0 +1,244 @@
+import json
+import warnings
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class RunningStatistics:
+    """
+    Streaming statistics of each column : count, min, max, mean and variance (Welford / Chan merge).
+    Approximate quantiles are estimated from a uniform reservoir sample of each column.
+    Statistics can be updated chunk by chunk, merged between processes and saved to disk,
+    so that they are computed once and reused for training and live inference. NaN values are ignored.
+
+    :ivar columns: names of the tracked columns
+    :ivar sample_size: size of the reservoir used for quantiles, 0 to disable quantiles
+    """
+    def __init__(self, sample_size : int = 0, seed : Optional[int] = None) -> None:
+        """Create an empty accumulator
+
+        Args:
+            sample_size (int, optional): number of values kept by column to estimate quantiles. Defaults to 0 (no quantiles).
+            seed (Optional[int], optional): seed of the reservoir sampling. Defaults to None.
+        """
+        self.sample_size = sample_size
+        self.columns : List[str] = []
+        self._count = np.zeros(0, dtype=np.int64)
+        self._min = np.zeros(0)
+        self._max = np.zeros(0)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+        self._samples : List[np.ndarray] = []
+        self._rng = np.random.default_rng(seed)
+
+    def _extend(self, columns : List[str]) -> np.ndarray:
+        """Add the unknown columns and return the position of the given columns"""
+        positions = {column : i for i, column in enumerate(self.columns)}
+        new = [column for column in dict.fromkeys(columns) if column not in positions]
+        if new:
+            self.columns += new
+            self._count = np.concatenate([self._count, np.zeros(len(new), dtype=np.int64)])
+            self._min = np.concatenate([self._min, np.full(len(new), np.inf)])
+            self._max = np.concatenate([self._max, np.full(len(new), -np.inf)])
+            self._mean = np.concatenate([self._mean, np.zeros(len(new))])
+            self._m2 = np.concatenate([self._m2, np.zeros(len(new))])
+            self._samples += [np.zeros(0) for _ in new]
+            positions.update({column : len(positions) + i for i, column in enumerate(new)})
+        return np.array([positions[column] for column in columns], dtype=np.int64)
+
+    def _combine(self, positions, count, minimum, maximum, mean, m2, samples) -> None:
+        """Merge the statistics of another set of values into the given columns"""
+        total = self._count[positions] + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self._mean[positions]
+            ratio = np.where(total > 0, count / np.maximum(total, 1), 0.)
+            self._m2[positions] = self._m2[positions] + m2 + delta ** 2 * self._count[positions] * ratio
+            self._mean[positions] = self._mean[positions] + delta * ratio
+        self._min[positions] = np.fmin(self._min[positions], minimum)
+        self._max[positions] = np.fmax(self._max[positions], maximum)
+        if self.sample_size:
+            for i, position in enumerate(positions):
+                self._samples[position] = self._merge_samples(
+                    self._samples[position], self._count[position], samples[i], count[i])
+        self._count[positions] = total
+
+    def _merge_samples(self, sample_a : np.ndarray, count_a : int, sample_b : np.ndarray, count_b : int) -> np.ndarray:
+        """Merge two uniform samples into a uniform sample of the union of size at most sample_size"""
+        if len(sample_a) + len(sample_b) <= self.sample_size:
+            return np.concatenate([sample_a, sample_b])
+        from_a = self._rng.binomial(self.sample_size, count_a / (count_a + count_b))
+        from_a = min(max(from_a, self.sample_size - len(sample_b)), len(sample_a))
+        return np.concatenate([
+            self._rng.choice(sample_a, from_a, replace=False),
+            self._rng.choice(sample_b, self.sample_size - from_a, replace=False),
+        ])
+
+    def update(self, data : pd.DataFrame) -> 'RunningStatistics':
+        """Add a chunk of rows to the statistics
+
+        Args:
+            data (pd.DataFrame): numeric dataframe, columns are matched by name
+
+        Returns:
+            RunningStatistics: self
+        """
+        columns = [str(column) for column in data.columns]
+        positions = self._extend(columns)
+        values = data.to_numpy(dtype=np.float64)
+        values = np.where(np.isfinite(values), values, np.nan)
+        count = (~np.isnan(values)).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            # all-nan columns
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.where(count > 0, np.nanmean(values, axis=0), 0.)
+            m2 = np.where(count > 0, np.nansum((values - mean) ** 2, axis=0), 0.)
+            minimum = np.nanmin(values, axis=0) if len(values) else np.full(len(columns), np.inf)
+            maximum = np.nanmax(values, axis=0) if len(values) else np.full(len(columns), -np.inf)
+        samples = []
+        if self.sample_size:
+            for i in range(values.shape[1]):
+                column = values[:, i]
+                column = column[~np.isnan(column)]
+                if len(column) > self.sample_size:
+                    column = self._rng.choice(column, self.sample_size, replace=False)
+                samples.append(column)
+        self._combine(positions, count, minimum, maximum, mean, m2, samples)
+        return self
+
+    def update_pairs(self, pairs : Dict[str, pd.DataFrame]) -> 'RunningStatistics':
+        """Add every dataframe of a dict of pairs, like the output of getData() or transform()
+
+        Args:
+            pairs (Dict[str, pd.DataFrame]): dict of pairs
+
+        Returns:
+            RunningStatistics: self
+        """
+        for dataframe in pairs.values():
+            self.update(dataframe)
+        return self
+
+    def merge(self, other : 'RunningStatistics') -> 'RunningStatistics':
+        """Add the statistics computed by another accumulator, for example in another process
+
+        Args:
+            other (RunningStatistics): accumulator to merge
+
+        Raises:
+            ValueError: if the accumulators do not have the same sample_size
+
+        Returns:
+            RunningStatistics: self
+        """
+        if other.sample_size != self.sample_size:
+            raise ValueError(f'can not merge statistics with sample_size {other.sample_size} into sample_size {self.sample_size}')
+        positions = self._extend(other.columns)
+        self._combine(positions, other._count, other._min, other._max, other._mean, other._m2, other._samples)
+        return self
+
+    @property
+    def count(self) -> pd.Series:
+        return pd.Series(self._count, index=self.columns)
+
+    @property
+    def min(self) -> pd.Series:
+        return pd.Series(np.where(self._count > 0, self._min, np.nan), index=self.columns)
+
+    @property
+    def max(self) -> pd.Series:
+        return pd.Series(np.where(self._count > 0, self._max, np.nan), index=self.columns)
+
+    @property
+    def mean(self) -> pd.Series:
+        return pd.Series(np.where(self._count > 0, self._mean, np.nan), index=self.columns)
+
+    def var(self, ddof : int = 1) -> pd.Series:
+        """Variance of each column
+
+        Args:
+            ddof (int, optional): delta degrees of freedom, like pandas. Defaults to 1.
+
+        Returns:
+            pd.Series: variance by column
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = np.where(self._count > ddof, self._m2 / (self._count - ddof), np.nan)
+        return pd.Series(var, index=self.columns)
+
+    def std(self, ddof : int = 1) -> pd.Series:
+        return np.sqrt(self.var(ddof))
+
+    def quantile(self, q : float) -> pd.Series:
+        """Approximate quantile of each column, estimated from the reservoir samples
+
+        Args:
+            q (float): quantile between 0 and 1
+
+        Raises:
+            ValueError: if the accumulator does not keep samples
+
+        Returns:
+            pd.Series: quantile by column
+        """
+        if not self.sample_size:
+            raise ValueError('quantiles need a sample_size greater than 0')
+        return pd.Series(
+            [np.quantile(sample, q) if len(sample) else np.nan for sample in self._samples],
+            index=self.columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the statistics as a dataframe indexed by column, usable by hmile.utils.apply_normalization
+
+        Returns:
+            pd.DataFrame: count, min, max, mean and std of each column
+        """
+        return pd.DataFrame({
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'std': self.std(),
+        })
+
+    def save(self, path : str) -> None:
+        """Save the accumulator to a json file
+
+        Args:
+            path (str): path of the file
+        """
+        with open(path, 'w') as f:
+            json.dump({
+                'sample_size': self.sample_size,
+                'columns': self.columns,
+                'count': self._count.tolist(),
+                'min': self._min.tolist(),
+                'max': self._max.tolist(),
+                'mean': self._mean.tolist(),
+                'm2': self._m2.tolist(),
+                'samples': [sample.tolist() for sample in self._samples],
+            }, f)
+
+    @classmethod
+    def load(cls, path : str, seed : Optional[int] = None) -> 'RunningStatistics':
+        """Load an accumulator saved with save()
+
+        Args:
+            path (str): path of the file
+            seed (Optional[int], optional): seed for the following updates. Defaults to None.
+
+        Returns:
+            RunningStatistics: the loaded accumulator, it can still be updated
+        """
+        with open(path) as f:
+            content = json.load(f)
+        statistics = cls(content['sample_size'], seed)
+        statistics.columns = content['columns']
+        statistics._count = np.array(content['count'], dtype=np.int64)
+        statistics._min = np.array(content['min'], dtype=np.float64)
+        statistics._max = np.array(content['max'], dtype=np.float64)
+        statistics._mean = np.array(content['mean'], dtype=np.float64)
+        statistics._m2 = np.array(content['m2'], dtype=np.float64)
+        statistics._samples = [np.array(sample, dtype=np.float64) for sample in content['samples']]
+        return statistics
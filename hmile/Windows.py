@@ -0,0 +1,139 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from hmile.Exception import DataframeFormatException
+from hmile.utils import align_pairs
+
+
+class SlidingWindows:
+    """
+    Fixed length lookback windows over the output of getData() or transform().
+    The values of each pair are converted once to a float64 array and every window is a strided view on it,
+    so the memory used does not depend on the number of windows. Only batches are copied.
+
+    Windows are numbered pair after pair. With align, the pairs are first restricted to their common dates and
+    columns, and the window i of every pair ends at the same date : aligned batches have the shape
+    (batch, pairs, length, features).
+
+    :ivar length: number of bars of a window
+    :ivar stride: number of bars between the ends of two consecutive windows
+    :ivar columns: features of the windows
+    :ivar pairs: pairs of the windows
+    :ivar align: windows of every pair end at the same dates
+    """
+    def __init__(self,
+            data : Dict[str, pd.DataFrame],
+            length : int,
+            stride : int = 1,
+            columns : Optional[List[str]] = None,
+            align : bool = False) -> None:
+        """Build the windows
+
+        Args:
+            data (Dict[str, pd.DataFrame]): dict of pairs, like the output of getData() or transform()
+            length (int): number of bars of a window
+            stride (int, optional): number of bars between the ends of two consecutive windows. Defaults to 1.
+            columns (Optional[List[str]], optional): features to keep. Defaults to None (every column, which must be the same for every pair).
+            align (bool, optional): keep only the common dates so that the windows of every pair end at the same dates. Defaults to False.
+
+        Raises:
+            DataframeFormatException: if the pairs do not have the same columns
+        """
+        self.length = length
+        self.stride = stride
+        self.align = align
+        if align:
+            data, _ = align_pairs(data, how='inner')
+        self.pairs = list(data.keys())
+        frames = list(data.values())
+        if columns is None:
+            columns = frames[0].columns.tolist() if frames else []
+            for dataframe in frames:
+                if dataframe.columns.tolist() != columns:
+                    raise DataframeFormatException('Every pair should have the same columns, select them with columns', dataframe)
+        self.columns = list(columns)
+        self._indexes = [dataframe.index for dataframe in frames]
+        if align:
+            # one (dates, pairs, features) array shared by every window
+            values = np.empty((len(self._indexes[0]) if frames else 0, len(frames), len(self.columns)))
+            for i, dataframe in enumerate(frames):
+                values[:, i, :] = dataframe[self.columns].to_numpy(dtype=np.float64)
+            self._views = [self._view(values)]
+        else:
+            self._views = [
+                self._view(np.ascontiguousarray(dataframe[self.columns].to_numpy(dtype=np.float64)))
+                for dataframe in frames
+            ]
+        counts = [len(view) for view in self._views]
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def _view(self, values : np.ndarray) -> np.ndarray:
+        """Return the windows of an array of dates x ... as a read-only view of shape (windows, ..., length, features)"""
+        if len(values) < self.length:
+            return np.empty((0,) + values.shape[1:-1] + (self.length, values.shape[-1]))
+        # sliding_window_view puts the window axis last : (windows, ..., features, length)
+        windows = sliding_window_view(values, self.length, axis=0)[::self.stride]
+        return np.swapaxes(windows, -1, -2)
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def _locate(self, indices : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the view and the position in the view of window numbers"""
+        views = np.searchsorted(self._offsets, indices, side='right') - 1
+        return views, indices - self._offsets[views]
+
+    def __getitem__(self, i : int) -> np.ndarray:
+        """Return a window as a read-only view, of shape (length, features) or (pairs, length, features) with align"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f'window {i} out of range')
+        view, position = self._locate(np.array([i]))
+        return self._views[view[0]][position[0]]
+
+    def key(self, i : int) -> Tuple[Optional[str], pd.Timestamp]:
+        """Return the pair (None with align) and the last date of a window"""
+        view, position = self._locate(np.array([i]))
+        end = position[0] * self.stride + self.length - 1
+        if self.align:
+            return None, self._indexes[0][end]
+        return self.pairs[view[0]], self._indexes[view[0]][end]
+
+    def batches(self,
+            batch_size : int,
+            shuffle : bool = False,
+            seed : Optional[int] = None,
+            drop_last : bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Iterate over the windows by batches. Each batch is a new array, the windows are not copied otherwise
+
+        Args:
+            batch_size (int): number of windows of a batch
+            shuffle (bool, optional): go through the windows in a random order. Defaults to False.
+            seed (Optional[int], optional): seed of the shuffle. Defaults to None.
+            drop_last (bool, optional): skip the last batch if it is smaller than batch_size. Defaults to False.
+
+        Yields:
+            Tuple[np.ndarray, np.ndarray]: the window numbers and the batch of windows
+        """
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            if drop_last and len(indices) < batch_size:
+                break
+            yield indices, self.take(indices)
+
+    def take(self, indices : np.ndarray) -> np.ndarray:
+        """Copy some windows into a new array of shape (len(indices), ...)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        views, positions = self._locate(indices)
+        batch = np.empty((len(indices),) + self._views[0].shape[1:] if self._views else (0,))
+        for view in np.unique(views):
+            mask = views == view
+            batch[mask] = self._views[view][positions[mask]]
+        return batch
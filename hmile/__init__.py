@@ -6,9 +6,16 @@ from .DataProvider import YahooDataProvider as Yahooprovider
 from .DataProvider import CSVDataProvider as Csvprovider
 from .DataProvider import PolygonDataProvider as Polygonprovider
 from .DataProvider import ElasticDataProvider as Elasticprovider
+from .DataProvider import ZarrDataProvider as Zarrprovider
+from .DataProvider import SyntheticDataProvider as Syntheticprovider
 from .DataExporter import CSVDataExporter as Csvexporter
 from .DataExporter import ElasticDataExporter as Elasticexporter
+from .DataExporter import SharedMemoryDataExporter as Sharedmemoryexporter
+from .DataExporter import ZarrDataExporter as Zarrexporter
 from .DataTransformer import TaDataTransformer as TATransformer
+from .DataTransformer import FastTaDataTransformer as FastTATransformer
+from .DataTransformer import CrossPairDataTransformer as CrossPairTransformer
+from .Profiling import Profiler
 
 RABBIT_BANNER =  """
    ______         .__.__          
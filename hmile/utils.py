@@ -1,8 +1,58 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
 import pandas as pd
 import numpy as np
 import warnings
 warnings.filterwarnings("ignore")
 
+def parse_date_like(value : str, index : pd.DatetimeIndex) -> pd.Timestamp:
+    """parse a date so that it can be compared with a datetime index : the timezone of the index is used
+
+    Args:
+        value (str): date to parse
+        index (pd.DatetimeIndex): index the date will be compared to
+
+    Returns:
+        pd.Timestamp: the parsed date
+    """
+    date = pd.Timestamp(value)
+    if index.tz is not None and date.tz is None:
+        date = date.tz_localize(index.tz)
+    elif index.tz is None and date.tz is not None:
+        date = date.tz_convert(None)
+    return date
+
+def date_chunks(source, chunk_days : Optional[int], min_length : timedelta) -> List[Tuple[str, str]]:
+    """Split the dates of a DataProvider or a DataTransformer into consecutive chunks of chunk_days days.
+    End dates are included : consecutive chunks share their bound
+
+    Args:
+        source (Union[DataProvider, DataTransformer]): source whose dates are split
+        chunk_days (Optional[int]): number of days of a chunk, None for one chunk
+        min_length (timedelta): minimum length of a chunk, two intervals as providers need at least two intervals
+            between the dates. A shorter last chunk is merged into the previous one
+
+    Returns:
+        List[Tuple[str, str]]: start and end date of every chunk, like 2020-12-31
+    """
+    provider = source
+    while hasattr(provider, 'dataprovider'):
+        provider = provider.dataprovider
+    # TaDataTransformer moves the start date of its provider to compute the indicators
+    start = getattr(source, 'initial_start_date', None) or provider.start_date
+    first = datetime.strptime(start, '%Y-%m-%d')
+    last = datetime.strptime(provider.end_date, '%Y-%m-%d')
+    bounds = [first]
+    if chunk_days is not None:
+        while bounds[-1] + timedelta(days=chunk_days) < last:
+            bounds.append(bounds[-1] + timedelta(days=chunk_days))
+        if len(bounds) > 1 and last - bounds[-1] < min_length:
+            bounds.pop()
+    bounds.append(last)
+    return [(a.strftime('%Y-%m-%d'), b.strftime('%Y-%m-%d')) for a, b in zip(bounds, bounds[1:])]
+
 def get_min_dict(pairs : dict) -> list:
     """return the min of a dict with severals pairs
 
@@ -21,7 +71,7 @@ def get_min_dict(pairs : dict) -> list:
 
         if type(list(min)[0]) == list :
             raise("error min is not a single list")
-        return list(min)
+    return list(min)
 
 def get_max_dict(pairs : dict) -> list:
     """return the max of a dict with severals pairs
@@ -44,6 +94,83 @@ def get_max_dict(pairs : dict) -> list:
     return list(max)
 
 
+class AlignmentReport:
+    """Describe what align_pairs changed to align the pairs
+
+    :ivar columns: columns kept, common to every pair
+    :ivar dropped_columns: columns removed from each pair, only pairs which lost columns are present
+    :ivar index: common index of the pairs, None if indexes were not aligned
+    :ivar misaligned_dates: dates removed from (inner join) or added to (outer join) each pair, only pairs which changed are present
+    """
+    def __init__(self, columns : list, dropped_columns : dict, index : pd.Index, misaligned_dates : dict) -> None:
+        self.columns = columns
+        self.dropped_columns = dropped_columns
+        self.index = index
+        self.misaligned_dates = misaligned_dates
+
+    @property
+    def aligned(self) -> bool:
+        """True if every pair already had the same columns and dates"""
+        return not self.dropped_columns and not self.misaligned_dates
+
+    def __repr__(self) -> str:
+        return (f'AlignmentReport(columns={len(self.columns)}, '
+                f'dropped_columns={ {pair : len(columns) for pair, columns in self.dropped_columns.items()} }, '
+                f'misaligned_dates={ {pair : len(dates) for pair, dates in self.misaligned_dates.items()} })')
+
+def align_pairs(pairs : dict, how : Optional[str] = 'inner') -> Tuple[dict, AlignmentReport] :
+    """ keep only common columns between multiples pairs and join their indexes.
+    Dataframes which are already aligned are returned as is, without copy
+
+    Args:
+        pairs (dict): dict of pairs
+        how (Optional[str], optional): 'inner' keeps the dates common to every pair, 'outer' keeps every date
+            and fills the missing ones with nan, None does not align indexes. Defaults to 'inner'.
+
+    Raises:
+        ValueError: if how is not 'inner', 'outer' or None
+
+    Returns:
+        Tuple[dict, AlignmentReport]: dict of aligned pairs and the report of the changes
+    """
+    if how not in ('inner', 'outer', None):
+        raise ValueError(f'how should be inner, outer or None, not {how}')
+    if not pairs:
+        return {}, AlignmentReport([], {}, None, {})
+    frames = list(pairs.values())
+    # count in how many pairs each column appears
+    occurrences = Counter()
+    for df in frames:
+        occurrences.update(df.columns.unique())
+    columns = [col for col in dict.fromkeys(frames[0].columns) if occurrences[col] == len(frames)]
+    columns_index = pd.Index(columns)
+    dropped_columns = {}
+    for pair, df in pairs.items():
+        if not df.columns.equals(columns_index):
+            dropped = [col for col in df.columns if occurrences[col] != len(frames)]
+            if dropped:
+                dropped_columns[pair] = dropped
+
+    index = None
+    misaligned_dates = {}
+    if how is not None:
+        index = frames[0].index
+        for df in frames[1:]:
+            if not df.index.equals(index):
+                index = index.intersection(df.index) if how == 'inner' else index.union(df.index)
+        for pair, df in pairs.items():
+            if not df.index.equals(index):
+                misaligned_dates[pair] = df.index.difference(index) if how == 'inner' else index.difference(df.index)
+
+    aligned = {}
+    for pair, df in pairs.items():
+        if not df.columns.equals(columns_index):
+            df = df[columns]
+        if index is not None and not df.index.equals(index):
+            df = df.reindex(index)
+        aligned[pair] = df
+    return aligned, AlignmentReport(columns, dropped_columns, index, misaligned_dates)
+
 def merge_columns(pairs : dict) :
     """ keep only common indicators between multiples pairs
 
@@ -53,20 +180,49 @@ def merge_columns(pairs : dict) :
     Returns:
         dict of actuated pairs 
     """
-    init = True
-    cols : pd.Index = None
-    for _,df in pairs.items() :
-        if init :
-            cols = df.columns
-            init = False
-        else :
-            cols = cols.intersection(df.columns)
-    cols = cols.drop_duplicates(keep='first')
-    to_keep = cols.values.tolist()
-    for pair,df in pairs.items() :
-        pairs[pair] = df[to_keep]
+    aligned, _ = align_pairs(pairs, how=None)
+    pairs.update(aligned)
     return pairs
 
+def column_statistics(data : pd.DataFrame, chunk_size : int = 64) -> pd.DataFrame:
+    """compute for each column the number of non finite values, the mean and the std (ddof=1)
+    without building a normalized copy of the dataframe. Columns are treated by chunks to bound temporary memory
+
+    Args:
+        data (pd.DataFrame): numeric dataframe
+        chunk_size (int, optional): number of columns treated at once. Defaults to 64.
+
+    Returns:
+        pd.DataFrame: indexed by the columns of data, with the columns invalid, mean and std
+    """
+    nb_columns = data.shape[1]
+    invalid = np.empty(nb_columns, dtype=np.int64)
+    mean = np.empty(nb_columns)
+    std = np.empty(nb_columns)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        for start in range(0, nb_columns, chunk_size):
+            # a frame made of several blocks is copied by to_numpy : only one chunk is converted at once
+            chunk = data.iloc[:, start:start + chunk_size].to_numpy(dtype=np.float64)
+            stop = start + chunk.shape[1]
+            invalid[start:stop] = chunk.shape[0] - np.isfinite(chunk).sum(axis=0)
+            mean[start:stop] = chunk.mean(axis=0)
+            std[start:stop] = chunk.std(axis=0, ddof=1)
+    return pd.DataFrame({'invalid': invalid, 'mean': mean, 'std': std}, index=data.columns)
+
+def apply_normalization(data : pd.DataFrame, statistics : pd.DataFrame) -> pd.DataFrame:
+    """normalize a dataframe with previously computed statistics : (data - mean) / std
+
+    Args:
+        data (pd.DataFrame): dataframe to normalize
+        statistics (pd.DataFrame): indexed by column names, with the columns mean and std
+
+    Returns:
+        pd.DataFrame: normalized dataframe, restricted to the columns of statistics
+    """
+    columns = statistics.index.tolist()
+    values = (data[columns].to_numpy(dtype=np.float64) - statistics['mean'].to_numpy()) / statistics['std'].to_numpy()
+    return pd.DataFrame(values, index=data.index, columns=columns)
+
 def get_number_lines(pairs : dict) :
     lines = []
     for _,df in pairs.items() :
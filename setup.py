@@ -13,6 +13,7 @@ setup(
     long_description=open('README.md').read(),
     install_requires=requirements,
     extras_require={
-        'test': ['unittest2']
+        'test': ['unittest2'],
+        'zarr': ['zarr>=2.11,<3'],
     },
 )
\ No newline at end of file
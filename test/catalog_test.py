@@ -0,0 +1,95 @@
+import os
+import unittest
+
+import pandas as pd
+
+from hmile.Catalog import DataCatalog, count_gaps
+from hmile.DataProvider import CSVDataProvider
+from hmile.DataExporter import CSVDataExporter
+from hmile.Exception import DataNotAvailableException
+
+
+class TestDataCatalog(unittest.TestCase):
+    def setUp(self):
+        self.path = '/tmp/testcatalog.json'
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self.catalog = DataCatalog(self.path)
+        index = pd.date_range('2022-01-01', periods=48, freq='H', tz='UTC')
+        self.dataframe = pd.DataFrame({'open': range(48)}, index=index).drop(index[10:12])
+
+    def test_update(self):
+        entry = self.catalog.update('csv:test', 'btcusd', 'hour', self.dataframe, complete=True)
+        self.assertEqual(entry.rows, 46)
+        self.assertEqual(entry.gaps, 1)
+        self.assertEqual(entry.first, pd.Timestamp('2022-01-01'))
+        self.assertIs(self.catalog.get('csv:test', 'BTCUSD', 'hour'), entry)
+
+    def test_merge(self):
+        self.catalog.update('csv:test', 'BTCUSD', 'hour', self.dataframe.iloc[:20], complete=True)
+        entry = self.catalog.update('csv:test', 'BTCUSD', 'hour', self.dataframe.iloc[15:])
+        self.assertEqual(entry.rows, 46)
+        self.assertEqual(entry.gaps, 1)
+        self.assertTrue(entry.complete)
+
+    def test_available(self):
+        self.catalog.update('csv:test', 'BTCUSD', 'hour', self.dataframe, complete=True)
+        self.assertTrue(self.catalog.available('csv:test', 'BTCUSD', 'hour', '2021-12-01', '2022-01-01'))
+        self.assertFalse(self.catalog.available('csv:test', 'BTCUSD', 'hour', '2021-12-01', '2021-12-31'))
+        self.assertTrue(self.catalog.available('csv:test', 'ETHUSD', 'hour', '2021-12-01', '2021-12-31'))
+
+    def test_save_load(self):
+        self.catalog.update('csv:test', 'BTCUSD', 'hour', self.dataframe, complete=True)
+        self.catalog.set_pairs('csv:test', 'hour', ['ETHUSD', 'BTCUSD'])
+        catalog = DataCatalog(self.path)
+        self.assertEqual(catalog.get('csv:test', 'BTCUSD', 'hour').rows, 46)
+        self.assertEqual(catalog.pairs('csv:test', 'hour'), ['BTCUSD', 'ETHUSD'])
+
+    def test_flush(self):
+        self.catalog.update('csv:test', 'BTCUSD', 'hour', self.dataframe, complete=True)
+        self.assertFalse(os.path.isfile(self.path))
+        with self.catalog.batch():
+            self.catalog.flush()
+            self.assertFalse(os.path.isfile(self.path))
+        self.assertEqual(DataCatalog(self.path).get('csv:test', 'BTCUSD', 'hour').rows, 46)
+
+    def test_save_once_by_get_data(self):
+        saves = []
+        save = self.catalog.save
+        self.catalog.save = lambda path=None: saves.append(path) or save(path)
+        dp = CSVDataProvider(['BTCUSD', 'ETHUSD'], '2021-12-01', '2021-12-05', 'test/data/csvdataprovider', interval='hour')
+        dp.catalog = self.catalog
+        dp.getData()
+        self.assertEqual(len(saves), 1)
+        self.assertIsNotNone(DataCatalog(self.path).get(dp.catalogSource(), 'ETHUSD', 'hour'))
+
+    def test_count_gaps(self):
+        self.assertEqual(count_gaps(self.dataframe.index, 'hour'), 1)
+        self.assertEqual(count_gaps(self.dataframe.index, 'day'), 0)
+
+
+class TestCatalogProvider(unittest.TestCase):
+    def setUp(self):
+        self.directory = '/tmp/testcatalogprovider'
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+        self.catalog = DataCatalog()
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', 'test/data/csvdataprovider', interval='hour')
+        exporter = CSVDataExporter(dp, self.directory)
+        exporter.catalog = self.catalog
+        exporter.export()
+
+    def test_reject_without_download(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-22', '2021-12-25', self.directory, interval='hour')
+        dp.catalog = self.catalog
+        dp._getOnePair = lambda pair: self.fail('the pair should not be read')
+        with self.assertRaises(DataNotAvailableException):
+            dp.getData()
+
+    def test_available_pairs(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-02', '2021-12-05', self.directory, interval='hour')
+        dp.catalog = self.catalog
+        self.assertIn('BTCUSD', dp.getAvailablePairs())
+        self.assertIsNotNone(self.catalog.pairs(dp.catalogSource(), 'hour'))
@@ -1,9 +1,14 @@
 import os
 import unittest
+from unittest import mock
 
-from hmile.DataProvider import CSVDataProvider
+import pandas as pd
+from elasticsearch import NotFoundError
+
+from hmile.DataProvider import CSVDataProvider, ElasticDataProvider, SyntheticDataProvider
 from hmile.FillPolicy import FillPolicyAkima
-from hmile.DataExporter import CSVDataExporter, ElasticDataExporter
+from hmile.DataExporter import CSVDataExporter, ElasticDataExporter, SharedMemoryDataExporter, index_template
+from hmile.SharedMemory import SharedDataset
 
 class TestCSVDataExporter(unittest.TestCase):
     
@@ -57,4 +62,327 @@ class MultiCSVExport(unittest.TestCase):
         self.exporter.export()
         self.assertTrue(os.path.isfile('/tmp/testtransformer/f-btcusd-hour.csv'))
         self.assertTrue(os.path.isfile('/tmp/testtransformer/f-ethusd-hour.csv'))
-    
\ No newline at end of file
+    
+class TestIncrementalCSVExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = '/tmp/testincremental'
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+        for f in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, f))
+        self.name = f'{self.directory}/f-btcusd-hour.csv'
+
+    def export(self, start, end, overlap=0):
+        dp = CSVDataProvider(['BTCUSD'], start, end, 'test/data/csvdataprovider', interval='hour')
+        CSVDataExporter(dp, self.directory, incremental=True, overlap=overlap).export()
+        return dp
+
+    def failing_writes(self):
+        """Make DataFrame.to_csv fail when it writes a file, the header check still renders strings"""
+        to_csv = pd.DataFrame.to_csv
+        def fail(dataframe, path_or_buf=None, *args, **kwargs):
+            if path_or_buf is None:
+                return to_csv(dataframe, path_or_buf, *args, **kwargs)
+            raise OSError('disk full')
+        return mock.patch.object(pd.DataFrame, 'to_csv', fail)
+
+    def test_append_new_rows(self):
+        self.export('2021-12-01', '2021-12-10')
+        self.assertTrue(os.path.isfile(f'{self.name}.hwm'))
+        dp = self.export('2021-12-01', '2021-12-20', overlap=5)
+        expected = dp.getData()['BTCUSD']
+        result = pd.read_csv(self.name, index_col=0, parse_dates=True)
+        self.assertEqual(len(result), len(expected))
+        self.assertTrue(result.index.is_unique)
+        self.assertTrue((result.index == expected.index).all())
+
+    def test_failed_append_keeps_file(self):
+        self.export('2021-12-01', '2021-12-10')
+        with open(self.name, 'rb') as f:
+            before = f.read()
+        with self.failing_writes():
+            with self.assertRaises(OSError):
+                self.export('2021-12-01', '2021-12-20', overlap=5)
+        with open(self.name, 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertFalse(os.path.isfile(f'{self.name}.tail'))
+
+    def test_interrupted_append_is_restored(self):
+        self.export('2021-12-01', '2021-12-10')
+        with open(self.name, 'rb') as f:
+            before = f.read()
+        # the process stops before the tail is written back
+        with self.failing_writes(), mock.patch.object(CSVDataExporter, '_restore_tail'):
+            with self.assertRaises(OSError):
+                self.export('2021-12-01', '2021-12-20', overlap=5)
+        self.assertTrue(os.path.isfile(f'{self.name}.tail'))
+        self.assertLess(os.path.getsize(self.name), len(before))
+        dp = self.export('2021-12-01', '2021-12-20', overlap=5)
+        self.assertFalse(os.path.isfile(f'{self.name}.tail'))
+        result = pd.read_csv(self.name, index_col=0, parse_dates=True)
+        self.assertTrue((result.index == dp.getData()['BTCUSD'].index).all())
+
+    def test_plain_export_without_mark(self):
+        self.export('2021-12-01', '2021-12-10')
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-05', 'test/data/csvdataprovider', interval='hour')
+        CSVDataExporter(dp, self.directory).export()
+        self.assertFalse(os.path.isfile(f'{self.name}.hwm'))
+
+    def test_keep_rows_after_new_data(self):
+        self.export('2021-12-01', '2021-12-20')
+        before = pd.read_csv(self.name, index_col=0, parse_dates=True)
+        self.export('2021-12-01', '2021-12-10', overlap=500)
+        after = pd.read_csv(self.name, index_col=0, parse_dates=True)
+        self.assertTrue((before.index == after.index).all())
+
+class TestSharedMemoryExport(unittest.TestCase):
+    def setUp(self):
+        self.dp = CSVDataProvider(['BTCUSD', 'ETHUSD'], '2021-12-01', '2021-12-10', 'test/data/csvdataprovider', interval='hour')
+        self.exporter = SharedMemoryDataExporter(self.dp, f'hmile-test-{os.getpid()}')
+
+    def tearDown(self):
+        self.exporter.close()
+
+    def test_attach(self):
+        self.exporter.export()
+        expected = self.dp.getData()
+        dataset = SharedDataset.attach(self.exporter.name)
+        self.assertEqual(sorted(dataset.keys()), ['BTCUSD', 'ETHUSD'])
+        df = dataset['ETHUSD']
+        pd.testing.assert_frame_equal(df, expected['ETHUSD'].astype('float64'), check_freq=False)
+        self.assertFalse(df.values.flags.writeable)
+        del df
+        dataset.close()
+
+class TestSeekIndexCSVExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = '/tmp/testseekindex'
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+        for f in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, f))
+
+    def read(self, start, end, directory):
+        return CSVDataProvider(['BTCUSD'], start, end, directory, interval='hour', chunksize=500).getData()['BTCUSD']
+
+    def test_indexed_read(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2022-01-20', 'test/data/csvdataprovider', interval='hour')
+        CSVDataExporter(dp, self.directory, index_every=100).export()
+        self.assertTrue(os.path.isfile(f'{self.directory}/f-btcusd-hour.csv.idx'))
+        for start, end in [('2021-12-01', '2021-12-03'), ('2021-12-10', '2022-01-05'), ('2022-01-18', '2022-01-20')]:
+            pd.testing.assert_frame_equal(
+                self.read(start, end, self.directory),
+                self.read(start, end, 'test/data/csvdataprovider'),
+                check_freq=False, check_dtype=False)
+
+    def test_incremental_index(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', 'test/data/csvdataprovider', interval='hour')
+        CSVDataExporter(dp, self.directory, incremental=True, index_every=50).export()
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2022-01-20', 'test/data/csvdataprovider', interval='hour')
+        CSVDataExporter(dp, self.directory, incremental=True, overlap=10, index_every=50).export()
+        pd.testing.assert_frame_equal(
+            self.read('2021-12-15', '2022-01-10', self.directory),
+            self.read('2021-12-15', '2022-01-10', 'test/data/csvdataprovider'),
+            check_freq=False, check_dtype=False)
+
+
+class TestCompressedCSVExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = '/tmp/testcompressed'
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+        for f in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, f))
+        self.dp = CSVDataProvider(['BTCUSD', 'ETHUSD'], '2021-12-01', '2021-12-20', 'test/data/csvdataprovider', interval='hour')
+
+    def read(self, directory):
+        return CSVDataProvider(['BTCUSD', 'ETHUSD'], '2021-12-01', '2021-12-20', directory, interval='hour').getData()
+
+    def test_gzip_parallel(self):
+        CSVDataExporter(self.dp, self.directory, compression='gzip', workers=2).export()
+        self.assertEqual(
+            sorted(f for f in os.listdir(self.directory) if not f.endswith('.hwm')),
+            ['f-btcusd-hour.csv.gz', 'f-ethusd-hour.csv.gz'])
+        expected = self.read('test/data/csvdataprovider')
+        for pair, dataframe in self.read(self.directory).items():
+            pd.testing.assert_frame_equal(dataframe, expected[pair], check_freq=False, check_dtype=False)
+
+    def test_replace_other_format(self):
+        CSVDataExporter(self.dp, self.directory, index_every=50).export()
+        CSVDataExporter(self.dp, self.directory, compression='gzip', incremental=True).export()
+        self.assertFalse(os.path.isfile(f'{self.directory}/f-btcusd-hour.csv'))
+        self.assertFalse(os.path.isfile(f'{self.directory}/f-btcusd-hour.csv.idx'))
+        self.assertEqual(CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', self.directory).getAvailablePairs(), ['BTCUSD', 'ETHUSD'])
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            CSVDataExporter(self.dp, self.directory, compression='rar')
+
+
+class FakeIndices:
+    def __init__(self, calls):
+        self.calls = calls
+        self.settings = {'index.number_of_replicas': '1'}
+
+    def put_index_template(self, name, **template):
+        self.calls.append(('template', name, template))
+
+    def exists(self, index):
+        return False
+
+    def create(self, index):
+        self.calls.append(('create', index))
+
+    def get_settings(self, index, flat_settings):
+        return {index: {'settings': dict(self.settings)}}
+
+    def put_settings(self, index, settings):
+        self.calls.append(('settings', index, settings))
+
+    def refresh(self, index):
+        self.calls.append(('refresh', index))
+
+
+class FakeElastic:
+    def __init__(self):
+        self.calls = []
+        self.indices = FakeIndices(self.calls)
+
+    def index(self, **kwargs):
+        pass
+
+
+class TestElasticBulkLoad(unittest.TestCase):
+    def setUp(self):
+        self.dp = CSVDataProvider(['BTCUSD'], '2022-01-01', '2022-01-03', 'test/data/csvdataprovider', interval='hour')
+        self.es = FakeElastic()
+
+    def export(self, **kwargs):
+        exporter = ElasticDataExporter(self.dp, 'https://localhost:9200', 'user', 'pass', **kwargs)
+        exporter.connect = lambda: self.es
+        exporter._read_high_water_mark = lambda es, index_name, index: None
+        bulk = lambda es, actions: self.es.calls.append(('bulk', len(list(actions))))
+        with mock.patch('hmile.DataExporter.helpers.bulk', bulk):
+            exporter.export()
+            exporter.export()
+        return [call[0] for call in self.es.calls]
+
+    def test_default(self):
+        self.assertEqual(self.export(), ['bulk', 'bulk'])
+
+    def test_template(self):
+        self.assertEqual(self.export(template=index_template()), ['template', 'bulk', 'bulk'])
+        template = self.es.calls[0][2]['template']
+        self.assertEqual(template['mappings']['properties']['@timestamp'], {'type': 'date'})
+        self.assertEqual(template['settings']['sort.field'], '@timestamp')
+        self.assertNotIn('codec', template['settings'])
+        self.assertEqual(index_template(codec='best_compression')['template']['settings']['codec'], 'best_compression')
+
+    def test_bulk_load(self):
+        self.assertEqual(self.export(bulk_load=True, bulk_load_rows=0)[:5], ['create', 'settings', 'bulk', 'settings', 'refresh'])
+        self.assertEqual(self.es.calls[1][2], {'index.refresh_interval': '-1', 'index.number_of_replicas': 0})
+        self.assertEqual(self.es.calls[3][2], {'index.refresh_interval': None, 'index.number_of_replicas': '1'})
+
+    def test_bulk_load_small_write(self):
+        self.assertEqual(self.export(bulk_load=True), ['bulk', 'bulk'])
+
+
+class FakeBucketElastic(FakeElastic):
+    """Keeps the documents in memory and answers the queries of the bucket layout"""
+    def __init__(self):
+        super().__init__()
+        self.documents = {}
+        self.searches = 0
+
+    def bulk(self, es, actions):
+        for action in actions:
+            self.documents.setdefault(action['_index'], {})[action['_id']] = action['_source']
+
+    def get(self, index, id):
+        if index not in self.documents or id not in self.documents[index]:
+            raise NotFoundError('not found', None, {})
+        return {'_source': self.documents[index][id]}
+
+    def search(self, index, body, size):
+        self.searches += 1
+        end = pd.Timestamp(body['query']['bool']['filter'][0]['range']['@timestamp']['lte'], tz='UTC')
+        start = pd.Timestamp(body['query']['bool']['filter'][1]['range']['end']['gte'], tz='UTC')
+        after = body.get('search_after', [None])[0]
+        hits = []
+        for key in sorted(self.documents.get(index, {}), key=pd.Timestamp):
+            document = self.documents[index][key]
+            timestamp = pd.Timestamp(document['@timestamp'])
+            if timestamp <= end and pd.Timestamp(document['end']) >= start and (after is None or timestamp.value > after):
+                if '_source' in body:
+                    document = {key : value for key, value in document.items() if key in body['_source']['includes']}
+                hits.append({'_source': document, 'sort': [timestamp.value]})
+        return {'hits': {'hits': hits[:size]}}
+
+
+class TestElasticBuckets(unittest.TestCase):
+    def setUp(self):
+        self.es = FakeBucketElastic()
+
+    def exporter(self, dp, **kwargs):
+        exporter = ElasticDataExporter(dp, 'https://localhost:9200', 'user', 'pass', bucket='1D', **kwargs)
+        exporter.connect = lambda: self.es
+        exporter._read_high_water_mark = lambda es, index_name, index: self.high_water_mark(index_name, index)
+        exporter._write_high_water_mark = lambda es, index_name, high_water_mark: self.es.documents.setdefault('meta', {}).update({index_name: high_water_mark})
+        return exporter
+
+    def high_water_mark(self, index_name, index):
+        return self.es.documents.get('meta', {}).get(index_name)
+
+    def provider(self, start, end):
+        dp = ElasticDataProvider(['BTCUSD'], start, end, 'https://localhost:9200', 'user', 'pass', buckets=True)
+        dp.connect = lambda: self.es
+        return dp
+
+    def test_round_trip(self):
+        source = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10')
+        with mock.patch('hmile.DataExporter.helpers.bulk', self.es.bulk):
+            self.exporter(source).export()
+        self.assertEqual(len(self.es.documents['f-btcusd-hour-buckets']), 10)
+        expected = source.getData()['BTCUSD']['2021-01-03':'2021-01-05 00:00']
+        result = self.provider('2021-01-03', '2021-01-05').getData()['BTCUSD']
+        pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+    def test_projection(self):
+        source = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10')
+        data = source.getData()['BTCUSD']
+        data['BBL_5_2.0'] = data['close']
+        with mock.patch('hmile.DataExporter.helpers.bulk', self.es.bulk):
+            self.exporter(source).export_func({'BTCUSD': data}, 'hour')
+        dp = self.provider('2021-01-03', '2021-01-05')
+        dp.columns = ['BBL_5_2.0']
+        result = dp.getData()['BTCUSD']
+        self.assertEqual(result.columns.tolist(), ['open', 'high', 'low', 'close', 'volume', 'BBL_5_2.0'])
+        pd.testing.assert_series_equal(result['BBL_5_2.0'], result['close'], check_names=False)
+
+    def test_paging(self):
+        source = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10')
+        with mock.patch('hmile.DataExporter.helpers.bulk', self.es.bulk):
+            self.exporter(source).export()
+        dp = self.provider('2021-01-01', '2021-01-10')
+        data = dp._downloadBuckets('BTCUSD', page=3)
+        self.assertEqual(len(data), 9 * 24 + 1)
+        self.assertEqual(self.es.searches, 4)
+
+    def test_incremental(self):
+        source = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10')
+        with mock.patch('hmile.DataExporter.helpers.bulk', self.es.bulk):
+            data = source.getData()['BTCUSD']
+            self.exporter(source, incremental=True).export_func({'BTCUSD': data[:'2021-01-05 06:00']}, 'hour')
+            # the second export starts in the middle of the bucket of 2021-01-05
+            self.exporter(source, incremental=True).export_func({'BTCUSD': data['2021-01-05 12:00':]}, 'hour')
+        result = self.provider('2021-01-01', '2021-01-10').getData()['BTCUSD']
+        self.assertEqual(len(self.es.documents['f-btcusd-hour-buckets']['2021-01-05T00:00:00+00:00']['dates']), 7 + 12)
+        written = data.drop(data['2021-01-05 07:00':'2021-01-05 11:00'].index)
+        pd.testing.assert_frame_equal(result.loc[written.index], written, check_freq=False)
+
@@ -1,16 +1,23 @@
 from datetime import datetime
 import pytz
 import os
+import tempfile
+from unittest import mock
 
 from hmile.DataProvider import (YahooDataProvider,
                                 CSVDataProvider,
                                 ElasticDataProvider,
-                                PolygonDataProvider)
+                                PolygonDataProvider,
+                                SyntheticDataProvider,
+                                LazyData)
 from hmile.Exception import (DataProviderArgumentException, 
                              DataframeFormatException,
-                             DataNotAvailableException)
+                             DataNotAvailableException,
+                             PolygonRequestException)
 from hmile.FillPolicy import FillPolicyAkima
+from hmile.DataExporter import ElasticDataExporter
 
+import numpy as np
 import pandas as pd
 
 import unittest
@@ -286,4 +293,314 @@ class TestYahooDataProviderOnStock(unittest.TestCase):
 
     def test_normal(self):
         data = self.dp.getData()
-        self.assertTrue(len(data['AAPL']) > 0)
\ No newline at end of file
+        self.assertTrue(len(data['AAPL']) > 0)
+
+class TestPolygonShardedDownload(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dp = PolygonDataProvider(['BTCUSD'], '2022-01-01', '2022-03-01', 'key', 'hour', workers=4, max_bars=100)
+        self.requests = []
+        self.dp._PolygonDataProvider__download = self.fake_download
+
+    def fake_download(self, pair, interval, start, end):
+        self.requests.append((start, end))
+        step = 3600 * 1000
+        first = -(-start // step) * step
+        # polygon returns at most max_bars bars
+        return [
+            {'t': t, 'o': 1., 'h': 2., 'l': 0.5, 'c': 1.5, 'v': 10., 'vw': 1., 'n': 1}
+            for t in range(first, end + 1, step)
+        ][:self.dp.max_bars]
+
+    def test_windows(self):
+        start = int(datetime(2022, 1, 1).timestamp() * 1000)
+        end = int(datetime(2022, 3, 1).timestamp() * 1000)
+        windows = self.dp._windows(start, end)
+        self.assertEqual(windows[0][0], start)
+        self.assertEqual(windows[-1][1], end)
+        for (_, last), (first, _) in zip(windows, windows[1:]):
+            self.assertEqual(first, last + 1)
+        for first, last in windows:
+            self.assertLessEqual((last - first) // (3600 * 1000) + 1, self.dp.max_bars)
+
+    def test_merge(self):
+        data = self.dp._getOnePair('BTCUSD')
+        self.assertEqual(len(self.requests), len(self.dp._windows(
+            int(datetime(2022, 1, 1).timestamp() * 1000), int(datetime(2022, 3, 1).timestamp() * 1000))))
+        self.assertTrue(data.index.is_unique)
+        self.assertTrue(data.index.is_monotonic_increasing)
+        self.assertEqual(len(data), 59 * 24 + 1)
+        self.assertEqual(data.columns.tolist(), ['open', 'high', 'low', 'close', 'volume'])
+
+    def test_overlapping_pages(self):
+        download = self.fake_download
+        # pages overlapping the next window
+        self.dp._PolygonDataProvider__download = lambda pair, interval, start, end: download(pair, interval, start, end + 3 * 3600 * 1000)
+        data = self.dp._getOnePair('BTCUSD')
+        self.assertTrue(data.index.is_unique)
+        self.assertEqual(data.index[0], pd.Timestamp('2022-01-01'))
+
+    def test_error_answer(self):
+        dp = PolygonDataProvider(['BTCUSD'], '2022-01-01', '2022-03-01', 'key', 'hour', workers=4, max_bars=100)
+        first = dp._windows(int(datetime(2022, 1, 1).timestamp() * 1000), int(datetime(2022, 3, 1).timestamp() * 1000))[0][0]
+
+        def get(url):
+            start, end = [int(value) for value in url.split('/range/1/hour/')[1].split('?')[0].split('/')]
+            bars = [{'t': t, 'o': 1., 'h': 2., 'l': 0.5, 'c': 1.5, 'v': 10.} for t in range(start, end + 1, 3600 * 1000)]
+            answer = {'status': 'OK', 'resultsCount': len(bars), 'results': bars}
+            if start == first:
+                answer = {'status': 'ERROR', 'error': 'You have exceeded the maximum requests per minute'}
+            return mock.Mock(json=lambda: answer)
+
+        with mock.patch('hmile.DataProvider.r.get', get):
+            with self.assertRaises(DataNotAvailableException):
+                dp.getData()
+            with self.assertRaises(PolygonRequestException):
+                dp._getOnePair('BTCUSD')
+
+    def test_empty_answer(self):
+        self.assertEqual(PolygonDataProvider._results({'status': 'OK', 'resultsCount': 0}), [])
+        self.assertEqual(PolygonDataProvider._results({'status': 'DELAYED', 'resultsCount': 1, 'results': [{'t': 0}]}), [{'t': 0}])
+        with self.assertRaises(PolygonRequestException):
+            PolygonDataProvider._results({'status': 'NOT_AUTHORIZED', 'message': 'unknown api key'})
+
+
+class TestPolygonGroupedDaily(unittest.TestCase):
+    def setUp(self) -> None:
+        self.days = []
+
+    def provider(self, pairs, **kwargs):
+        dp = PolygonDataProvider(pairs, '2022-01-01', '2022-01-10', 'key', 'day', **kwargs)
+        dp._PolygonDataProvider__downloadGroupedDay = self.fake_download
+        return dp
+
+    def fake_download(self, day):
+        self.days.append(day)
+        t = int(pd.Timestamp(day).timestamp() * 1000)
+        return [
+            {'T': f'X:{ticker}', 't': t, 'o': 1., 'h': 2., 'l': 0.5, 'c': 1.5, 'v': 10., 'vw': 1., 'n': 1}
+            for ticker in ['BTCUSD', 'ETHUSD', 'LTCUSD']
+        ]
+
+    def test_grouped(self):
+        data = self.provider(['BTCUSD', 'ETHUSD'], grouped=True).getData()
+        self.assertEqual(sorted(data), ['BTCUSD', 'ETHUSD'])
+        self.assertEqual(len(self.days), 10)
+        self.assertEqual(len(data['BTCUSD']), 10)
+        self.assertEqual(data['ETHUSD'].columns.tolist(), ['open', 'high', 'low', 'close', 'volume'])
+
+    def test_all_pairs(self):
+        dp = self.provider([PolygonDataProvider.ALL_PAIRS])
+        self.assertTrue(dp.useGrouped())
+        self.assertEqual(sorted(dp.getData()), ['BTCUSD', 'ETHUSD', 'LTCUSD'])
+        self.assertEqual(dp.pairs, [PolygonDataProvider.ALL_PAIRS])
+
+    def test_automatic(self):
+        self.assertFalse(self.provider(['BTCUSD']).useGrouped())
+        self.assertTrue(self.provider(['BTCUSD'], grouped_min_pairs=1).useGrouped())
+
+    def test_missing_pair(self):
+        with self.assertRaises(DataNotAvailableException):
+            self.provider(['BTCUSD', 'XRPUSD'], grouped=True).getData()
+
+    def test_hour(self):
+        with self.assertRaises(DataProviderArgumentException):
+            PolygonDataProvider(['BTCUSD'], '2022-01-01', '2022-01-10', 'key', 'hour', grouped=True)
+
+    def test_error_answer(self):
+        dp = PolygonDataProvider(['BTCUSD', 'ETHUSD'], '2022-01-01', '2022-01-10', 'key', 'day', grouped=True)
+
+        def get(url):
+            day = url.split('/')[-1].split('?')[0]
+            bars = self.fake_download(day)
+            answer = {'status': 'OK', 'resultsCount': len(bars), 'results': bars}
+            if day == '2022-01-05':
+                answer = {'status': 'ERROR', 'error': 'You have exceeded the maximum requests per minute'}
+            return mock.Mock(json=lambda: answer)
+
+        with mock.patch('hmile.DataProvider.r.get', get):
+            with self.assertRaises(DataNotAvailableException) as context:
+                dp.getData()
+        self.assertIsInstance(context.exception.__cause__, PolygonRequestException)
+
+
+class TestSyntheticDataProvider(unittest.TestCase):
+    def test_deterministic(self):
+        first = SyntheticDataProvider(['BTCUSD', 'ETHUSD'], '2021-01-01', '2021-01-10', seed=1).getData()
+        second = SyntheticDataProvider(['ETHUSD', 'BTCUSD'], '2021-01-01', '2021-01-10', seed=1).getData()
+        other = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', seed=2).getData()
+        pd.testing.assert_frame_equal(first['BTCUSD'], second['BTCUSD'])
+        self.assertFalse(first['BTCUSD'].equals(first['ETHUSD']))
+        self.assertFalse(first['BTCUSD'].equals(other['BTCUSD']))
+
+    def test_bars(self):
+        df = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', 'minute').getData()['BTCUSD']
+        self.assertEqual(df.columns.tolist(), ['open', 'high', 'low', 'close', 'volume'])
+        self.assertEqual(len(df), 9 * 24 * 60 + 1)
+        self.assertTrue((df['high'] >= df[['open', 'close']].max(axis=1)).all())
+        self.assertTrue((df['low'] <= df[['open', 'close']].min(axis=1)).all())
+        self.assertTrue((df['volume'] > 0).all())
+        self.assertTrue((df['open'].iloc[1:].to_numpy() == df['close'].iloc[:-1].to_numpy()).all())
+
+    def test_overlapping_windows(self):
+        for start, end, other_start, other_end in [('2021-01-01', '2021-01-20', '2021-01-10', '2021-01-25'),
+                                                   ('1999-12-20', '2000-01-05', '1999-12-28', '2000-01-10')]:
+            first = SyntheticDataProvider(['BTCUSD'], start, end, 'minute', gap_probability=0.1)._getOnePair('BTCUSD')
+            second = SyntheticDataProvider(['BTCUSD'], other_start, other_end, 'minute', gap_probability=0.1)._getOnePair('BTCUSD')
+            # the first and last bars of a window are always kept
+            overlap = slice(pd.Timestamp(other_start, tz='UTC') + pd.Timedelta(minutes=1),
+                            pd.Timestamp(end, tz='UTC') - pd.Timedelta(minutes=1))
+            self.assertGreater(len(first.loc[overlap]), 0)
+            pd.testing.assert_frame_equal(first.loc[overlap], second.loc[overlap], check_exact=True)
+
+    def test_gaps_are_filled(self):
+        dp = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', gap_probability=0.2)
+        self.assertLess(len(dp._getOnePair('BTCUSD')), 9 * 24 + 1)
+        df = dp.getData()['BTCUSD']
+        self.assertEqual(len(df), 9 * 24 + 1)
+        self.assertFalse(df.isna().any().any())
+
+
+class TestColumnProjection(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        df = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10').getData()['BTCUSD']
+        for name in ['a', 'b', 'c']:
+            df[name] = df['close'] * 2
+        df.to_csv(os.path.join(self.directory.name, 'f-btcusd-hour.csv'))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_projection(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', self.directory.name)
+        self.assertIsNone(dp.projection())
+        dp.columns = ['close', 'b', 'b']
+        self.assertEqual(dp.projection(), ['open', 'high', 'low', 'close', 'volume', 'b'])
+
+    def test_csv(self):
+        full = CSVDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', self.directory.name).getData()['BTCUSD']
+        df = CSVDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', self.directory.name, columns=['b']).getData()['BTCUSD']
+        self.assertEqual(df.columns.tolist(), ['open', 'high', 'low', 'close', 'volume', 'b'])
+        pd.testing.assert_frame_equal(df, full[df.columns])
+
+    def test_without_pushdown(self):
+        dp = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10')
+        dp.columns = ['missing']
+        self.assertEqual(dp.getData()['BTCUSD'].columns.tolist(), ['open', 'high', 'low', 'close', 'volume'])
+
+    def test_elastic(self):
+        queries = []
+        documents = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10').getData()['BTCUSD']
+        documents['@timestamp'] = documents.index.strftime('%Y-%m-%dT%H:%M:%S')
+
+        class FakeClient:
+            def search(self, index, body, size):
+                queries.append(body)
+                return {'hits': {'hits': [{'_source': document} for document in documents.to_dict('records')]}}
+
+        dp = ElasticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', 'https://localhost:9200', 'user', 'pass', columns=['b'])
+        dp.connect = lambda: FakeClient()
+        dp.getData()
+        self.assertEqual(queries[0]['_source'], {'includes': ['@timestamp', 'open', 'high', 'low', 'close', 'volume', 'b']})
+
+    def test_elastic_field_names(self):
+        documents = SyntheticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10').getData()['BTCUSD']
+        documents['BBL_5_2.0'] = documents['close']
+        stored = list(ElasticDataExporter.doc_generator(documents, 'f-btcusd_hour'))
+        queries = []
+
+        class FakeClient:
+            def search(self, index, body, size):
+                queries.append(body)
+                fields = body['_source']['includes']
+                return {'hits': {'hits': [
+                    {'_source': {key : value for key, value in action['_source'].items() if key in fields}} for action in stored
+                ]}}
+
+        dp = ElasticDataProvider(['BTCUSD'], '2021-01-01', '2021-01-10', 'https://localhost:9200', 'user', 'pass', columns=['BBL_5_2.0'])
+        dp.connect = lambda: FakeClient()
+        data = dp.getData()['BTCUSD']
+        self.assertIn('bbl_5_2_0', queries[0]['_source']['includes'])
+        self.assertEqual(data.columns.tolist(), ['open', 'high', 'low', 'close', 'volume', 'BBL_5_2.0'])
+        np.testing.assert_allclose(data['BBL_5_2.0'].to_numpy(), data['close'].to_numpy())
+
+
+class CountingProvider(SyntheticDataProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def _getOnePair(self, pair):
+        self.calls.append(pair)
+        if pair == 'MISSING':
+            return pd.DataFrame()
+        return super()._getOnePair(pair)
+
+
+class TestLazyData(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pairs = ['P0', 'P1', 'P2', 'P3', 'P4']
+        self.dp = CountingProvider(self.pairs, '2021-01-01', '2021-01-10', gap_probability=0.1)
+
+    def test_lazy(self):
+        data = self.dp.getData(lazy=True)
+        self.assertIsInstance(data, LazyData)
+        self.assertEqual(self.dp.calls, [])
+        self.assertEqual(list(data.keys()), self.pairs)
+        self.assertTrue('P3' in data)
+        self.assertEqual(self.dp.calls, [])
+        pd.testing.assert_frame_equal(data['P3'], self.dp.getPair('P3'))
+        data.close()
+
+    def test_lazy_options(self):
+        with self.dp.getData(lazy=True, prefetch=0, max_items=None, max_bytes=1) as data:
+            self.assertIsNone(data._executor)
+            data['P0']
+            data['P1']
+            self.assertEqual(data.loaded(), ['P1'])
+
+    def test_prefetch(self):
+        with LazyData(self.dp, prefetch=2) as data:
+            data['P0']
+            data._executor.shutdown(wait=True)
+            self.assertEqual(sorted(self.dp.calls), ['P0', 'P1', 'P2'])
+            data._executor = None
+            data['P1']
+            self.assertEqual(len(self.dp.calls), 3)
+
+    def test_eviction(self):
+        data = LazyData(self.dp, prefetch=0, max_items=2)
+        for pair, dataframe in data.items():
+            self.assertEqual(len(dataframe), 9 * 24 + 1)
+        self.assertEqual(data.loaded(), ['P3', 'P4'])
+        data['P0']
+        self.assertEqual(self.dp.calls, self.pairs + ['P0'])
+        data.release('P0')
+        self.assertEqual(data.loaded(), ['P4'])
+
+    def test_prefetch_counted(self):
+        pairs = [f'P{i}' for i in range(10)]
+        dp = CountingProvider(pairs, '2021-01-01', '2021-01-10')
+        data = LazyData(dp, prefetch=3, max_items=3)
+        for pair in ['P0', 'P5', 'P2', 'P7', 'P4']:
+            data[pair]
+        data._executor.shutdown(wait=True)
+        self.assertEqual(data._pending, {})
+        self.assertLessEqual(len(data.loaded()), 3)
+        data.close()
+
+    def test_max_bytes(self):
+        data = LazyData(self.dp, prefetch=0, max_items=None, max_bytes=1)
+        data['P0']
+        data['P1']
+        self.assertEqual(data.loaded(), ['P1'])
+
+    def test_errors(self):
+        dp = CountingProvider(['P0', 'MISSING'], '2021-01-01', '2021-01-10')
+        with dp.getData(lazy=True) as data:
+            data['P0']
+            with self.assertRaises(DataNotAvailableException):
+                data['MISSING']
+            with self.assertRaises(KeyError):
+                data['OTHER']
+
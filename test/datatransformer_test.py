@@ -1,9 +1,14 @@
 import os
 import sys
 import unittest
-from hmile.DataProvider import CSVDataProvider, ElasticDataProvider
+
+import numpy as np
+import pandas as pd
+
+from hmile.DataProvider import CSVDataProvider, ElasticDataProvider, SyntheticDataProvider
 from hmile.FillPolicy import FillPolicyAkima
-from hmile.DataTransformer import TaDataTransformer
+from hmile.DataTransformer import TaDataTransformer, FastTaDataTransformer, CrossPairDataTransformer
+from hmile.Exception import DataProviderArgumentException
 from hmile.DataExporter import CSVDataExporter
 
 class TestTaFeaturesTransformer(unittest.TestCase):
@@ -60,4 +65,121 @@ class TestExportFromDatatransformer(unittest.TestCase):
     
     def test_export(self) :
         self.exporter.export()
-        self.assertTrue(os.path.exists('test/data/csvdataexporter/f-btcusd-hour.csv'))
\ No newline at end of file
+        self.assertTrue(os.path.exists('test/data/csvdataexporter/f-btcusd-hour.csv'))
+
+class TestIntegrityForNormalization(unittest.TestCase):
+    def setUp(self):
+        self.transformer = TaDataTransformer(FalseDataProvider())
+        self.data = pd.DataFrame({
+            'open': [1., 2., 3., 4.],
+            'constant': [1., 1., 1., 1.],
+            'nan': [1., np.nan, 3., 4.],
+            'inf': [1., np.inf, 3., 4.],
+            'close': [4., 3., 5., 1.],
+        })
+
+    def test_columns(self):
+        result = self.transformer.integrity_for_normalization(self.data)
+        self.assertEqual(result.columns.tolist(), ['open', 'close'])
+
+    def test_same_as_normalized_dropna(self):
+        expected = ((self.data - self.data.mean()) / self.data.std()).dropna(axis=1).columns
+        result = self.transformer.integrity_for_normalization(self.data)
+        self.assertEqual(result.columns.tolist(), expected.tolist())
+
+
+class TestNormalizedTransformer(unittest.TestCase):
+    def setUp(self):
+        self.dp = CSVDataProvider(
+            ['BTCUSD'],
+            '2021-12-05',
+            '2021-12-17',
+            directory='test/data/csvdataprovider',
+            interval='hour'
+        )
+        self.transformer = TaDataTransformer(self.dp, normalize=True)
+
+    def test_normalize(self):
+        df = self.transformer.transform()['BTCUSD']
+        self.assertTrue(np.allclose(df.mean(), 0))
+        self.assertTrue(np.allclose(df.std(), 1))
+
+    def test_save_load(self):
+        self.transformer.transform()
+        path = '/tmp/testnormalization.json'
+        self.transformer.save_normalization_stats(path)
+        stats = TaDataTransformer.load_normalization_stats(path)
+        pd.testing.assert_frame_equal(stats['BTCUSD'], self.transformer.normalization_stats['BTCUSD'])
+
+
+class TestFastTaDataTransformer(unittest.TestCase):
+    def setUp(self):
+        self.dp = CSVDataProvider(
+            ['BTCUSD', 'ETHUSD'],
+            '2021-12-05',
+            '2021-12-17',
+            directory='test/data/csvdataprovider',
+            interval='hour'
+        )
+        self.transformer = FastTaDataTransformer(self.dp)
+
+    def test_transform(self):
+        data = self.transformer.transform()
+        df = data['BTCUSD']
+        self.assertEqual(df.index[0].strftime('%Y-%m-%d'), '2021-12-05')
+        self.assertEqual(df.index[-1].strftime('%Y-%m-%d'), '2021-12-17')
+        for column in ['SMA_10', 'EMA_10', 'RSI_14', 'MACD_12_26_9', 'ATRr_14', 'BBU_5_2.0', 'STOCHk_14_3_3', 'ADX_14']:
+            self.assertIn(column, df.columns)
+        self.assertFalse(df.isna().any().any())
+
+    def test_same_as_one_pair(self):
+        data = self.transformer.transform()
+        single = self.transformer._apply_transform(self.dp.getData()['ETHUSD'])
+        pd.testing.assert_frame_equal(data['ETHUSD'], single)
+
+
+class TestRestrict(unittest.TestCase):
+    def test_restrict(self):
+        dp = CSVDataProvider(['BTCUSD', 'ETHUSD'], '2021-12-05', '2021-12-17', directory='test/data/csvdataprovider', interval='hour')
+        transformer = FastTaDataTransformer(dp)
+        restricted = transformer.restrict(['ETHUSD'], '2021-12-10', '2021-12-12')
+        self.assertEqual(restricted.initial_start_date, '2021-12-10')
+        self.assertEqual(restricted.dataprovider.start_date, transformer._warmup_start('2021-12-10'))
+        self.assertEqual(dp.pairs, ['BTCUSD', 'ETHUSD'])
+        df = restricted.transform()['ETHUSD']
+        self.assertEqual(df.index[0].strftime('%Y-%m-%d'), '2021-12-10')
+        self.assertFalse(df.isna().any().any())
+
+
+class TestCrossPairDataTransformer(unittest.TestCase):
+    def setUp(self):
+        self.pairs = ['BTCUSD', 'ETHUSD', 'LTCUSD', 'XRPUSD']
+        self.dp = SyntheticDataProvider(self.pairs, '2021-01-01', '2021-01-20')
+        self.transformer = CrossPairDataTransformer(self.dp, reference='BTCUSD', length=24)
+
+    def test_features(self):
+        data = self.transformer.transform()
+        self.assertEqual(sorted(data), self.pairs)
+        closes = pd.DataFrame({pair : self.dp.getData()[pair]['close'] for pair in self.pairs})
+        returns = np.log(closes).diff()
+        eth = data['ETHUSD']
+        expected_corr = returns['ETHUSD'].rolling(24).corr(returns['BTCUSD'])
+        np.testing.assert_allclose(eth['CORR_BTCUSD_24'].to_numpy()[30:], expected_corr.to_numpy()[30:], rtol=1e-6)
+        expected_beta = returns['ETHUSD'].rolling(24).cov(returns['BTCUSD']) / returns['BTCUSD'].rolling(24).var()
+        np.testing.assert_allclose(eth['BETA_BTCUSD_24'].to_numpy()[30:], expected_beta.to_numpy()[30:], rtol=1e-6)
+        np.testing.assert_allclose(eth['SPREAD_BTCUSD'], np.log(closes['ETHUSD'] / closes['BTCUSD']))
+        np.testing.assert_allclose(data['BTCUSD']['CORR_BTCUSD_24'].to_numpy()[30:], 1.)
+
+    def test_cross_section(self):
+        data = self.transformer.transform()
+        ranks = pd.DataFrame({pair : data[pair]['RANK_24'] for pair in self.pairs})
+        scores = pd.DataFrame({pair : data[pair]['ZSCORE_24'] for pair in self.pairs})
+        momentum = pd.DataFrame({pair : np.log(data[pair]['close']).diff(24) for pair in self.pairs})
+        pd.testing.assert_frame_equal(ranks, momentum.rank(axis=1, pct=True), check_names=False)
+        self.assertTrue(ranks.iloc[:24].isna().all().all())
+        np.testing.assert_allclose(scores.iloc[24:].mean(axis=1), 0., atol=1e-9)
+
+    def test_reference(self):
+        with self.assertRaises(DataProviderArgumentException):
+            CrossPairDataTransformer(self.dp, reference='DOGEUSD')
+
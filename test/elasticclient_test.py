@@ -0,0 +1,42 @@
+import threading
+import unittest
+
+from hmile.ElasticClient import get_client, close_clients
+from hmile.DataProvider import ElasticDataProvider
+from hmile.DataExporter import ElasticDataExporter
+
+
+class TestElasticClient(unittest.TestCase):
+    def tearDown(self):
+        close_clients()
+
+    def test_same_client(self):
+        client = get_client('http://localhost:9200', 'user', 'pass')
+        self.assertIs(get_client('http://localhost:9200', 'user', 'pass'), client)
+        self.assertIsNot(get_client('http://localhost:9200', 'other', 'pass'), client)
+        self.assertIsNot(get_client('http://localhost:9200', 'user', 'pass', request_timeout=5), client)
+
+    def test_shared_by_provider_and_exporter(self):
+        dp = ElasticDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', 'http://localhost:9200', 'user', 'pass',
+            client_options={'connections_per_node': 4})
+        exporter = ElasticDataExporter(dp, 'http://localhost:9200', 'user', 'pass',
+            client_options={'connections_per_node': 4})
+        self.assertIs(dp.connect(), exporter.connect())
+        self.assertIs(dp.connect(), dp.connect())
+
+    def test_threads(self):
+        clients = []
+        threads = [
+            threading.Thread(target=lambda: clients.append(get_client('http://localhost:9200', 'user', 'pass')))
+            for _ in range(16)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    def test_close(self):
+        client = get_client('http://localhost:9200', 'user', 'pass')
+        close_clients()
+        self.assertIsNot(get_client('http://localhost:9200', 'user', 'pass'), client)
@@ -0,0 +1,66 @@
+import os
+import shutil
+import unittest
+
+import pandas as pd
+
+from hmile.DataProvider import CSVDataProvider
+from hmile.DataExporter import CSVDataExporter, SharedMemoryDataExporter
+from hmile.ExportJob import ExportJob, DONE, FAILED
+
+
+class TestExportJob(unittest.TestCase):
+    def setUp(self):
+        self.source = '/tmp/testexportjob/source'
+        self.destination = '/tmp/testexportjob/destination'
+        self.checkpoint = '/tmp/testexportjob/checkpoint.json'
+        shutil.rmtree('/tmp/testexportjob', ignore_errors=True)
+        os.makedirs(self.source)
+        os.makedirs(self.destination)
+        for pair in ['btcusd', 'ethusd']:
+            shutil.copy(f'test/data/csvdataprovider/f-{pair}-hour.csv', self.source)
+
+    def job(self, pairs, chunk_days=None):
+        dp = CSVDataProvider(pairs, '2021-12-01', '2021-12-20', self.source, interval='hour')
+        exporter = CSVDataExporter(dp, self.destination, incremental=True)
+        return ExportJob(exporter, self.checkpoint, workers=2, chunk_days=chunk_days)
+
+    def test_chunks(self):
+        job = self.job(['BTCUSD', 'ETHUSD'], chunk_days=7)
+        self.assertEqual([unit for unit in job.units() if unit[0] == 'BTCUSD'], [
+            ('BTCUSD', '2021-12-01', '2021-12-08'),
+            ('BTCUSD', '2021-12-08', '2021-12-15'),
+            ('BTCUSD', '2021-12-15', '2021-12-20'),
+        ])
+        status = job.run()
+        self.assertEqual(set(status.values()), {DONE})
+        expected = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', self.source, interval='hour').getData()
+        result = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', self.destination, interval='hour').getData()
+        pd.testing.assert_frame_equal(result['BTCUSD'], expected['BTCUSD'], check_freq=False, check_dtype=False)
+
+    def test_chunks_need_incremental(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', self.source, interval='hour')
+        with self.assertRaises(ValueError):
+            ExportJob(CSVDataExporter(dp, self.destination), self.checkpoint, chunk_days=7)
+
+    def test_whole_output_exporter(self):
+        dp = CSVDataProvider(['BTCUSD'], '2021-12-01', '2021-12-20', self.source, interval='hour')
+        with self.assertRaises(TypeError):
+            ExportJob(SharedMemoryDataExporter(dp, 'exportjob'), self.checkpoint)
+
+    def test_resume_failed(self):
+        job = self.job(['BTCUSD', 'ETHUSD', 'XRPUSD'])
+        status = job.run()
+        self.assertEqual(status['XRPUSD|2021-12-01|2021-12-20'], FAILED)
+        self.assertEqual(status['BTCUSD|2021-12-01|2021-12-20'], DONE)
+        self.assertIn('XRPUSD|2021-12-01|2021-12-20', job.failed())
+
+        shutil.copy(f'{self.source}/f-btcusd-hour.csv', f'{self.source}/f-xrpusd-hour.csv')
+        job = self.job(['BTCUSD', 'ETHUSD', 'XRPUSD'])
+        exported = []
+        export_func = job.exporter.export_func
+        job.exporter.export_func = lambda data, interval: (exported.extend(data), export_func(data, interval))
+        status = job.run(only_failed=True)
+        self.assertEqual(exported, ['XRPUSD'])
+        self.assertEqual(set(status.values()), {DONE})
+        self.assertTrue(os.path.isfile(f'{self.destination}/f-xrpusd-hour.csv'))
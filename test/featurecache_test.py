@@ -0,0 +1,64 @@
+import shutil
+import unittest
+
+import pandas as pd
+
+from hmile.DataProvider import CSVDataProvider
+from hmile.DataTransformer import FastTaDataTransformer
+from hmile.FeatureCache import FeatureCache
+
+
+class TestFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = '/tmp/testfeaturecache'
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def transformer(self, cache, pairs=['BTCUSD', 'ETHUSD'], start='2021-12-05'):
+        dp = CSVDataProvider(pairs, start, '2021-12-17', directory='test/data/csvdataprovider', interval='hour')
+        transformer = FastTaDataTransformer(dp)
+        transformer.cache = cache
+        return transformer
+
+    def test_hit(self):
+        cache = FeatureCache(self.directory)
+        first = self.transformer(cache).transform()
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        computed = []
+        transformer = self.transformer(cache)
+        transformer._apply_transform_pairs = lambda data: computed.append(data)
+        second = transformer.transform()
+        self.assertEqual(computed, [])
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.hit_rate, 0.5)
+        for pair in first:
+            pd.testing.assert_frame_equal(first[pair], second[pair])
+
+    def test_disk(self):
+        first = self.transformer(FeatureCache(self.directory)).transform()
+        cache = FeatureCache(self.directory)
+        second = self.transformer(cache).transform()
+        self.assertEqual(cache.hits, 2)
+        pd.testing.assert_frame_equal(first['BTCUSD'], second['BTCUSD'], check_freq=False)
+
+    def test_parameters_in_key(self):
+        cache = FeatureCache(self.directory)
+        self.transformer(cache).transform()
+        self.transformer(cache, start='2021-12-06').transform()
+        self.assertEqual(cache.hits, 0)
+
+    def test_skip_download(self):
+        cache = FeatureCache(self.directory, skip_download=True)
+        self.transformer(cache).transform()
+        transformer = self.transformer(cache)
+        transformer.dataprovider._getOnePair = None
+        self.assertEqual(sorted(transformer.transform()), ['BTCUSD', 'ETHUSD'])
+
+    def test_eviction(self):
+        cache = FeatureCache(self.directory, max_bytes=1, memory_items=1, skip_download=True)
+        self.transformer(cache).transform()
+        self.assertEqual(cache.stats()['disk_bytes'], 0)
+        self.assertLessEqual(cache.stats()['memory_items'], 1)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        # the request keys point to evicted files : one miss by pair
+        self.transformer(cache).transform()
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
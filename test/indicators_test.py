@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+
+from hmile import Indicators
+
+
+class TestIndicatorsParity(unittest.TestCase):
+    """Compare hmile.Indicators with the pandas-ta implementations (ta-lib disabled)"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        length = 500
+        index = pd.date_range('2021-01-01', periods=length, freq='H', tz='UTC', name='date')
+        close = 100 + np.cumsum(rng.normal(size=length))
+        self.data = pd.DataFrame({
+            'open': close + rng.normal(scale=0.1, size=length),
+            'high': close + rng.random(length),
+            'low': close - rng.random(length),
+            'close': close,
+            'volume': rng.random(length) * 1000,
+        }, index=index)
+        columns = lambda field: self.data[[field]].to_numpy()
+        self.indicators = Indicators.all_indicators(
+            columns('high'), columns('low'), columns('close'), columns('volume'), index)
+
+    def assertParity(self, expected : pd.DataFrame):
+        for name in expected.columns:
+            self.assertIn(name, self.indicators)
+            np.testing.assert_allclose(self.indicators[name][:, 0], expected[name].to_numpy(), rtol=1e-8, atol=1e-8, err_msg=name)
+
+    def indicator(self, name, *args, **kwargs):
+        if not hasattr(ta, name):
+            self.skipTest(f'pandas_ta.{name} is not available')
+        result = getattr(ta, name)(*args, talib=False, **kwargs)
+        return result.to_frame() if isinstance(result, pd.Series) else result
+
+    def test_moving_averages(self):
+        close = self.data['close']
+        self.assertParity(self.indicator('sma', close, length=10))
+        self.assertParity(self.indicator('ema', close, length=10))
+        self.assertParity(self.indicator('wma', close, length=10))
+
+    def test_momentum(self):
+        close = self.data['close']
+        self.assertParity(self.indicator('rsi', close, length=14))
+        self.assertParity(self.indicator('macd', close, fast=12, slow=26, signal=9))
+        self.assertParity(self.indicator('stoch', self.data['high'], self.data['low'], close))
+
+    def test_volatility(self):
+        self.assertParity(self.indicator('atr', self.data['high'], self.data['low'], self.data['close'], length=14))
+        self.assertParity(self.indicator('bbands', self.data['close'], length=5, std=2.))
+
+    def test_volume(self):
+        self.assertParity(self.indicator('obv', self.data['close'], self.data['volume']))
+        self.assertParity(self.indicator('vwap', self.data['high'], self.data['low'], self.data['close'], self.data['volume']))
+
+    def test_trend(self):
+        self.assertParity(self.indicator('adx', self.data['high'], self.data['low'], self.data['close'], length=14))
+
+
+class TestIndicatorsBatch(unittest.TestCase):
+    def test_columns_are_independent(self):
+        rng = np.random.default_rng(1)
+        close = 100 + np.cumsum(rng.normal(size=(200, 3)), axis=0)
+        close[:20, 1] = np.nan
+        batch = Indicators.rma(close, 14)
+        for i in range(3):
+            np.testing.assert_allclose(batch[:, i], Indicators.rma(close[:, [i]], 14)[:, 0])
+        np.testing.assert_allclose(batch[33:, 1], pd.Series(close[:, 1]).ewm(alpha=1 / 14, min_periods=14).mean()[33:])
+        self.assertTrue(np.isnan(batch[:33, 1]).all())
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from hmile.DataExporter import CSVDataExporter, DataExporter, SharedMemoryDataExporter
+from hmile.DataProvider import SyntheticDataProvider
+from hmile.DataTransformer import FastTaDataTransformer, CrossPairDataTransformer
+from hmile.FeatureCache import FeatureCache
+from hmile.Pipeline import Pipeline
+
+
+class SlowProvider(SyntheticDataProvider):
+    def _getOnePair(self, pair):
+        if pair == 'MISSING':
+            return pd.DataFrame()
+        time.sleep(0.05)
+        return super()._getOnePair(pair)
+
+
+class MemoryExporter(DataExporter):
+    def __init__(self, dataprovider, delay=0.):
+        super().__init__(dataprovider)
+        self.delay = delay
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def export_func(self, data, interval):
+        time.sleep(self.delay)
+        with self.lock:
+            self.data.update(data)
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.pairs = [f'P{i}' for i in range(8)]
+        self.dp = SlowProvider(self.pairs, '2021-01-01', '2021-01-20')
+
+    def test_same_as_export(self):
+        transformer = FastTaDataTransformer(self.dp)
+        exporter = MemoryExporter(transformer)
+        status = Pipeline(exporter, fetch_workers=4, transform_workers=2).run()
+        self.assertEqual(set(status.values()), {'done'})
+        expected = {pair : transformer.restrict([pair]).transform()[pair] for pair in self.pairs}
+        self.assertEqual(sorted(exporter.data), self.pairs)
+        for pair in self.pairs:
+            pd.testing.assert_frame_equal(exporter.data[pair], expected[pair])
+
+    def test_overlap(self):
+        # 8 downloads of 0.05s on 4 threads and 8 exports of 0.05s : sequential stages would take 0.5s
+        exporter = MemoryExporter(self.dp, delay=0.05)
+        pipeline = Pipeline(exporter, fetch_workers=4, queue_size=2)
+        start = time.perf_counter()
+        pipeline.run()
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(sorted(pipeline.stage_seconds), ['export', 'fetch'])
+
+    def test_errors(self):
+        dp = SlowProvider(['P0', 'MISSING', 'P1'], '2021-01-01', '2021-01-20')
+        exporter = MemoryExporter(dp)
+        pipeline = Pipeline(exporter, fetch_workers=2)
+        status = pipeline.run()
+        self.assertEqual(status, {'P0': 'done', 'MISSING': 'failed', 'P1': 'done'})
+        self.assertTrue(pipeline.errors['MISSING'].startswith('fetch: '))
+        self.assertIn('DataNotAvailableException', pipeline.errors['MISSING'])
+        self.assertEqual(sorted(exporter.data), ['P0', 'P1'])
+
+    def test_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Pipeline(CSVDataExporter(self.dp, directory)).run()
+            self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.csv')]), len(self.pairs))
+
+    def test_panel(self):
+        with self.assertRaises(TypeError):
+            Pipeline(MemoryExporter(CrossPairDataTransformer(self.dp, reference='P0')))
+
+    def test_whole_output_exporter(self):
+        with self.assertRaises(TypeError):
+            Pipeline(SharedMemoryDataExporter(self.dp, 'pipeline'))
+
+    def test_feature_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            transformer = FastTaDataTransformer(self.dp)
+            transformer.cache = FeatureCache(directory)
+            Pipeline(MemoryExporter(transformer)).run()
+            self.assertEqual(transformer.cache.misses, len(self.pairs))
+            exporter = MemoryExporter(transformer)
+            Pipeline(exporter).run()
+            self.assertEqual(transformer.cache.hits, len(self.pairs))
+            self.assertEqual(sorted(exporter.data), self.pairs)
@@ -0,0 +1,85 @@
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+
+from hmile import Profiling
+from hmile.DataExporter import CSVDataExporter
+from hmile.DataProvider import SyntheticDataProvider
+from hmile.DataTransformer import FastTaDataTransformer
+from hmile.Profiling import Profiler, stage
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dp = SyntheticDataProvider(['BTCUSD', 'ETHUSD'], '2021-01-01', '2021-01-20', gap_probability=0.1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_disabled(self):
+        self.assertIsNone(Profiling._profiler)
+        self.assertIs(stage('download', 'BTCUSD'), stage('fill'))
+
+    def test_stages(self):
+        output = os.path.join(self.directory.name, 'profile')
+        exporter = CSVDataExporter(FastTaDataTransformer(self.dp), self.directory.name)
+        with Profiler(output) as profiler:
+            exporter.export()
+        self.assertIsNone(Profiling._profiler)
+        summary = profiler.summary()
+        stages = set(zip(summary['stage'], summary['pair']))
+        for expected in [('download', 'BTCUSD'), ('fill', 'ETHUSD'), ('write', 'BTCUSD'), ('export', None)]:
+            self.assertIn(expected, stages)
+        fill = summary[(summary['stage'] == 'fill') & (summary['pair'] == 'BTCUSD')].iloc[0]
+        self.assertEqual(fill['calls'], 1)
+        self.assertGreater(fill['cpu_seconds'], 0)
+        self.assertGreater(fill['peak_mb'], 0)
+        self.assertTrue(profiler.topAllocations('download', 'BTCUSD'))
+        files = os.listdir(output)
+        self.assertIn('summary.txt', files)
+        self.assertIn('profile.collapsed', files)
+        stats = pstats.Stats(os.path.join(output, 'fill-BTCUSD.pstats'))
+        self.assertTrue(any(name == '__call__' for _, _, name in stats.stats))
+        with open(os.path.join(output, 'profile.collapsed')) as f:
+            self.assertTrue(f.readline().split(' ')[0].count(';') >= 2)
+
+    def test_nested_cpu_is_exclusive(self):
+        with Profiler(cpu=True, memory=False) as profiler:
+            with stage('outer', 'BTCUSD'):
+                with stage('inner'):
+                    sum(range(200000))
+        summary = profiler.summary().set_index('stage')
+        self.assertEqual(summary.loc['inner', 'pair'], 'BTCUSD')
+        self.assertGreater(summary.loc['outer', 'seconds'], summary.loc['inner', 'cpu_seconds'] / 2)
+        self.assertLess(summary.loc['outer', 'cpu_seconds'], summary.loc['inner', 'cpu_seconds'])
+
+    def test_concurrent_peak(self):
+        started = threading.Event()
+        done = threading.Event()
+
+        def other():
+            with stage('other', 'ETHUSD'):
+                started.set()
+                done.wait()
+
+        with Profiler(cpu=False, top=0) as profiler:
+            with stage('alone', 'BTCUSD'):
+                [0] * 100000
+            thread = threading.Thread(target=other)
+            thread.start()
+            started.wait()
+            with stage('concurrent', 'BTCUSD'):
+                [0] * 100000
+            done.set()
+            thread.join()
+        summary = profiler.summary().set_index('stage')
+        self.assertGreater(summary.loc['alone', 'peak_mb'], 0)
+        self.assertTrue(summary.loc[['concurrent', 'other'], 'peak_mb'].isna().all())
+
+    def test_single_profiler(self):
+        with Profiler(memory=False):
+            with self.assertRaises(RuntimeError):
+                Profiler().start()
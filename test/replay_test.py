@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from hmile.DataProvider import SyntheticDataProvider
+from hmile.Replay import Replay
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dp = SyntheticDataProvider(['BTCUSD', 'ETHUSD', 'LTCUSD'], '2021-01-01', '2021-01-20', gap_probability=0.1)
+        self.data = self.dp.getData()
+        # the pairs do not have the same dates
+        self.data['ETHUSD'] = self.data['ETHUSD'].iloc[::2]
+
+    def test_order(self):
+        bars = list(Replay(self.data))
+        self.assertEqual(len(bars), sum(len(df) for df in self.data.values()))
+        dates = [date for date, _, _ in bars]
+        self.assertEqual(dates, sorted(dates))
+        for date, pair, values in bars[:50]:
+            np.testing.assert_array_equal(values, self.data[pair].loc[date].to_numpy())
+
+    def test_cross_sections(self):
+        replay = Replay(self.data)
+        sections = list(replay.cross_sections())
+        self.assertEqual(len(sections), len(self.data['BTCUSD']))
+        date, section = sections[0]
+        self.assertEqual(sorted(section), ['BTCUSD', 'ETHUSD', 'LTCUSD'])
+        self.assertEqual(sorted(sections[1][1]), ['BTCUSD', 'LTCUSD'])
+        self.assertEqual(replay.columns('BTCUSD'), ['open', 'high', 'low', 'close', 'volume'])
+
+    def test_chunks(self):
+        full = [(date, pair) for date, pair, _ in Replay(self.dp)]
+        chunked = [(date, pair) for date, pair, _ in Replay(self.dp, chunk_days=3)]
+        self.assertEqual(full, chunked)
+
+    def test_speed(self):
+        data = {pair : self.data[pair].iloc[:5] for pair in ['BTCUSD', 'LTCUSD']}
+        replay = Replay(data, speed=3600.)
+        now = [0.]
+        waits = []
+        replay._clock = lambda: now[0]
+
+        def sleep(delay):
+            waits.append(delay)
+            now[0] += delay
+        replay._sleep = sleep
+        list(replay)
+        # one hour of data by second
+        self.assertEqual(now[0], 4.)
+        self.assertEqual(len(waits), 4)
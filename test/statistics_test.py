@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hmile.Statistics import RunningStatistics
+from hmile.utils import get_min_dict, get_max_dict
+
+
+class TestRunningStatistics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = pd.DataFrame(rng.normal(size=(1000, 3)), columns=['open', 'close', 'volume'])
+        self.data.iloc[10, 1] = np.nan
+
+    def test_chunks(self):
+        statistics = RunningStatistics()
+        for start in range(0, 1000, 128):
+            statistics.update(self.data.iloc[start:start + 128])
+        pd.testing.assert_series_equal(statistics.mean, self.data.mean(), check_names=False)
+        pd.testing.assert_series_equal(statistics.std(), self.data.std(), check_names=False)
+        pd.testing.assert_series_equal(statistics.min, self.data.min(), check_names=False)
+        pd.testing.assert_series_equal(statistics.max, self.data.max(), check_names=False)
+        self.assertEqual(statistics.count['close'], 999)
+
+    def test_merge(self):
+        first = RunningStatistics().update(self.data.iloc[:300])
+        second = RunningStatistics().update(self.data.iloc[300:][['close', 'open']])
+        first.merge(second)
+        self.assertAlmostEqual(first.mean['open'], self.data['open'].mean())
+        self.assertAlmostEqual(first.var()['close'], self.data['close'].var())
+        self.assertEqual(first.count['volume'], 300)
+
+    def test_merge_sample_size(self):
+        first = RunningStatistics(sample_size=100).update(self.data)
+        with self.assertRaises(ValueError):
+            first.merge(RunningStatistics(sample_size=50).update(self.data))
+
+    def test_quantile(self):
+        statistics = RunningStatistics(sample_size=500, seed=0)
+        for start in range(0, 1000, 100):
+            statistics.update(self.data.iloc[start:start + 100])
+        self.assertAlmostEqual(statistics.quantile(0.5)['open'], self.data['open'].median(), delta=0.2)
+
+    def test_save_load(self):
+        statistics = RunningStatistics(sample_size=10, seed=0).update(self.data)
+        statistics.save('/tmp/teststatistics.json')
+        loaded = RunningStatistics.load('/tmp/teststatistics.json')
+        pd.testing.assert_frame_equal(loaded.to_frame(), statistics.to_frame())
+
+
+class TestMinMaxDict(unittest.TestCase):
+    def test_min_max(self):
+        pairs = {
+            'BTCUSD': pd.DataFrame({'open': [1, 5], 'close': [3, 4]}),
+            'ETHUSD': pd.DataFrame({'open': [0, 2], 'close': [6, 2]}),
+        }
+        self.assertEqual(get_min_dict(pairs), [0, 2])
+        self.assertEqual(get_max_dict(pairs), [5, 6])
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hmile.utils import align_pairs, merge_columns, column_statistics
+
+
+def make_frame(start, periods, columns):
+    index = pd.date_range(start, periods=periods, freq='H', name='date')
+    return pd.DataFrame(np.ones((periods, len(columns))), index=index, columns=columns)
+
+
+class TestAlignPairs(unittest.TestCase):
+    def setUp(self):
+        self.pairs = {
+            'BTCUSD': make_frame('2022-01-01', 10, ['open', 'close', 'rsi']),
+            'ETHUSD': make_frame('2022-01-01 02:00', 10, ['open', 'close', 'macd']),
+        }
+
+    def test_inner(self):
+        aligned, report = align_pairs(self.pairs)
+        self.assertEqual(aligned['BTCUSD'].columns.tolist(), ['open', 'close'])
+        self.assertEqual(len(aligned['BTCUSD']), 8)
+        self.assertTrue(aligned['BTCUSD'].index.equals(aligned['ETHUSD'].index))
+        self.assertEqual(report.dropped_columns, {'BTCUSD': ['rsi'], 'ETHUSD': ['macd']})
+        self.assertEqual(len(report.misaligned_dates['BTCUSD']), 2)
+        self.assertFalse(report.aligned)
+
+    def test_outer(self):
+        aligned, report = align_pairs(self.pairs, how='outer')
+        self.assertEqual(len(aligned['ETHUSD']), 12)
+        self.assertTrue(aligned['ETHUSD'].iloc[:2].isna().all().all())
+        self.assertEqual(len(report.misaligned_dates['ETHUSD']), 2)
+
+    def test_already_aligned_not_copied(self):
+        pairs = {
+            'BTCUSD': make_frame('2022-01-01', 10, ['open', 'close']),
+            'ETHUSD': make_frame('2022-01-01', 10, ['open', 'close']),
+        }
+        aligned, report = align_pairs(pairs)
+        self.assertIs(aligned['BTCUSD'], pairs['BTCUSD'])
+        self.assertTrue(report.aligned)
+
+    def test_merge_columns(self):
+        pairs = merge_columns(self.pairs)
+        self.assertEqual(pairs['ETHUSD'].columns.tolist(), ['open', 'close'])
+        self.assertEqual(len(pairs['ETHUSD']), 10)
+
+
+class TestColumnStatistics(unittest.TestCase):
+    def test_multi_block_frame(self):
+        data = make_frame('2022-01-01', 50, ['open', 'close'])
+        data['close'] = np.arange(50.)
+        # columns added one by one are stored in separate blocks, some of them are integers
+        data['volume'] = np.arange(50)
+        data['rsi'] = np.where(np.arange(50) % 10 == 0, np.nan, np.arange(50.) ** 2)
+        data['macd'] = np.float32(3.)
+        self.assertGreater(data._mgr.nblocks, 1)
+        statistics = column_statistics(data, chunk_size=2)
+        self.assertEqual(statistics.index.tolist(), data.columns.tolist())
+        self.assertEqual(statistics['invalid'].tolist(), [0, 0, 0, 5, 0])
+        valid = data.drop(columns='rsi')
+        np.testing.assert_allclose(statistics['mean'].drop('rsi'), valid.mean())
+        np.testing.assert_allclose(statistics['std'].drop('rsi'), valid.std(ddof=1))
+        self.assertTrue(np.isnan(statistics.loc['rsi', 'mean']))
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hmile.Exception import DataframeFormatException
+from hmile.Windows import SlidingWindows
+
+
+class TestSlidingWindows(unittest.TestCase):
+    def setUp(self):
+        index = pd.date_range('2022-01-01', periods=50, freq='H', name='date')
+        self.data = {
+            'BTCUSD': pd.DataFrame({'open': np.arange(50.), 'close': np.arange(50.) * 2}, index=index),
+            'ETHUSD': pd.DataFrame({'open': -np.arange(40.), 'close': np.arange(40.)}, index=index[5:45]),
+        }
+
+    def test_windows(self):
+        windows = SlidingWindows(self.data, 10, stride=2)
+        self.assertEqual(len(windows), 21 + 16)
+        np.testing.assert_array_equal(windows[0], self.data['BTCUSD'].iloc[0:10].to_numpy())
+        np.testing.assert_array_equal(windows[21], self.data['ETHUSD'].iloc[0:10].to_numpy())
+        np.testing.assert_array_equal(windows[-1], self.data['ETHUSD'].iloc[30:40].to_numpy())
+        self.assertEqual(windows.key(1), ('BTCUSD', self.data['BTCUSD'].index[11]))
+        # every window is a view on the same array
+        self.assertTrue(np.shares_memory(windows[0], windows[1]))
+        self.assertFalse(windows[0].flags.writeable)
+
+    def test_batches(self):
+        windows = SlidingWindows(self.data, 10)
+        seen = []
+        for indices, batch in windows.batches(8, shuffle=True, seed=0):
+            self.assertEqual(batch.shape[1:], (10, 2))
+            for i, window in zip(indices, batch):
+                np.testing.assert_array_equal(window, windows[i])
+            seen.extend(indices)
+        self.assertEqual(sorted(seen), list(range(len(windows))))
+        self.assertEqual(len(list(windows.batches(8, drop_last=True))), len(windows) // 8)
+
+    def test_align(self):
+        windows = SlidingWindows(self.data, 10, align=True)
+        self.assertEqual(len(windows), 31)
+        self.assertEqual(windows[0].shape, (2, 10, 2))
+        np.testing.assert_array_equal(windows[0][0], self.data['BTCUSD'].iloc[5:15].to_numpy())
+        np.testing.assert_array_equal(windows[0][1], self.data['ETHUSD'].iloc[0:10].to_numpy())
+        self.assertEqual(windows.key(0), (None, self.data['ETHUSD'].index[9]))
+
+    def test_columns(self):
+        self.data['ETHUSD']['volume'] = 1.
+        with self.assertRaises(DataframeFormatException):
+            SlidingWindows(self.data, 10)
+        self.assertEqual(SlidingWindows(self.data, 10, columns=['close'])[0].shape, (10, 1))
@@ -0,0 +1,44 @@
+import shutil
+import unittest
+
+import pandas as pd
+
+from hmile.DataProvider import CSVDataProvider, ZarrDataProvider, zarr
+from hmile.DataExporter import ZarrDataExporter
+
+
+@unittest.skipIf(zarr is None, 'zarr is not installed')
+class TestZarr(unittest.TestCase):
+    def setUp(self):
+        self.path = '/tmp/testzarr'
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def csv(self, start, end, pairs=['BTCUSD', 'ETHUSD']):
+        return CSVDataProvider(pairs, start, end, 'test/data/csvdataprovider', interval='hour')
+
+    def read(self, start, end, **kwargs):
+        return ZarrDataProvider(['BTCUSD'], start, end, self.path, interval='hour', **kwargs).getData()['BTCUSD']
+
+    def test_round_trip(self):
+        ZarrDataExporter(self.csv('2021-12-01', '2022-01-20'), self.path, time_chunk=100, feature_chunk=2).export()
+        for start, end in [('2021-12-01', '2021-12-03'), ('2021-12-10', '2022-01-05')]:
+            pd.testing.assert_frame_equal(
+                self.read(start, end, workers=3),
+                self.csv(start, end, ['BTCUSD']).getData()['BTCUSD'],
+                check_freq=False, check_dtype=False)
+        self.assertEqual(
+            ZarrDataProvider(['BTCUSD'], '2021-12-01', '2021-12-03', self.path).getAvailablePairs(),
+            ['BTCUSD', 'ETHUSD'])
+
+    def test_columns(self):
+        ZarrDataExporter(self.csv('2021-12-01', '2021-12-10'), self.path).export()
+        df = self.read('2021-12-01', '2021-12-10', columns=['close'])
+        self.assertEqual(df.columns.tolist(), ['open', 'high', 'low', 'close', 'volume'])
+
+    def test_incremental(self):
+        ZarrDataExporter(self.csv('2021-12-01', '2021-12-20'), self.path, incremental=True, time_chunk=64).export()
+        ZarrDataExporter(self.csv('2021-12-10', '2022-01-10'), self.path, incremental=True, overlap=5, time_chunk=64).export()
+        pd.testing.assert_frame_equal(
+            self.read('2021-12-01', '2022-01-10'),
+            self.csv('2021-12-01', '2022-01-10', ['BTCUSD']).getData()['BTCUSD'],
+            check_freq=False, check_dtype=False)